@@ -0,0 +1,284 @@
+"""
+Shared, immutable sprite assets.
+
+Frames, palettes and their compiled bitmaps are interned here so that any number
+of sprites (and copies of sprites placed in scenes) reference one copy of each.
+Everything handed out by this module must be treated as read-only.
+
+Bigger assets (decoded images, GIF frames, fonts and rasterized text) go through
+:py:data:`MANAGER`, which loads each one once however many sprites use it, counts
+its bytes, and drops the least recently used ones to stay within a memory budget.
+Sprites hold an :py:class:`AssetRef` rather than the asset itself, so a dropped
+asset is just loaded again the next time it's used.
+"""
+
+import collections
+import logging
+import os
+import threading
+import weakref
+
+LOG = logging.getLogger(__name__)
+
+FRAMESETS = {}  # frames tuple: the same frames tuple, for interning
+FLIPPED = {}  # id of frames: horizontally flipped frames
+COMPILED = {}  # (id of frames, palette key): per-frame lit pixel tuples
+COMPILED_ROWS = {}  # (id of frames, palette key): per-frame rows of lit pixels
+
+
+def frameset(frames):
+    """
+    Get the shared, immutable copy of some frames.
+
+    Frames are nested as frames -> rows -> palette indices and may be given as any
+    nested sequences. The result is nested tuples that are identical (``is``) for
+    identical content.
+    """
+    frames = tuple(tuple(tuple(row) for row in frame) for frame in frames)
+    return FRAMESETS.setdefault(frames, frames)
+
+
+def parse_frames(framestrs):
+    """
+    Get shared frames from strings of palette index digits, like custom sprites use.
+
+    Rows are separated by whitespace, as in ``'01110 10101 01110'``.
+    """
+    return frameset([[[int(char) for char in rowstr] for rowstr in framestr.split()]
+                     for framestr in framestrs])
+
+
+def flipped(frames):
+    """Get the shared horizontal mirror image of some interned frames."""
+    mirror = FLIPPED.get(id(frames))
+    if mirror is None:
+        mirror = frameset([[row[::-1] for row in frame] for frame in frames])
+        FLIPPED[id(frames)] = mirror
+        FLIPPED[id(mirror)] = frames
+    return mirror
+
+
+def palette_key(pallete):
+    """Hashable key representing the contents of a palette dict."""
+    return frozenset((index, tuple(rgb)) for index, rgb in pallete.items())
+
+
+def compile_frames(frames, pallete):
+    """
+    Get frames pre-resolved against a palette.
+
+    Each compiled frame is a tuple of ``(x, y, r, g, b)`` for the lit pixels only, so
+    rendering skips transparent pixels and palette lookups entirely.
+    """
+    key = (id(frames), palette_key(pallete))
+    compiled = COMPILED.get(key)
+    if compiled is None:
+        compiled = tuple(tuple((xi, yi) + tuple(pallete[val])
+                               for yi, row in enumerate(frame)
+                               for xi, val in enumerate(row) if val)
+                         for frame in frames)
+        COMPILED[key] = compiled
+    return compiled
+
+
+def compile_rows(frames, pallete):
+    """
+    Get the compiled bitmaps of :py:func:`compile_frames` grouped by row.
+
+    Each frame is a tuple with one ``(xs, pixels)`` pair per row, where ``pixels``
+    are the ``(x, r, g, b)`` of the row's lit pixels from left to right and ``xs``
+    their x offsets, so the part of a row between two columns can be found by
+    bisecting ``xs``.
+    """
+    key = (id(frames), palette_key(pallete))
+    rows = COMPILED_ROWS.get(key)
+    if rows is None:
+        rows = []
+        for frame, pixels in zip(frames, compile_frames(frames, pallete)):
+            frame_rows = [[] for _row in frame]
+            for xi, yi, red, green, blue in pixels:
+                frame_rows[yi].append((xi, red, green, blue))
+            rows.append(tuple((tuple(pixel[0] for pixel in row), tuple(row))
+                              for row in frame_rows))
+        rows = COMPILED_ROWS[key] = tuple(rows)
+    return rows
+
+
+def image_bytes(images):
+    """Bytes of pixels in decoded images. Bundled ones are in the shared map and count as none."""
+    return sum(image.size[0] * image.size[1] * len(image.getbands())
+               for image in images if hasattr(image, 'getbands'))
+
+
+def describe(key):
+    """Readable form of an asset key, like ``image:flag.png:64x32:still``."""
+    return ':'.join('x'.join(str(val) for val in part)
+                    if isinstance(part, tuple) and all(isinstance(val, int) for val in part)
+                    else str(part) for part in key)
+
+
+class AssetRef(object):
+    """
+    A handle on a managed asset.
+
+    Indexing and ``len`` go to the asset, so a handle on a list of frames can stand
+    in for the list. Copies of a sprite share its handles.
+    """
+
+    __slots__ = ('key', 'loader', '_manager', '__weakref__')
+
+    def __init__(self, manager, key, loader):
+        self.key = key
+        self.loader = loader
+        self._manager = manager
+
+    def get(self):
+        """The asset, loaded again if it was dropped."""
+        return self._manager.get(self)
+
+    def __len__(self):
+        return len(self.get())
+
+    def __getitem__(self, index):
+        return self.get()[index]
+
+
+class _Entry(object):  # pylint: disable=too-few-public-methods
+    __slots__ = ('value', 'nbytes', 'refs', 'pinned', 'loads')
+
+    def __init__(self, pinned=False):
+        self.value = None  # None while not loaded
+        self.nbytes = 0
+        self.refs = weakref.WeakSet()
+        self.pinned = pinned
+        self.loads = 0
+
+
+class AssetManager(object):
+    """
+    Loaded assets, by key, with least recently used first.
+
+    Keys are tuples like ``(kind, path, size, transform)``. Loaders return
+    ``(asset, nbytes)``. Assets nobody has a handle on any more are forgotten, and
+    pinned ones (which are held directly, like fonts) are never dropped.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget  # bytes, or None for no limit
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+
+    def ref(self, key, loader):
+        """Get a handle on an asset, loading it now unless it's already loaded."""
+        ref = AssetRef(self, key, loader)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.refs.add(ref)
+        self.get(ref)
+        return ref
+
+    def pin(self, key, value, nbytes):
+        """Keep track of an asset that is never dropped."""
+        with self._lock:
+            entry = self._entries[key] = _Entry(pinned=True)
+            entry.value, entry.nbytes, entry.loads = value, nbytes, 1
+            self.loads += 1
+            self._enforce_budget(key)
+
+    def get(self, ref):
+        """The asset a handle is on, loaded again if it was dropped."""
+        with self._lock:
+            entry = self._entries.pop(ref.key, None)
+            if entry is None:  # forgotten while nobody had a handle
+                entry = _Entry()
+                entry.refs.add(ref)
+            self._entries[ref.key] = entry  # now the most recently used
+            if entry.value is None:
+                entry.value, entry.nbytes = ref.loader()
+                entry.loads += 1
+                self.loads += 1
+                if entry.loads > 1:
+                    LOG.debug('Reloaded %s', describe(ref.key))
+                self._enforce_budget(ref.key)
+            return entry.value
+
+    def nbytes(self, keys=None):
+        """Bytes of the loaded assets, of all or just some keys."""
+        with self._lock:
+            entries = (self._entries.values() if keys is None else
+                       [self._entries[key] for key in set(keys) if key in self._entries])
+            return sum(entry.nbytes for entry in entries if entry.value is not None)
+
+    def _enforce_budget(self, keep):
+        """Forget assets nobody uses, then drop the least recently used until within budget."""
+        for key, entry in list(self._entries.items()):
+            if not entry.pinned and not entry.refs:
+                del self._entries[key]
+        if self.budget is None:
+            return
+        total = self.nbytes()
+        for key, entry in list(self._entries.items()):
+            if total <= self.budget:
+                return
+            if entry.pinned or entry.value is None or key == keep:
+                continue
+            entry.value = None
+            total -= entry.nbytes
+            self.evictions += 1
+            LOG.debug('Dropped %s (%d bytes) to stay within the asset budget',
+                      describe(key), entry.nbytes)
+        if total > self.budget:
+            LOG.warning('Assets in use take %d bytes, over the budget of %d', total, self.budget)
+
+    def sources(self, kind):
+        """Absolute paths of the files that assets of a kind (like ``image``) come from."""
+        with self._lock:
+            return set(os.path.abspath(key[1]) for key in self._entries if key[0] == kind)
+
+    def reload_source(self, kind, path):
+        """
+        Load again the loaded assets of a kind that come from a file, and swap them in.
+
+        Loading happens in the calling thread, without holding up anyone using the old
+        ones. Everything with a handle on them gets the new ones. Returns how many
+        were reloaded.
+        """
+        with self._lock:
+            found = [(key, next(iter(entry.refs)).loader)
+                     for key, entry in self._entries.items()
+                     if key[0] == kind and os.path.abspath(key[1]) == path and
+                     entry.value is not None and entry.refs]
+        for key, loader in found:
+            value, nbytes = loader()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.value, entry.nbytes = value, nbytes
+                    entry.loads += 1
+                    self.loads += 1
+                    self._enforce_budget(key)
+            LOG.info('Reloaded %s', describe(key))
+        return len(found)
+
+    def clear(self):
+        """Forget everything."""
+        with self._lock:
+            self._entries.clear()
+
+    def report(self):
+        """Totals and every known asset, biggest first, as a dict."""
+        with self._lock:
+            found = [{'key': describe(key), 'bytes': entry.nbytes,
+                      'loaded': entry.value is not None, 'pinned': entry.pinned,
+                      'holders': len(entry.refs), 'loads': entry.loads}
+                     for key, entry in self._entries.items()]
+            return {'bytes': self.nbytes(), 'budget': self.budget, 'loads': self.loads,
+                    'evictions': self.evictions,
+                    'assets': sorted(found, key=lambda asset: (-asset['bytes'], asset['key']))}
+
+
+MANAGER = AssetManager()
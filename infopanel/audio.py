@@ -0,0 +1,257 @@
+"""
+Sound playback.
+
+Sounds are WAV files in a sound directory, played by name (``doorbell`` plays
+``doorbell.wav``). One long-lived worker thread decodes them once into a cache
+(preloading the whole directory at startup) and streams them to a sink, so the
+render loop only ever appends to a short queue. The ``aplay`` sink keeps one
+``aplay`` process open and feeds it raw samples instead of starting one per sound.
+
+The queue is bounded. A sound that is already waiting isn't queued twice, sounds
+with higher ``priorities`` play first, and when the queue is full the newest,
+lowest-priority sound is dropped.
+"""
+
+import collections
+import logging
+import os
+import subprocess
+import threading
+import wave
+
+from infopanel import config, helpers
+
+LOG = logging.getLogger(__name__)
+
+# aplay sample formats by WAV sample width in bytes
+FORMATS = {1: 'U8', 2: 'S16_LE', 3: 'S24_3LE', 4: 'S32_LE'}
+
+
+class Sound(collections.namedtuple('Sound', 'name channels sampwidth rate frames')):
+    """Decoded WAV data."""
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        """Length in seconds."""
+        return len(self.frames) / float(self.channels * self.sampwidth * self.rate)
+
+
+class WavCache(object):
+    """Decoded WAV files from a directory, loaded once and reloaded if they change."""
+
+    def __init__(self, sound_dir):
+        self.sound_dir = os.path.abspath(os.path.expandvars(sound_dir))
+        self._sounds = {}  # name: (mtime, Sound)
+        self.num_loaded = 0
+
+    def path(self, name):
+        """Path of a sound by name. Names may not leave the sound directory."""
+        path = os.path.normpath(os.path.join(self.sound_dir, name + '.wav'))
+        if not path.startswith(self.sound_dir + os.sep):
+            raise ValueError('Sound {} is outside of {}'.format(name, self.sound_dir))
+        return path
+
+    def preload(self):
+        """Decode every WAV file in the sound directory."""
+        try:
+            names = sorted(os.listdir(self.sound_dir))
+        except OSError as exc:
+            LOG.warning('Cannot preload sounds: %s', exc)
+            return
+        for filename in names:
+            name, ext = os.path.splitext(filename)
+            if ext.lower() == '.wav':
+                try:
+                    self.get(name)
+                except (IOError, OSError, EOFError, wave.Error) as exc:
+                    LOG.warning('Cannot load sound %s: %s', filename, exc)
+        LOG.info('Preloaded %d sounds from %s', len(self._sounds), self.sound_dir)
+
+    def get(self, name):
+        """Get a :py:class:`Sound` by name."""
+        path = self.path(name)
+        mtime = os.path.getmtime(path)
+        cached = self._sounds.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        wav = wave.open(path, 'rb')
+        try:
+            sound = Sound(name, wav.getnchannels(), wav.getsampwidth(), wav.getframerate(),
+                          wav.readframes(wav.getnframes()))
+        finally:
+            wav.close()
+        self._sounds[name] = (mtime, sound)
+        self.num_loaded += 1
+        return sound
+
+
+class NullSink(object):
+    """Plays nothing. Keeps the names of the sounds it was given, in order."""
+
+    def __init__(self):
+        self.played = []
+
+    def play(self, sound):
+        """Pretend to play a sound."""
+        self.played.append(sound.name)
+
+    def close(self):
+        """Nothing to close."""
+        pass
+
+
+class AplaySink(object):
+    """
+    Stream sounds to one ``aplay`` process as raw samples.
+
+    A new process is only started when the sample format changes. Writes block
+    while earlier sounds are still playing, which paces the worker.
+    """
+
+    def __init__(self, device=None):
+        self.device = device
+        self._player = None
+        self._format = None
+
+    def play(self, sound):
+        """Play a sound, after whatever is already playing."""
+        sound_format = (sound.channels, sound.sampwidth, sound.rate)
+        if (self._player is None or self._player.poll() is not None or
+                self._format != sound_format):
+            self.close()
+            command = ['aplay', '-q', '-t', 'raw', '-f', FORMATS[sound.sampwidth],
+                       '-r', str(sound.rate), '-c', str(sound.channels)]
+            if self.device:
+                command += ['-D', self.device]
+            self._player = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self._format = sound_format
+        try:
+            self._player.stdin.write(sound.frames)
+            self._player.stdin.flush()
+        except (IOError, OSError) as exc:
+            LOG.warning('Could not play sound %s: %s', sound.name, exc)
+            self.close()
+
+    def close(self):
+        """Let the current sound finish and close the player."""
+        if self._player is not None:
+            try:
+                self._player.stdin.close()
+            except (IOError, OSError):
+                pass
+            self._player.wait()
+            self._player = None
+
+
+class AudioStats(object):  # pylint: disable=too-few-public-methods
+    """Queue depth and latency from request to playback."""
+
+    def __init__(self):
+        self.depth = 0
+        self.max_depth = 0
+        self.played = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = None
+
+    def summary(self):
+        """All the numbers, with the mean latency, as a dict."""
+        summary = dict(vars(self))
+        summary['mean_latency'] = self.total_latency / self.played if self.played else None
+        return summary
+
+
+class AudioWorker(threading.Thread):
+    """Play queued sounds, one after another, on a background thread."""
+
+    def __init__(self, cache, sink, max_queue=8, priorities=None, preload=True):  # pylint: disable=too-many-arguments
+        threading.Thread.__init__(self, name='infopanel-audio')
+        self.daemon = True
+        self.cache = cache
+        self.sink = sink
+        self.max_queue = max_queue
+        self.priorities = priorities or {}
+        self.preload = preload
+        self.stats = AudioStats()
+        self._queue = []  # (priority, name, time queued)
+        self._changed = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def play(self, name):
+        """Queue a sound by name. Returns False if it was dropped."""
+        if isinstance(name, bytes):
+            name = name.decode('utf-8', 'replace')
+        priority = self.priorities.get(name, 0)
+        stats = self.stats
+        with self._changed:
+            if any(queued_name == name for _priority, queued_name, _at in self._queue):
+                stats.coalesced += 1
+                return True
+            if len(self._queue) >= self.max_queue:
+                # newest of the lowest priority goes
+                victim = min(self._queue, key=lambda request: (request[0], -request[2]))
+                stats.dropped += 1
+                if victim[0] >= priority:
+                    LOG.warning('Sound queue full. Dropping %s', name)
+                    return False
+                LOG.warning('Sound queue full. Dropping %s for %s', victim[1], name)
+                self._queue.remove(victim)
+            self._queue.append((priority, name, helpers.CLOCK.time()))
+            stats.depth = len(self._queue)
+            stats.max_depth = max(stats.max_depth, stats.depth)
+            self._changed.notify()
+        return True
+
+    def _next(self):
+        """Wait for the highest priority, oldest request. None once stopped."""
+        with self._changed:
+            while not self._queue and not self._stop_event.is_set():
+                self._changed.wait()
+            if self._stop_event.is_set():
+                return None
+            request = max(self._queue, key=lambda request: (request[0], -request[2]))
+            self._queue.remove(request)
+            self.stats.depth = len(self._queue)
+            return request
+
+    def run(self):
+        if self.preload:
+            self.cache.preload()
+        while True:
+            request = self._next()
+            if request is None:
+                break
+            _priority, name, queued_at = request
+            try:
+                sound = self.cache.get(name)
+            except (IOError, OSError, EOFError, ValueError, wave.Error) as exc:
+                LOG.warning('Cannot play sound %s: %s', name, exc)
+                self.stats.failed += 1
+                continue
+            latency = helpers.CLOCK.time() - queued_at
+            self.stats.played += 1
+            self.stats.total_latency += latency
+            self.stats.max_latency = max(self.stats.max_latency, latency)
+            self.stats.last_latency = latency
+            LOG.debug('Playing sound %s after %.1f ms in the queue', name, latency * 1000.0)
+            self.sink.play(sound)
+        self.sink.close()
+
+    def stop(self):
+        """Stop after the sound that's playing. Queued sounds are dropped."""
+        self._stop_event.set()
+        with self._changed:
+            self._changed.notify_all()
+
+
+def audio_factory(conf):
+    """Build the audio worker from the ``audio`` config section (defaults if there is none)."""
+    audio_conf = conf.get('audio') or config.AUDIO({})
+    sink = NullSink() if audio_conf['sink'] == 'null' else AplaySink(audio_conf['device'])
+    return AudioWorker(WavCache(audio_conf['sound_dir']), sink, audio_conf['max_queue'],
+                       audio_conf['priorities'], audio_conf['preload'])
@@ -0,0 +1,328 @@
+"""
+Memory-mapped asset bundles.
+
+Decoding images and parsing frames typed into the config is slow on a Pi. A bundle
+holds all of that already decoded, in one file that is memory-mapped read-only at
+startup, so nothing is parsed and every process on the host shares the same pages.
+Build one from a config with::
+
+    python -m infopanel.bundle --config infopanel.yaml --output assets.bundle
+
+and point ``global: asset_bundle`` at it. Bundles are only an optimization: any
+sprite sheet or image that is missing from the bundle, or whose source changed
+since it was built, is loaded from its source as usual.
+
+Sprite sheets are named in the ``sheets`` config section, either as frames like a
+custom sprite's or as a PNG with the frames side by side, and sprites use them with
+``sheet: <name>``. Images and GIF frames are stored pre-scaled to each display size
+as raw RGB, and are blitted to framebuffers straight out of the map.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+
+from PIL import Image as PILImage
+from PIL import ImageSequence
+
+from infopanel import assets
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'IPBNDL01'
+HEADER = struct.Struct('<8sII')  # magic, index offset, index length
+ALIGN = 16
+
+ACTIVE = None  # the Bundle in use, set from the ``asset_bundle`` global config
+SHEETS = {}  # name: sheet config, from the ``sheets`` config section
+
+
+class ImageView(object):  # pylint: disable=too-few-public-methods
+    """
+    A read-only RGB image backed by a bundle.
+
+    Has the ``size``, ``mode`` and ``tobytes()`` of a PIL image, which is all
+    framebuffers need. ``tobytes()`` returns a slice of the map without copying.
+    """
+
+    __slots__ = ('size', 'data', '_pil')
+    mode = 'RGB'
+
+    def __init__(self, size, data):
+        self.size = size
+        self.data = data
+        self._pil = None
+
+    def tobytes(self):
+        """The raw pixels, as a memoryview into the bundle."""
+        return self.data
+
+    def as_pil(self):
+        """A PIL copy, for displays that need a real image. Made once."""
+        if self._pil is None:
+            self._pil = PILImage.frombytes('RGB', self.size, bytes(self.data))
+        return self._pil
+
+
+class Bundle(object):
+    """A bundle file, mapped read-only."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as bundle_file:
+            self._map = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('{} is not an asset bundle'.format(path))
+        self.index = json.loads(self._map[index_offset:index_offset + index_length].decode('utf-8'))
+        self._view = memoryview(self._map)
+        self._sheets = {}
+        self._images = {}
+
+    def sheet(self, name, digest):
+        """Get ``(frames, pallete)`` of a sprite sheet, or None if missing or stale."""
+        entry = self.index['sheets'].get(name)
+        if entry is None or entry['digest'] != digest:
+            return None
+        found = self._sheets.get(name)
+        if found is None:
+            width, height = entry['width'], entry['height']
+            data = self._view[entry['offset']:entry['offset'] + entry['count'] * width * height]
+            frames = assets.frameset([[bytearray(data[(num * height + row) * width:
+                                                      (num * height + row + 1) * width])
+                                       for row in range(height)]
+                                      for num in range(entry['count'])])
+            pallete = dict((key, rgb) for key, rgb in entry['pallete']) or None
+            found = self._sheets[name] = (frames, pallete)
+        return found
+
+    def images(self, key, mtime):
+        """Get the frames of an image as :py:class:`ImageView`, or None if missing or stale."""
+        entry = self.index['images'].get(key)
+        if entry is None or entry['mtime'] != mtime:
+            return None
+        found = self._images.get(key)
+        if found is None:
+            found = self._images[key] = [
+                ImageView((width, height), self._view[offset:offset + width * height * 3])
+                for offset, width, height in entry['frames']]
+        return found
+
+
+class BundleWriter(object):
+    """Collect assets and write them out as a bundle."""
+
+    def __init__(self):
+        self.index = {'sheets': {}, 'images': {}}
+        self._blobs = []
+        self._end = HEADER.size
+
+    def _add(self, data):
+        padding = -self._end % ALIGN
+        self._blobs.append(b'\0' * padding + data)
+        self._end += padding
+        offset = self._end
+        self._end += len(data)
+        return offset
+
+    def add_sheet(self, name, frames, pallete, digest):
+        """Add frames of palette indices (all the same size) and their optional palette."""
+        height, width = len(frames[0]), len(frames[0][0])
+        data = bytearray()
+        for frame in frames:
+            if len(frame) != height or any(len(row) != width for row in frame):
+                raise ValueError('Frames of sheet {} are not all {}x{}'.format(name, width, height))
+            for row in frame:
+                data.extend(row)
+        self.index['sheets'][name] = {'offset': self._add(bytes(data)), 'count': len(frames),
+                                      'width': width, 'height': height, 'digest': digest,
+                                      'pallete': sorted((pallete or {}).items(), key=str)}
+
+    def add_images(self, key, images, mtime):
+        """Add the RGB frames of an image."""
+        self.index['images'][key] = {
+            'mtime': mtime,
+            'frames': [(self._add(image.tobytes()),) + image.size for image in images]}
+
+    def write(self, path):
+        """Write the bundle. Processes that mapped an old one keep using it."""
+        index = json.dumps(self.index, sort_keys=True).encode('utf-8')
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as bundle_file:
+            bundle_file.write(HEADER.pack(MAGIC, self._end, len(index)))
+            for blob in self._blobs:
+                bundle_file.write(blob)
+            bundle_file.write(index)
+        os.rename(tmp_path, path)
+
+
+def use(path):
+    """Map the bundle at path (or stop using one if None)."""
+    global ACTIVE  # pylint: disable=global-statement
+    if path is None:
+        ACTIVE = None
+    elif ACTIVE is None or ACTIVE.path != path:
+        try:
+            ACTIVE = Bundle(path)
+        except (IOError, OSError, ValueError) as exc:
+            LOG.warning('Not using asset bundle %s: %s', path, exc)
+            ACTIVE = None
+
+
+def image_key(path, max_width, max_height):
+    """Bundle key of an image scaled to fit a display."""
+    return '{}@{}x{}'.format(os.path.normpath(os.path.expandvars(path)), max_width, max_height)
+
+
+def _mtime(path):
+    return os.path.getmtime(os.path.expandvars(path))
+
+
+def decode_image(path, max_width, max_height, animated=True):
+    """Decode the frames of an image file (just the first unless animated), scaled to fit."""
+    image = PILImage.open(os.path.expandvars(path))
+    frames = ([frame.copy() for frame in ImageSequence.Iterator(image)]
+              if animated else [image])
+    for frame in frames:
+        frame.thumbnail((max_width, max_height), PILImage.LANCZOS)
+    return [frame.convert('RGB') for frame in frames]
+
+
+def image_frames(path, max_width, max_height, animated=True):
+    """Frames of an image scaled to fit a display, from the bundle if it's there."""
+    if ACTIVE is not None:
+        found = ACTIVE.images(image_key(path, max_width, max_height), _mtime(path))
+        if found is not None:
+            return found if animated else found[:1]
+        LOG.info('Image %s is not in the asset bundle or changed. Decoding it.', path)
+    return decode_image(path, max_width, max_height, animated)
+
+
+def image_ref(path, max_width, max_height, animated=True):
+    """
+    A managed handle on the frames of :py:func:`image_frames`.
+
+    Every sprite showing the same version of an image at the same size shares them.
+    """
+    key = ('image', os.path.normpath(os.path.expandvars(path)), (max_width, max_height),
+           'animated' if animated else 'still', _mtime(path))
+
+    def load():
+        frames = image_frames(path, max_width, max_height, animated)
+        return frames, assets.image_bytes(frames)
+    return assets.MANAGER.ref(key, load)
+
+
+def sheet_digest(sheet_conf):
+    """Fingerprint of a sheet's config and source, to spot stale bundles."""
+    source = dict(sheet_conf)
+    if 'pallete' in source:
+        source['pallete'] = dict((str(key), rgb) for key, rgb in source['pallete'].items())
+    if 'image' in source:
+        source['mtime'] = _mtime(source['image'])
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def decode_sheet(sheet_conf):
+    """
+    Build ``(frames, pallete)`` from a sheet's config.
+
+    PNG sheets are cut into frames ``frame_width`` wide. Each distinct color gets
+    a palette index, with black and transparent pixels left blank.
+    """
+    if 'frames' in sheet_conf:
+        return assets.parse_frames(sheet_conf['frames']), sheet_conf.get('pallete')
+    image = PILImage.open(os.path.expandvars(sheet_conf['image'])).convert('RGBA')
+    width, height = image.size
+    frame_width = sheet_conf['frame_width']
+    colors = {}
+    rows = []
+    pixels = image.load()
+    for y in range(height):
+        row = []
+        for x in range(width):
+            red, green, blue, alpha = pixels[x, y]
+            if not alpha or not red + green + blue:
+                row.append(0)
+            else:
+                row.append(colors.setdefault((red, green, blue), len(colors) + 1))
+        rows.append(row)
+    if len(colors) > 255:
+        raise ValueError('Sheet {} has more than 255 colors'.format(sheet_conf['image']))
+    frames = [[row[left:left + frame_width] for row in rows]
+              for left in range(0, width - frame_width + 1, frame_width)]
+    pallete = dict((index, list(rgb)) for rgb, index in colors.items())
+    return assets.frameset(frames), pallete
+
+
+def sheet(name):
+    """Get ``(frames, pallete)`` of a configured sprite sheet. The palette may be None."""
+    sheet_conf = SHEETS.get(name)
+    if sheet_conf is None:
+        raise ValueError('Unknown sprite sheet {}'.format(name))
+    if ACTIVE is not None:
+        found = ACTIVE.sheet(name, sheet_digest(sheet_conf))
+        if found is not None:
+            return found
+        LOG.info('Sheet %s is not in the asset bundle or changed. Building it.', name)
+    return decode_sheet(sheet_conf)
+
+
+def display_sizes(conf):
+    """Width and height of every display in a config."""
+    from infopanel import driver, offline  # they use sprites, which use this module
+    sizes = set()
+    for _name, display_conf in driver.display_configs(conf):
+        for section in ('Network', 'FrameBuffer'):
+            if section in display_conf:
+                sizes.add((display_conf[section]['width'], display_conf[section]['height']))
+                break
+        else:
+            sizes.add(offline.framebuffer_size(display_conf))
+    return sorted(sizes)
+
+
+def build(conf, path, sizes=None):
+    """Bundle the sheets and images a config uses. Returns the BundleWriter."""
+    from infopanel import sprites
+    writer = BundleWriter()
+    for name, sheet_conf in sorted((conf.get('sheets') or {}).items()):
+        frames, pallete = decode_sheet(sheet_conf)
+        writer.add_sheet(name, frames, pallete, sheet_digest(sheet_conf))
+    sizes = sizes or display_sizes(conf)
+    image_paths = set(sprite_conf['path'] for sprite_conf in conf['sprites'].values()
+                      if issubclass(sprites.SPRITE_TYPES[sprite_conf['type']], sprites.BaseImage))
+    for image_path in sorted(image_paths):
+        for width, height in sizes:
+            writer.add_images(image_key(image_path, width, height),
+                              decode_image(image_path, width, height), _mtime(image_path))
+    writer.write(path)
+    LOG.info('Wrote %d sheets and %d images to %s', len(writer.index['sheets']),
+             len(writer.index['images']), path)
+    return writer
+
+
+def main(argv=None):
+    """Build an asset bundle from the command line."""
+    from infopanel import config
+    parser = argparse.ArgumentParser(description='Pack the sprite sheets and images of a '
+                                     'config into a memory-mapped asset bundle.')
+    parser.add_argument('--config', default='/etc/infopanel/infopanel.yaml',
+                        help='Point to a YAML configuration file.')
+    parser.add_argument('--output', required=True, help='Bundle file to write.')
+    parser.add_argument('--size', action='append',
+                        help='Display size to scale images for, like 64x32. '
+                        'Defaults to the sizes of the configured displays.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    conf = config.load_config_yaml(args.config, cache_dir=None)
+    sizes = [tuple(int(val) for val in size.split('x')) for size in args.size or []]
+    build(conf, args.output, sizes)
+
+
+if __name__ == '__main__':
+    main()
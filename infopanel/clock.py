@@ -0,0 +1,54 @@
+"""
+Clocks.
+
+Everything that depends on the time of day or waits goes through
+``helpers.CLOCK`` so it can be swapped for a :py:class:`VirtualClock` that runs
+as fast as the CPU allows (see :py:mod:`infopanel.offline`).
+"""
+
+import datetime
+import time
+
+
+class Clock(object):
+    """The real wall clock."""
+
+    def time(self):  # pylint: disable=no-self-use
+        """Seconds since the epoch."""
+        return time.time()
+
+    def sleep(self, seconds):  # pylint: disable=no-self-use
+        """Wait for some seconds."""
+        time.sleep(seconds)
+
+    def now(self):
+        """Current local date and time."""
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def wait(self, wait_for, timeout):  # pylint: disable=no-self-use
+        """Block in ``wait_for(timeout)`` (like ``Event.wait``) and return what it does."""
+        return wait_for(timeout)
+
+
+class VirtualClock(Clock):
+    """A clock that only moves forward when something sleeps."""
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+
+    def time(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self._now += seconds
+
+    def wait(self, wait_for, timeout):
+        """Nothing outside can happen in virtual time, so let the time pass unless it already has."""
+        if wait_for(0):
+            return True
+        self._now += timeout
+        return False
+
+    def advance(self, seconds):
+        """Move time forward without anyone sleeping."""
+        self._now += seconds
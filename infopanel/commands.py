@@ -0,0 +1,71 @@
+"""
+Control commands, like switching modes or changing the brightness.
+
+Commands arrive as writes to a few data keys (usually over MQTT). Besides updating
+the data, every such write is queued for each driver, which applies its queue, in
+order, at the start of every frame. Repeated commands between frames are not lost,
+and each one's latency from write to applied is measured.
+"""
+
+import collections
+import logging
+import threading
+
+from infopanel import helpers
+
+LOG = logging.getLogger(__name__)
+
+COMMANDS = frozenset(['mode', 'brightness', 'random', 'image_path', 'sound'])
+
+
+class CommandStats(object):
+    """Latency from write to applied, per command."""
+
+    def __init__(self):
+        self.count = collections.Counter()
+        self.total = collections.defaultdict(float)
+        self.worst = collections.defaultdict(float)
+        self.last = {}
+
+    def record(self, name, latency):
+        """Count an applied command."""
+        self.count[name] += 1
+        self.total[name] += latency
+        self.worst[name] = max(self.worst[name], latency)
+        self.last[name] = latency
+
+    def summary(self):
+        """Map each command to its count and mean, max and last latency in seconds."""
+        return dict((name, {'count': count, 'mean': self.total[name] / count,
+                            'max': self.worst[name], 'last': self.last[name]})
+                    for name, count in self.count.items())
+
+
+class CommandQueue(object):
+    """Commands waiting for one driver. Any thread may put; the driver drains."""
+
+    def __init__(self):
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self.stats = CommandStats()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, name, value, sent_at=None):
+        """Queue a command. ``sent_at`` defaults to now."""
+        if sent_at is None:
+            sent_at = helpers.CLOCK.time()
+        with self._lock:
+            self._queue.append((name, value, sent_at))
+
+    def drain(self, limit):
+        """Take up to ``limit`` of the oldest commands as ``(name, value, sent_at)``."""
+        with self._lock:
+            return [self._queue.popleft() for _i in range(min(limit, len(self._queue)))]
+
+    def applied(self, name, sent_at):
+        """Record that a command took effect."""
+        latency = helpers.CLOCK.time() - sent_at
+        self.stats.record(name, latency)
+        LOG.debug('Applied %s command after %.1f ms', name, latency * 1000.0)
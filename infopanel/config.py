@@ -1,13 +1,46 @@
 """Configuration file stuff."""
 
-import inspect
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import threading
 
 import yaml
 import voluptuous as vol
 
 from infopanel import sprites, scenes
 
-SPRITE_NAMES = [name for name, value in inspect.getmembers(sprites, inspect.isclass)]
+LOG = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get('INFOPANEL_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'infopanel'))
+# libyaml is much faster than the pure-Python loader on a Pi. Fall back if not compiled in.
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def _schema_key():
+    """
+    Hash the source of the modules that shape validated configs.
+
+    Caches written before any change to the schemas or sprite and scene defaults
+    are then never reused. None if the source can't be read, which disables caching.
+    """
+    digest = hashlib.sha1()
+    try:
+        for module in (sys.modules[__name__], sprites, scenes):
+            with open(module.__file__, 'rb') as source:
+                digest.update(source.read())
+    except (IOError, OSError, AttributeError, TypeError) as exc:
+        LOG.warning('Not caching configs, cannot read the schema source: %s', exc)
+        return None
+    return digest.hexdigest()[:12]
+
+# Part of the cache key, so stale caches are never reused after an upgrade.
+SCHEMA_KEY = _schema_key()
+
+SPRITE_NAMES = sorted(sprites.SPRITE_TYPES)
+BUILTIN_MODES = ('all', 'blank')  # always there. See infopanel.driver
 
 MQTT = vol.Schema({'broker':str,
                    vol.Optional('port', default=1883):int,
@@ -18,13 +51,14 @@ MQTT = vol.Schema({'broker':str,
                    vol.Optional('certificate'): str,
                    vol.Optional('protocol', default='3.1'): vol.Coerce(str),
                    'topic':str,
-                   vol.Optional('mappings'): object})
+                   vol.Optional('mappings'): object,
+                   vol.Optional('separate_process', default=False): bool})
 
 SPRITE = vol.Schema({'type': vol.Any(*SPRITE_NAMES)},
                     extra=vol.ALLOW_EXTRA)
 SPRITES = vol.Schema({str: SPRITE})
 
-SCENE_NAMES = [name for name, value in inspect.getmembers(scenes, inspect.isclass)]
+SCENE_NAMES = sorted(scenes.SCENE_TYPES)
 # sprite list in scenes is a list because you may want multiple of one sprite in a scene.
 SCENES = vol.Schema({str: {vol.Optional('type', default='Scene'): vol.Any(*SCENE_NAMES),
                            vol.Optional('path'): str,
@@ -47,19 +81,266 @@ RGBMATRIX = vol.Schema({'led-rows':int,
 
 GLOBAL = vol.Schema({'font_dir':str,
                      'default_mode':str,
-                     'random':bool})
+                     'random':bool,
+                     vol.Optional('vectorize', default=False): bool,
+                     vol.Optional('seed'): int,
+                     vol.Optional('asset_bundle'): str,
+                     # 2 or 3 to draw the next frame while another is shown
+                     vol.Optional('frame_buffers', default=1):
+                         vol.All(int, vol.Range(min=1, max=3)),
+                     # build scenes at startup (all), when their mode is applied, or when shown
+                     vol.Optional('build_scenes', default='mode'): vol.Any('all', 'mode', 'shown'),
+                     vol.Optional('evict_scenes_after'):
+                         vol.All(vol.Coerce(float), vol.Range(min=0)),
+                     vol.Optional('scene_memory_mb'): vol.All(int, vol.Range(min=1)),
+                     # least recently used images and text are dropped to stay within this
+                     vol.Optional('asset_memory_mb'): vol.All(int, vol.Range(min=1)),
+                     # reload images when their files change (Linux only)
+                     vol.Optional('watch_assets', default=False): bool})
+
+FRAMEBUFFER = vol.Schema({'width': int,
+                          'height': int})
+
+# send frames to a remote panel running ``python -m infopanel.network``
+NETWORK = vol.Schema({'host': str,
+                      vol.Optional('port', default=5005): int,
+                      vol.Optional('protocol', default='udp'): vol.Any('udp', 'tcp'),
+                      'width': int,
+                      'height': int,
+                      vol.Optional('keyframe_interval', default=30): int})
+
+# live HTTP preview; displays after the first use the following ports.
+PREVIEW = vol.Schema({vol.Optional('port', default=8080): int,
+                      vol.Optional('host', default=''): str,
+                      vol.Optional('scale', default=8): int,
+                      vol.Optional('max_fps', default=10):
+                          vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+                      vol.Optional('max_viewers', default=4): int})
+
+# keep the recent history of some data keys (graph sprites add theirs automatically).
+# Each tier is [seconds per slot, number of slots].
+HISTORY = vol.Schema({vol.Optional('keys', default=[]): [str],
+                      vol.Optional('tiers', default=[[10, 360], [300, 288]]):
+                          [vol.ExactSequence([vol.Coerce(float), int])]})
+
+# named sprite sheets, as custom frames or a PNG of frames side by side (see infopanel.bundle)
+SHEET = vol.Any({'frames': sprites.FRAMES_SCHEMA, vol.Optional('pallete'): sprites.PALLETE_SCHEMA},
+                {'image': str, 'frame_width': int})
+SHEETS = vol.Schema({str: SHEET})
+
+# sounds played by the ``sound`` command, by name from sound_dir (see infopanel.audio)
+AUDIO = vol.Schema({vol.Optional('sound_dir', default='/home/pi/sounds'): str,
+                    vol.Optional('device', default='hw:1,0'): vol.Any(None, str),
+                    vol.Optional('sink', default='aplay'): vol.Any('aplay', 'null'),
+                    vol.Optional('max_queue', default=8): vol.All(int, vol.Range(min=1)),
+                    vol.Optional('priorities', default={}): {str: int},
+                    vol.Optional('preload', default=True): bool})
+
+# Several displays driven from one process. Each may use a subset of the scenes and
+# its own modes; anything not given falls back to the top-level config.
+DISPLAY = vol.Schema({vol.Optional('RGBMatrix'): RGBMATRIX,
+                      vol.Optional('FrameBuffer'): FRAMEBUFFER,
+                      vol.Optional('Network'): NETWORK,
+                      vol.Optional('scenes'): [str],
+                      vol.Optional('modes'): MODES,
+                      vol.Optional('default_mode'): str})
+DISPLAYS = vol.Schema({str: DISPLAY})
 
 SCHEMA = vol.Schema({'mqtt':MQTT,
                      'sprites': SPRITES,
                      'scenes': SCENES,
                      'modes': MODES,
                      vol.Optional('RGBMatrix'): RGBMATRIX,
+                     vol.Optional('FrameBuffer'): FRAMEBUFFER,
+                     vol.Optional('Network'): NETWORK,
+                     vol.Optional('displays'): DISPLAYS,
+                     vol.Optional('preview'): PREVIEW,
+                     vol.Optional('history'): HISTORY,
+                     vol.Optional('sheets'): SHEETS,
+                     vol.Optional('audio'): AUDIO,
                      'global': GLOBAL})
 
-def load_config_yaml(path):
-    """Load and validate config file as an alternative to command line options."""
-    with open(path) as configfile:
-        config = yaml.load(configfile)
+def load_config_yaml(path, cache_dir=CACHE_DIR):
+    """
+    Load and validate config file as an alternative to command line options.
+
+    Names that refer to other sections are checked too (see :py:func:`check_references`),
+    so mistakes in scenes show up here rather than when their mode is first applied.
+
+    The validated and normalized config is cached in a compact binary form keyed
+    by a hash of the file contents, so unchanged configs skip YAML parsing and
+    schema validation entirely. Pass ``cache_dir=None`` to disable the cache.
+    """
+    with open(path, 'rb') as configfile:
+        raw = configfile.read()
+    cache_path = _cache_path(path, raw, cache_dir) if cache_dir else None
+    if cache_path:
+        config = _read_cache(cache_path)
+        if config is not None:
+            LOG.debug('Loaded cached config from %s', cache_path)
+            return config
+
+    config = yaml.load(raw, Loader=YAML_LOADER)
     config = SCHEMA(config)
+    normalize_sprites(config['sprites'])
+    check_references(config)
 
+    if cache_path:
+        _write_cache(cache_path, config)
     return config
+
+def check_references(conf):
+    """
+    Make sure modes show existing scenes and scenes use existing sprites.
+
+    The schema can't check names that are keys of other sections. Parameters
+    scenes set on their sprites must be attributes of the sprite type. Raises
+    ValueError listing everything missing.
+    """
+    problems = []
+    for scene_name, scene_conf in sorted(conf['scenes'].items()):
+        missing = scenes.sprite_names(scene_conf) - set(conf['sprites'])
+        if missing:
+            problems.append('scene {} uses unknown sprites {}'.format(
+                scene_name, ', '.join(sorted(missing))))
+        for sprite_data in scene_conf.get('sprites') or []:
+            for sprite_name, params in sprite_data.items():
+                if sprite_name in missing:
+                    continue
+                cls = sprites.SPRITE_TYPES[conf['sprites'][sprite_name]['type']]
+                for param in sorted(param for param in params or {} if not hasattr(cls, param)):
+                    problems.append('scene {} sets unknown parameter {} of sprite {}'.format(
+                        scene_name, param, sprite_name))
+    problems.extend(_mode_problems(conf['modes'], set(conf['scenes']),
+                                   conf['global'].get('default_mode')))
+    for display_name, display_conf in sorted((conf.get('displays') or {}).items()):
+        display_scenes = set(display_conf.get('scenes', conf['scenes']))
+        missing = display_scenes - set(conf['scenes'])
+        if missing:
+            problems.append('display {} shows unknown scenes {}'.format(
+                display_name, ', '.join(sorted(missing))))
+        if 'modes' in display_conf:
+            problems.extend('display {}: {}'.format(display_name, problem) for problem in
+                            _mode_problems(display_conf['modes'], display_scenes - missing,
+                                           display_conf.get('default_mode')))
+    if problems:
+        raise ValueError('; '.join(problems))
+
+def _mode_problems(modes, scene_names, default_mode):
+    """Problems with a modes config, given the scenes there are."""
+    problems = []
+    known = set(modes) | scene_names | set(BUILTIN_MODES)
+    for mode_name, scene_list in sorted(modes.items()):
+        for scene_info in scene_list:
+            if not isinstance(scene_info, dict):
+                problems.append('mode {} has an entry that is not a scene'.format(mode_name))
+                continue
+            for scene_name, params in scene_info.items():
+                if scene_name not in scene_names and scene_name != scenes.SCENE_BLANK:
+                    problems.append('mode {} shows unknown scene {}'.format(mode_name, scene_name))
+                if not isinstance(params, dict) or 'duration' not in params:
+                    problems.append('mode {} has no duration for scene {}'.format(
+                        mode_name, scene_name))
+                elif params.get('mode_after') not in known | set([None]):
+                    problems.append('mode {} is followed by unknown mode {}'.format(
+                        mode_name, params['mode_after']))
+    if default_mode is not None and default_mode not in known:
+        problems.append('default mode {} is unknown'.format(default_mode))
+    return problems
+
+def normalize_sprites(sprite_confs):
+    """
+    Run each sprite config through its sprite class schema.
+
+    This fills in all defaults once at load time so sprites built from this config
+    do not need to validate again.
+    """
+    for name, sprite_conf in sprite_confs.items():
+        params = dict(sprite_conf)
+        sprite_type = params.pop('type')
+        try:
+            params = sprites.SPRITE_TYPES[sprite_type].CONF(params)
+        except vol.Invalid:
+            LOG.error('Invalid config for sprite %s', name)
+            raise
+        params['type'] = sprite_type
+        sprite_confs[name] = params
+
+def _cache_path(path, raw, cache_dir):
+    """
+    Build a cache file name unique to this config file, its contents, the schemas
+    and this Python. None when there's no schema key.
+    """
+    if SCHEMA_KEY is None:
+        return None
+    path_key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+    content_key = hashlib.sha1(raw).hexdigest()
+    return os.path.join(cache_dir, '{}-{}-s{}-py{}{}.cache'.format(
+        path_key, content_key, SCHEMA_KEY, *sys.version_info[:2]))
+
+def _read_cache(cache_path):
+    """Read a cached config. Returns None on any problem so the caller rebuilds it."""
+    try:
+        with open(cache_path, 'rb') as cachefile:
+            return marshal.load(cachefile)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+def _write_cache(cache_path, config):
+    """Atomically write the cache and drop stale caches of the same config file."""
+    cache_dir, name = os.path.split(cache_path)
+    prefix = name.split('-')[0]
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        for old in os.listdir(cache_dir):
+            if old.startswith(prefix) and old != name:
+                os.remove(os.path.join(cache_dir, old))
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(tmp_path, 'wb') as cachefile:
+            marshal.dump(config, cachefile)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError, ValueError) as exc:
+        # caching is best-effort. e.g. read-only filesystem.
+        LOG.warning('Could not write config cache %s: %s', cache_path, exc)
+
+class ConfigWatcher(threading.Thread):
+    """
+    Watch a config file and hand newly validated configs to a callback.
+
+    Invalid edits are logged and ignored so a typo never takes down a running panel.
+    """
+
+    def __init__(self, path, callback, interval=1.0, cache_dir=CACHE_DIR):
+        threading.Thread.__init__(self, name='ConfigWatcher')
+        self.daemon = True
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.cache_dir = cache_dir
+        self._stop_event = threading.Event()
+        self._mtime = self._get_mtime()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            mtime = self._get_mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            try:
+                conf = load_config_yaml(self.path, cache_dir=self.cache_dir)
+            except (yaml.YAMLError, vol.Invalid, ValueError, KeyError) as exc:
+                LOG.error('Ignoring invalid config change in %s: %s', self.path, exc)
+                continue
+            LOG.info('Config file %s changed.', self.path)
+            self.callback(conf)
+
+    def stop(self):
+        """Stop watching."""
+        self._stop_event.set()
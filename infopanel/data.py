@@ -1,14 +1,177 @@
 """Input data that might come over MQTT or whatever."""
 
 import collections
+import logging
+import multiprocessing
+import threading
+
+from infopanel import commands as commands_, history as history_
+
+LOG = logging.getLogger(__name__)
 
 class InputData(collections.defaultdict):
-    """Container for all the live data."""
+    """
+    Container for all the live data.
+
+    Every write bumps ``version`` and wakes anyone in :py:meth:`wait_for_change`.
+    Writes to keys with history (see :py:meth:`track_history`) are also recorded there,
+    and control commands are queued for every :py:meth:`command_queue`.
+    """
     def __init__(self):
         collections.defaultdict.__init__(self)
+        self._command_queues = []
+        self._changed = threading.Condition()
+        self._version = 0
+        self.history = None  # a history.History, once some key is tracked
         self.default_factory = lambda: 0
         self['power'] = '1'
         self['mode'] = 'all'
         self['brightness'] = 100
         self['image_path'] = ''
         self['random'] = '0'
+
+    def __setitem__(self, key, value):
+        self._store(key, value)
+        self.notify()
+
+    def __missing__(self, key):
+        """Fill in the default of a key that was never written. Reading isn't a change."""
+        value = self.default_factory()
+        collections.defaultdict.__setitem__(self, key, value)
+        return value
+
+    def update(self, values):  # pylint: disable=arguments-differ
+        """Write a batch of values, waking waiters once."""
+        for key, value in values.items():
+            self._store(key, value)
+        self.notify()
+
+    def store(self, key, value):
+        """
+        Write a value without queueing it as a command.
+
+        For state a driver changed itself, like the mode it switched to, which
+        must not switch the other displays.
+        """
+        self._store(key, value, dispatch=False)
+        self.notify()
+
+    def _store(self, key, value, dispatch=True):
+        collections.defaultdict.__setitem__(self, key, value)
+        if self.history is not None:
+            self.history.record(key, value)
+        if dispatch and key in commands_.COMMANDS:
+            self._dispatch(key, value)
+
+    def command_queue(self):
+        """Get a new queue of every command written from now on."""
+        queue = commands_.CommandQueue()
+        self._command_queues.append(queue)
+        return queue
+
+    def _dispatch(self, key, value, sent_at=None):
+        for queue in self._command_queues:
+            queue.put(key, value, sent_at)
+
+    def track_history(self, key):
+        """Keep the history of a key, with the default tiers unless set up otherwise."""
+        if self.history is None:
+            self.history = history_.History()
+        self.history.track(key)
+
+    def sync(self):
+        """Catch up with data written elsewhere. Nothing to do here."""
+        pass
+
+    @property
+    def version(self):
+        """Counter that changes whenever any value changes."""
+        return self._version
+
+    def notify(self):
+        """Count a change and wake up waiters."""
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, since, timeout=None):
+        """Wait until ``version`` differs from ``since``. Returns False on timeout."""
+        with self._changed:
+            if self._version == since:
+                self._changed.wait(timeout)
+            return self._version != since
+
+
+class SharedInputData(InputData):
+    """
+    Live data that another process publishes into a :py:class:`infopanel.shared.SharedRegion`.
+
+    Reading a key picks up the newest value from the region if it was written since
+    the last read. Values set in this process (like clearing a command) stay local
+    until the other process writes that key again. The writer sets ``changed``
+    after each write and puts control commands on ``commands`` (pass both to
+    :py:class:`infopanel.shared.SharedDataWriter`).
+    """
+    def __init__(self, region):
+        self.region = region
+        self._sequences = {}
+        self._synced = None
+        self.changed = multiprocessing.Event()
+        self.commands = multiprocessing.SimpleQueue()  # puts are done when put() returns
+        self._commands_lock = threading.Lock()
+        InputData.__init__(self)
+
+    def _refresh(self, key):
+        slot = self.region.find(key)
+        if slot is None:
+            return
+        sequence = self.region.sequence(slot)
+        if sequence == self._sequences.get(key):
+            return
+        result = self.region.read(slot)
+        if result is None:
+            # left mid-write. Keep the last good value until it's written again.
+            LOG.warning('Shared value of %s is stuck mid-write. Keeping the last one.', key)
+            self._sequences[key] = sequence
+            return
+        self._sequences[key], value = result
+        collections.defaultdict.__setitem__(self, key, value)
+        if self.history is not None:
+            self.history.record(key, value)
+
+    def sync(self):
+        """
+        Pick up new commands, and new values of keys with history so none are
+        missed while unread.
+        """
+        with self._commands_lock:
+            while not self.commands.empty():
+                self._dispatch(*self.commands.get())
+        version = self.region.version
+        if self.history is not None and version != self._synced:
+            self._synced = version
+            for key in self.history.series:
+                self._refresh(key)
+
+    def __getitem__(self, key):
+        self._refresh(key)
+        return collections.defaultdict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._refresh(key)
+        return collections.defaultdict.get(self, key, default)
+
+    @property
+    def version(self):
+        return self._version + self.region.version
+
+    def notify(self):
+        with self._changed:
+            self._version += 1
+        self.changed.set()
+
+    def wait_for_change(self, since, timeout=None):
+        self.changed.clear()
+        if self.version == since:
+            self.changed.wait(timeout)
+        return self.version != since
@@ -1,6 +1,16 @@
 """Displays to present stuff."""
 
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
 from matplotlib import cm
+from PIL import Image as PILImage
 try:
     from rgbmatrix import graphics
     from rgbmatrix import RGBMatrix, RGBMatrixOptions
@@ -10,6 +20,8 @@ except ImportError:
 
 from infopanel import colors
 
+LOG = logging.getLogger(__name__)
+
 class Display(object):
     """
     A display screen.
@@ -73,13 +85,274 @@ class Display(object):
     def draw_rect(self, xpos, ypos, width, height, color):
         raise NotImplementedError
 
+    def add_frame_listener(self, listener, wanted=None):
+        """
+        Call ``listener(frame)`` every time a frame is buffered.
+
+        The frame is the raw RGB bytes of the whole display, row by row. Displays
+        that have to draw frames twice to provide them only do so while ``wanted()``,
+        if given, returns True (like while a preview has viewers).
+        """
+        raise NotImplementedError
+
+
+class FrameBufferDisplay(Display):
+    """
+    A headless display that draws into an in-memory RGB framebuffer.
+
+    Text is rasterized with :py:class:`infopanel.fonts.BDFFont` so frames match what
+    an RGB matrix would show.
+    """
+    def __init__(self, width, height):
+        Display.__init__(self)
+        self._width = width
+        self._height = height
+        self._brightness = 100
+        self.pixels = bytearray(width * height * 3)  # the frame being drawn
+        self.frame = bytes(self.pixels)  # the last buffered frame
+        self._listeners = []
+
+    @property
+    def width(self):
+        """Width of the display in pixels."""
+        return self._width
+
+    @property
+    def height(self):
+        """Height of the display in pixels."""
+        return self._height
+
+    @property
+    def brightness(self):
+        """Brightness of display from 0 to 100."""
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self._brightness = value
+
+    def set_pixel(self, x, y, red, green, blue):
+        """Set a pixel to a color. Pixels off the display are ignored."""
+        if 0 <= x < self._width and 0 <= y < self._height:
+            i = (y * self._width + x) * 3
+            pixels = self.pixels
+            pixels[i] = red
+            pixels[i + 1] = green
+            pixels[i + 2] = blue
+
+    def set_image(self, image, x=0, y=0):
+        """Apply an RGB PIL image (or bundled image) to the screen, clipped to the display."""
+        img_width, img_height = image.size
+        data = image.tobytes()
+        if not x and not y and img_width == self._width and img_height == self._height:
+            self.pixels[:] = data  # a whole frame
+            return
+        xmin, xmax = max(x, 0), min(x + img_width, self._width)
+        if xmin >= xmax:
+            return
+        for row in range(max(y, 0), min(y + img_height, self._height)):
+            src = ((row - y) * img_width + xmin - x) * 3
+            dest = (row * self._width + xmin) * 3
+            self.pixels[dest:dest + (xmax - xmin) * 3] = data[src:src + (xmax - xmin) * 3]
+
+    def text(self, font, x, y, red, green, blue, text):
+        """Render text in a font to a place on the screen in a certain color."""
+        return font.draw_text(self.set_pixel, x, y, red, green, blue, text, self._width)
+
+    def text_with_background(self, font, x, y, red, green, blue,  # pylint: disable=too-many-arguments
+                             background_r, background_g, background_b, text):
+        """Render text over a filled box."""
+        box_width = (len(text) * 5) + 1
+        self.draw_rect(x - 1, y - font.height + 1, box_width, font.height + 1,
+                       (background_r, background_g, background_b))
+        return self.text(font, x, y, red, green, blue, text)
+
+    def draw_rect(self, xpos, ypos, width, height, color):
+        """Fill a rectangle with an (r, g, b) color."""
+        red, green, blue = color
+        for y in range(ypos, ypos + height):
+            for x in range(xpos, xpos + width):
+                self.set_pixel(x, y, red, green, blue)
+
+    def clear(self):
+        """Clear the canvas."""
+        self.pixels[:] = bytearray(len(self.pixels))
+
+    def buffer(self):
+        """Make the drawn frame the current one and tell any listeners."""
+        self.frame = bytes(self.pixels)
+        for listener in self._listeners:
+            listener(self.frame)
+
+    def add_frame_listener(self, listener, wanted=None):  # pylint: disable=unused-argument
+        """Call ``listener(frame)`` with raw RGB bytes every time a frame is buffered."""
+        self._listeners.append(listener)
+
+
+class _Frame(object):  # pylint: disable=too-few-public-methods
+    """A raw RGB buffer that displays take like an image in ``set_image``."""
+
+    mode = 'RGB'
+
+    def __init__(self, size, data=None):
+        self.size = size
+        self.data = data
+
+    def tobytes(self):
+        """The raw pixels, without copying."""
+        return self.data
+
+    def as_pil(self):
+        """A PIL copy of the pixels, for the rgbmatrix library."""
+        return PILImage.frombytes('RGB', self.size, bytes(self.data))
+
+
+class PipelineStats(object):  # pylint: disable=too-few-public-methods
+    """Where the time of a pipelined display goes, in seconds."""
+
+    def __init__(self):
+        self.frames = 0
+        self.render = 0.0  # drawing frames
+        self.stalled = 0.0  # drawing waited for a free buffer
+        self.present = 0.0  # pushing frames, including any wait for vsync
+
+    def summary(self):
+        """Mean seconds per frame of each stage."""
+        frames = float(self.frames or 1)
+        return {'frames': self.frames, 'render': self.render / frames,
+                'stalled': self.stalled / frames, 'present': self.present / frames}
+
+
+class FramePipeline(object):
+    """
+    Hand drawn frame buffers to a presenter thread and get free ones back.
+
+    ``present(drawn)`` runs on the presenter thread, shows a buffer, and returns
+    one that's free to draw into again (the same one, or the one it replaced on
+    screen). If it raises, the error is logged, the frame is skipped, and its
+    buffer is reused, so drawing never waits on a buffer that won't come back.
+    """
+
+    def __init__(self, buffers, present):
+        self.stats = PipelineStats()
+        self._present = present
+        self._free = queue.Queue()
+        for free in buffers:
+            self._free.put(free)
+        self._ready = queue.Queue()
+        self._drawing_since = time.time()
+        self._thread = threading.Thread(target=self._run, name='infopanel-present')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def swap(self, drawn):
+        """Queue a drawn buffer for presenting and return a free one to draw into."""
+        now = time.time()
+        stats = self.stats
+        stats.render += now - self._drawing_since
+        self._ready.put(drawn)
+        free = self._free.get()
+        self._drawing_since = time.time()
+        stats.stalled += self._drawing_since - now
+        stats.frames += 1
+        return free
+
+    def _run(self):
+        while True:
+            drawn = self._ready.get()
+            try:
+                if drawn is None:
+                    return
+                start = time.time()
+                try:
+                    free = self._present(drawn)
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception('Could not present a frame. Skipping it.')
+                    free = drawn
+                self.stats.present += time.time() - start
+                self._free.put(free)
+            finally:
+                self._ready.task_done()
+
+    def flush(self):
+        """Wait until every queued frame has been presented."""
+        self._ready.join()
+
+    def stop(self):
+        """Present what's queued, then stop the presenter."""
+        self._ready.put(None)
+        self._thread.join()
+
+
+class PipelinedDisplay(FrameBufferDisplay):
+    """
+    Draw the next frame off-screen while a presenter thread pushes the last one.
+
+    Drawing goes into one of ``buffers`` framebuffers. :py:meth:`buffer` hands it to
+    the presenter thread, which copies it to the ``target`` display and buffers
+    that, and drawing carries on in a free buffer. With 2 buffers one frame is
+    drawn while another is shown, so the frame time approaches the longer of the
+    two instead of their sum. With 3, a finished frame can also wait while the
+    presenter is busy, which smooths out frames that take about as long to draw
+    as to present. RGB matrices pipeline their own canvases instead (see
+    :py:func:`pipeline_factory`).
+
+    Frame listeners and brightness belong to the target.
+    """
+
+    def __init__(self, target, buffers=2):
+        FrameBufferDisplay.__init__(self, target.width, target.height)
+        self.target = target
+        self._frame = _Frame((self.width, self.height))
+        self._pipeline = FramePipeline([bytearray(len(self.pixels))
+                                        for _i in range(buffers - 1)], self._present)
+        self.stats = self._pipeline.stats
+
+    @property
+    def brightness(self):
+        """Brightness of the target display from 0 to 100."""
+        return self.target.brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self.target.brightness = value
+
+    def add_frame_listener(self, listener, wanted=None):
+        """Listen to the frames the target shows."""
+        self.target.add_frame_listener(listener, wanted)
+
+    def buffer(self):
+        """Queue the drawn frame for presenting and carry on in a free buffer."""
+        self.pixels = self._pipeline.swap(self.pixels)
+
+    def _present(self, pixels):
+        self._frame.data = pixels
+        self.target.set_image(self._frame, 0, 0)
+        self.target.buffer()
+        return pixels
+
+    def flush(self):
+        """Wait until every buffered frame has been presented."""
+        self._pipeline.flush()
+
+    def stop(self):
+        """Present what's queued, then stop the presenter."""
+        self._pipeline.stop()
+
+
 class RGBMatrixDisplay(Display):
     """An RGB LED Matrix running off of the rgbmatrix library."""
     def __init__(self, matrix):
         Display.__init__(self)
         self._matrix = matrix
         self.canvas = matrix.CreateFrameCanvas()
+        self._canvases = [self.canvas]  # every off-screen canvas, for brightness
+        self._pipeline = None
         self.black = graphics.Color(0, 0, 0)
+        # the matrix can't be read back, so mirror drawing here when frames are wanted.
+        self._shadow = None
+        self._wanted = []  # callables saying whether some listener wants frames now
+        self._mirroring = False  # whether the frame being drawn is mirrored
 
     @property
     def width(self):
@@ -99,7 +372,8 @@ class RGBMatrixDisplay(Display):
     @brightness.setter
     def brightness(self, value):
         self._matrix.brightness = value
-        self.canvas.brightness = value
+        for canvas in self._canvases:
+            canvas.brightness = value
 
     def draw_rect(self, xpos, ypos, width, height, color):
         xmax = min(xpos + width, 32)
@@ -113,29 +387,101 @@ class RGBMatrixDisplay(Display):
         box_width = (len(text) * 5)+1
         self.draw_rect(x - 1, y - font.height + 1, box_width, y + 2, background_color)
 
+        if self._mirroring:
+            self._shadow.text_with_background(font, x, y, red, green, blue,
+                                              background_r, background_g, background_b, text)
         color = graphics.Color(red, green, blue)  # may require caching
-        return graphics.DrawText(self.canvas, font, x, y, color, text)
+        return graphics.DrawText(self.canvas, font.native, x, y, color, text)
 
     def text(self, font, x, y, red, green, blue, text):
         """Render text in a font to a place on the screen in a certain color."""
+        if self._mirroring:
+            self._shadow.text(font, x, y, red, green, blue, text)
         color = graphics.Color(red, green, blue)  # may require caching
-        return graphics.DrawText(self.canvas, font, x, y, color, text)
+        return graphics.DrawText(self.canvas, font.native, x, y, color, text)
 
     def set_pixel(self, x, y, red, green, blue):
         """Set a pixel to a color."""
+        if self._mirroring:
+            self._shadow.set_pixel(x, y, red, green, blue)
         self.canvas.SetPixel(x, y, red, green, blue)
 
     def set_image(self, image, x=0, y=0):
         """Apply an image to the screen."""
+        if self._mirroring:
+            self._shadow.set_image(image, x, y)
+        if hasattr(image, 'as_pil'):
+            image = image.as_pil()  # from an asset bundle
         self.canvas.SetImage(image, x, y)
 
     def clear(self):
         """Clear the canvas."""
+        self._mirroring = self._frames_wanted()
+        if self._mirroring:
+            self._shadow.clear()
         self.canvas.Clear()
 
     def buffer(self):
         """Swap the off-display canvas/buffer with the on-display one."""
-        self.canvas = self._matrix.SwapOnVSync(self.canvas)
+        if self._pipeline is None:
+            self.canvas = self._matrix.SwapOnVSync(self.canvas)
+        else:
+            self.canvas = self._pipeline.swap(self.canvas)
+        if self._mirroring:
+            self._shadow.buffer()
+        # frames drawn with a single set_image (like from a PipelinedDisplay) aren't cleared
+        self._mirroring = self._frames_wanted()
+
+    def _frames_wanted(self):
+        return any(wanted() for wanted in self._wanted)
+
+    def start_pipeline(self, buffers=2):
+        """
+        Draw the next frame into a spare canvas while a thread waits for vsync.
+
+        ``buffers`` canvases take turns being drawn or waiting to be shown, on top
+        of the one on the matrix. Frames are drawn natively, so this is cheaper
+        than wrapping the matrix in a :py:class:`PipelinedDisplay`.
+        """
+        spare = [self._matrix.CreateFrameCanvas() for _i in range(buffers - 1)]
+        for canvas in spare:
+            canvas.brightness = self.brightness
+        self._canvases.extend(spare)
+        self._pipeline = FramePipeline(spare, self._present)
+
+    def _present(self, canvas):
+        shown = self._matrix.SwapOnVSync(canvas)
+        if not any(shown is known for known in self._canvases):
+            self._canvases.append(shown)  # the one the matrix started with
+        return shown
+
+    @property
+    def stats(self):
+        """:py:class:`PipelineStats` once pipelining, else None."""
+        return self._pipeline.stats if self._pipeline else None
+
+    def flush(self):
+        """Wait until every drawn frame is on the matrix."""
+        if self._pipeline:
+            self._pipeline.flush()
+
+    def stop(self):
+        """Stop pipelining, after showing what's drawn."""
+        if self._pipeline:
+            self._pipeline.stop()
+            self._pipeline = None
+
+    def add_frame_listener(self, listener, wanted=None):
+        """
+        Call ``listener(frame)`` with raw RGB bytes every time a frame is buffered.
+
+        Drawing is only mirrored into a framebuffer for that while some listener's
+        ``wanted()`` is True, starting with the next frame.
+        """
+        if self._shadow is None:
+            self._shadow = FrameBufferDisplay(self.width, self.height)
+        self._shadow.add_frame_listener(listener)
+        self._wanted.append(wanted or (lambda: True))
 
 
 def rgbmatrix_options_factory(config):
@@ -157,15 +503,36 @@ def rgbmatrix_options_factory(config):
         options.disable_hardware_pulsing = True
     return options
 
+def pipeline_factory(disp, buffers):
+    """
+    Pipeline drawing with presenting a display, through ``buffers`` frame buffers.
+
+    RGB matrices swap their own canvases. Other displays get wrapped in a
+    :py:class:`PipelinedDisplay`. Either way, the result has ``stats`` and ``stop()``.
+    """
+    if isinstance(disp, RGBMatrixDisplay):
+        disp.start_pipeline(buffers)
+        return disp
+    return PipelinedDisplay(disp, buffers)
+
+
 def display_factory(config):
     """Build a display based on config settings."""
 
-    if 'RGBMatrix' in config:
+    if 'Network' in config:
+        from infopanel import network  # it builds on this module
+        net = config['Network']
+        display = network.NetworkDisplay(net['width'], net['height'], net['host'], net['port'],
+                                         net['protocol'], net['keyframe_interval'])
+    elif 'RGBMatrix' in config:
         if RGBMatrix is None:
             return Display()
         options = rgbmatrix_options_factory(config['RGBMatrix'])
         matrix = RGBMatrix(options=options)
         display = RGBMatrixDisplay(matrix)
+    elif 'FrameBuffer' in config:
+        display = FrameBufferDisplay(config['FrameBuffer']['width'],
+                                     config['FrameBuffer']['height'])
     else:
         raise ValueError('Unknown Display options. Check config file.')
     return display
@@ -3,13 +3,14 @@
 import threading
 import argparse
 import time
-import random
 import logging
 import os
 import itertools
-import subprocess
 
-from infopanel import mqtt, scenes, config, display, sprites, data
+import voluptuous as vol
+
+from infopanel import (assets, audio, bundle, mqtt, scenes, config, display, sprites, data, helpers,
+                       recording, shared, preview, history, startup, watcher)
 
 FRAME_DELAY_S = 0.005
 MODE_BLANK = 'blank'
@@ -17,21 +18,28 @@ MODE_ALL = 'all'
 MODE_ALL_DURATION = 5  # 5 second default scene duration.
 ON = '1'  # for MQTT processing
 OFF = '0'
+POWER_OFF = (OFF, OFF.encode('ascii'), 0)
+IDLE_REFRESH_S = 60.0  # re-show the blank frame this often while idle
+STATIC_REFRESH_S = 1.0  # redraw static scenes at least this often
+MAX_COMMANDS_PER_FRAME = 20  # more wait for the next frame, so frames stay bounded
+# what building a scene raises when its config is wrong or its files are missing
+SCENE_ERRORS = (KeyError, ValueError, TypeError, AttributeError, IOError, OSError, vol.Invalid)
 
 LOG = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARN)
 
 class Driver(object):  # pylint: disable=too-many-instance-attributes
     """Main controller for the infopanel."""
-    def __init__(self, disp, data_source):
+    def __init__(self, disp, data_source, name=None):
         LOG.info('Starting InfoPanel.')
+        self.name = name
         self.display = disp
         self.data_source = data_source
         self.sprites = {}  # name: list of sprites
         self.scenes = {}  # name: scene
-        self.durations_in_s = {}  # scene: seconds
+        self.durations_in_s = {}  # scene name: seconds
         self.mode_after = None
-        self.scene_sequence = []
+        self.scene_sequence = []  # scene names
         self._scene_iterator = itertools.cycle(self.scene_sequence)
         self._randomize_scenes = ON
         self._previous_mode = None
@@ -39,8 +47,21 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         self.modes = {}
         self.active_scene = None
         self._stop = threading.Event()
+        self.frame_delay = FRAME_DELAY_S
         self.interval = 2
         self._brightness = 70  # just used to detect changes in data. Should be handeled on data.
+        self.conf = None  # the config currently running, for diffing on reload.
+        self._pending_conf = None
+        self._reload_lock = threading.Lock()
+        # drivers of other displays sharing this data source. See link_drivers.
+        self.peers = [self]
+        self.commands = data_source.command_queue()
+        self.audio = None  # an audio.AudioWorker, shared by all displays
+        self._drawn = (None, None, None)  # scene, data version, and time of the last frame
+        self.build_scenes = 'mode'  # when scenes get built: all, mode, or shown
+        self.evict_after = None  # seconds a scene may go unshown before it's dropped
+        self.scene_memory = None  # bytes of RSS over which idle scenes are dropped
+        self._last_shown = {}  # scene name: when it was last shown (or built)
 
     def run(self):
         """
@@ -49,15 +70,38 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         Notes
         -----
         Uses the clock to figure out when to switch scenes instead of the number of frames
-        because some scenes are way slower than others.
+        because some scenes are way slower than others. Commands are applied before
+        every frame, and a new mode shows its first scene right away. While the active
+        scene is static and the data hasn't changed, the last frame stays up and the
+        loop sleeps until the data changes, the scene is due to change, a sprite like
+        a clock is due to look different, or ``STATIC_REFRESH_S`` passes.
         """
-        interval_start = time.time()
+        interval_start = helpers.CLOCK.time()
         while True:
             if self._stop.isSet():
                 break
-            self.draw_frame()
-            time.sleep(FRAME_DELAY_S)
-            now = time.time()
+            if self._pending_conf is not None:
+                self._apply_pending_conf()
+            if self._check_for_command():
+                interval_start = helpers.CLOCK.time()
+            if self.idle:
+                self._idle()
+                interval_start = helpers.CLOCK.time()
+                continue
+            now = helpers.CLOCK.time()
+            if self._frame_is_current(now):
+                since = self._drawn[1]
+                wake = min(self._drawn[2] + STATIC_REFRESH_S, interval_start + self.interval)
+                change = self.active_scene.next_change()  # like a clock's next minute
+                if change is not None:
+                    wake = min(wake, change)
+                helpers.CLOCK.wait(
+                    lambda timeout: self.data_source.wait_for_change(since, timeout),
+                    max(0.0, wake - now))
+            else:
+                self.draw_frame()
+                helpers.CLOCK.sleep(self.frame_delay)
+            now = helpers.CLOCK.time()
             if now - interval_start > self.interval:
                 interval_start = now
                 self._change_scene()
@@ -65,14 +109,133 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
     def stop(self):
         """Shut down the thread."""
         self._stop.set()
+        self.data_source.notify()  # in case it's idle
+
+    @property
+    def idle(self):
+        """True when suspended in blank mode or with the power off."""
+        return self._mode == MODE_BLANK or self.data_source['power'] in POWER_OFF
+
+    def _idle(self):
+        """
+        Blank the display once and sleep until something might wake us up.
+
+        That's a change in the data (commands included), a reload, or a stop.
+        """
+        LOG.info('Going idle.')
+        self._blank()
+        while not self._stop.is_set() and self._pending_conf is None:
+            since = self.data_source.version
+            self.data_source.sync()  # keep recording history while idle
+            self._check_for_command()
+            if not self.idle:
+                LOG.info('Waking up.')
+                self._change_scene()
+                return
+            if not helpers.CLOCK.wait(
+                    lambda timeout: self.data_source.wait_for_change(since, timeout),
+                    IDLE_REFRESH_S):
+                self._blank()  # keeps frame listeners (recordings, previews) in step
+
+    def _blank(self):
+        self.display.clear()
+        self.display.buffer()
+        startup.TRACE.frame_buffered()
+
+    def request_reload(self, conf):
+        """
+        Queue a new validated config to be swapped in at the next frame boundary.
+
+        Safe to call from another thread (e.g. a :py:class:`infopanel.config.ConfigWatcher`).
+        """
+        with self._reload_lock:
+            self._pending_conf = conf
+        self.data_source.notify()  # in case it's idle
+
+    def _apply_pending_conf(self):
+        with self._reload_lock:
+            conf, self._pending_conf = self._pending_conf, None
+        start = time.time()
+        self.reload_config(conf)
+        LOG.info('Reloaded config in %.1f ms', (time.time() - start) * 1000)
+
+    def reload_config(self, conf):
+        """
+        Rebuild only the sprites, scenes, and modes that changed in a new config.
+
+        Unchanged sprites and scenes are kept as-is, so their decoded images, fonts,
+        and state carry over. Changed ones are dropped and built again when needed.
+        The data source (and therefore MQTT) is untouched. A config with modes or
+        scenes that refer to missing scenes or sprites is logged and ignored.
+        """
+        try:
+            config.check_references(conf)
+        except ValueError as exc:
+            LOG.error('Keeping the running config. The new one has problems: %s', exc)
+            return
+        old = self.conf
+        if conf.get('mqtt') != old.get('mqtt') or conf.get('RGBMatrix') != old.get('RGBMatrix'):
+            LOG.warning('Changes to mqtt or RGBMatrix config require a restart.')
+        if conf['global'] != old['global'] or conf.get('sheets') != old.get('sheets'):
+            apply_global_config(conf)
+
+        old_sheets, new_sheets = old.get('sheets') or {}, conf.get('sheets') or {}
+        changed_sprites = set(name for name, sprite_conf in conf['sprites'].items()
+                              if old['sprites'].get(name) != sprite_conf or
+                              old_sheets.get(sprite_conf.get('sheet')) !=
+                              new_sheets.get(sprite_conf.get('sheet')))
+        removed_sprites = set(old['sprites']) - set(conf['sprites'])
+        stale_sprites = changed_sprites | removed_sprites
+
+        dirty_scenes = set(name for name, scene_conf in conf['scenes'].items()
+                           if old['scenes'].get(name) != scene_conf or
+                           stale_sprites & scenes.sprite_names(scene_conf))
+        removed_scenes = set(old['scenes']) - set(conf['scenes'])
+
+        for name in dirty_scenes | removed_scenes:
+            self._forget_scene(name)
+        self.sprites.configure(conf['sprites'], stale_sprites)
+        self.scenes.conf = dict(conf['scenes'])  # dirty ones are rebuilt when next needed
+        self.conf = conf
+        self.configure_scenes(conf)
+
+        LOG.info('Reload rebuilt sprites %s and scenes %s; removed sprites %s and scenes %s',
+                 sorted(changed_sprites), sorted(dirty_scenes),
+                 sorted(removed_sprites), sorted(removed_scenes))
+        if dirty_scenes or removed_scenes or conf['modes'] != old['modes']:
+            self._build_modes(conf)
+            mode = self._mode if self._mode in self.modes or self._mode in self.scenes else None
+            if mode is None:
+                mode = conf['global'].get('default_mode', MODE_ALL)
+                self.data_source.store('mode', mode)
+            self.active_scene = None
+            self.apply_mode(mode)
+            self._change_scene()
+
+    def _forget_scene(self, name):
+        """Drop a scene and stop tracking the sprite copies it owned."""
+        scene = self.scenes.pop(name, None)
+        self._last_shown.pop(name, None)
+        if scene is None:
+            return
+        for sprite in scene.sprites:
+            for copies in self.sprites.values():
+                if any(sprite is copy for copy in copies):
+                    copies[:] = [copy for copy in copies if copy is not sprite]
 
     def _change_scene(self):
         """Switch to another active_scene, maybe."""
         self._check_for_command()
         if self._randomize_scenes == ON:
-            new_scene = random.choice(self.scene_sequence)
+            name = helpers.RANDOM.choice(self.scene_sequence)
         else:
-            new_scene = next(self._scene_iterator)
+            name = next(self._scene_iterator)
+        new_scene = self._scene(name)  # built now if it wasn't yet
+        if new_scene is None:
+            self._skip_scene(name)
+            self._change_scene()
+            return
+        self._last_shown[name] = helpers.CLOCK.time()
 
         if new_scene is not self.active_scene:
             self.display.clear()
@@ -81,36 +244,112 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         else:
             if self.mode_after:
                 LOG.debug('Swapping to mode: %s', self.mode_after)
-                self.data_source['mode'] = self.mode_after
+                self.data_source.store('mode', self.mode_after)
                 self.apply_mode(self.mode_after)
                 self._change_scene()
                 return
 
         self.active_scene = new_scene
-        self.interval = self.durations_in_s[self.active_scene]
+        self.interval = self.durations_in_s[name]
+        self._evict_idle_scenes()
 
-    def _check_for_command(self):
-        """Process any incoming commands."""
-        if self.data_source['mode'] != self._mode:
-            self.apply_mode(self.data_source['mode'])
+    def _scene(self, name):
+        """The named scene, built now if need be, or None if it can't be built."""
+        try:
+            return self.scenes[name]
+        except SCENE_ERRORS as exc:
+            LOG.error('Skipping scene %s, which cannot be built: %s', name, exc)
+            return None
+
+    def _skip_scene(self, name):
+        """Take a scene that can't be built out of the current mode, leaving blank if empty."""
+        self.scene_sequence = [scene_name for scene_name in self.scene_sequence
+                               if scene_name != name]
+        if not self.scene_sequence:
+            self.scene_sequence = [scenes.SCENE_BLANK]
+            self.durations_in_s[scenes.SCENE_BLANK] = MODE_ALL_DURATION
+        self._scene_iterator = itertools.cycle(self.scene_sequence)
 
-        if self.data_source['brightness'] != self._brightness:
-            try:
-                self._brightness = int(self.data_source['brightness'])
-            except TypeError:
-                self._brightness = 100
-            self.display.brightness = self._brightness
+    def configure_scenes(self, conf):
+        """Apply the global settings for when scenes are built and dropped."""
+        global_conf = conf['global']
+        self.build_scenes = global_conf.get('build_scenes', 'mode')
+        self.evict_after = global_conf.get('evict_scenes_after')
+        memory_mb = global_conf.get('scene_memory_mb')
+        self.scene_memory = memory_mb * 1024 * 1024 if memory_mb else None
+        if self.build_scenes == 'all':
+            self.sprites.build_all()
+            for name in self.scenes.conf:
+                self._scene(name)
+            now = helpers.CLOCK.time()
+            for name in self.scenes.conf:
+                self._last_shown.setdefault(name, now)
+
+    def _evict_idle_scenes(self):
+        """
+        Drop built scenes that haven't been shown for a while, and sprites no scene uses.
 
-        if self.data_source['random'] != self._randomize_scenes:
-            self._randomize_scenes = self.data_source['random']
+        Scenes of the current mode are kept. With a memory budget, nothing is dropped
+        while the process is within it. Dropped scenes are built again when needed.
+        """
+        if self.evict_after is None:
+            return
+        if self.scene_memory is not None:
+            rss = helpers.rss_bytes()
+            if rss is not None and rss <= self.scene_memory:
+                return
+        cutoff = helpers.CLOCK.time() - self.evict_after
+        idle = [name for name in self.scenes.built
+                if name in self.scenes.conf and name not in self.scene_sequence and
+                self._last_shown.get(name, cutoff) < cutoff]
+        if not idle:
+            return
+        for name in idle:
+            self._forget_scene(name)
+        in_use = set()
+        for name in self.scenes.built:
+            if name in self.scenes.conf:
+                in_use.update(scenes.sprite_names(self.scenes.conf[name]))
+        unused = [name for name, copies in self.sprites.items()
+                  if name not in in_use and len(copies) == 1]
+        for name in unused:
+            del self.sprites[name]
+        LOG.info('Dropped idle scenes %s and sprites %s', sorted(idle), sorted(unused))
 
-        if self.data_source['image_path']:
-            self.change_image_path(self.data_source['image_path'])
-            self.data_source['image_path'] = ''  # clear it out in anticipation of next command.
+    def _check_for_command(self):
+        """
+        Apply queued commands in the order they came in.
 
-        if self.data_source['sound']:
-            self.play_sound(self.data_source['sound'])
-            self.data_source['sound'] = ''
+        Returns True if a new mode was applied, in which case its first scene is
+        already up.
+        """
+        self.data_source.sync()  # commands from another process
+        new_mode = False
+        for name, value, sent_at in self.commands.drain(MAX_COMMANDS_PER_FRAME):
+            if name == 'mode':
+                if value != self._mode:
+                    self.apply_mode(value)
+                    new_mode = True
+            elif name == 'brightness':
+                try:
+                    self._brightness = int(value)
+                except (TypeError, ValueError):
+                    self._brightness = 100
+                self.display.brightness = self._brightness
+            elif name == 'random':
+                if isinstance(value, bytes):
+                    value = value.decode('utf-8', 'replace')
+                self._randomize_scenes = str(value)  # batches may send 1 rather than '1'
+            elif name == 'image_path':
+                if value:
+                    self.change_image_path(value)
+            elif name == 'sound':
+                if value and self is self.peers[0]:  # one display plays it for all
+                    self.play_sound(value)
+            self.commands.applied(name, sent_at)
+        if new_mode and self.scene_sequence:
+            self._change_scene()
+        return new_mode
 
     def apply_mode(self, mode):
         """
@@ -122,26 +361,36 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         if mode not in self.modes:
             if mode in self.scenes:
                 # allow mode names to be any scene name to get just that mode.
-                scene = self.scenes[mode]
-                self.scene_sequence = [scene]
-                self.durations_in_s[scene] = MODE_ALL_DURATION
+                self.scene_sequence = [mode]
+                self.durations_in_s[mode] = MODE_ALL_DURATION
             else:
                 LOG.error('Invalid mode: %s', mode)
                 return
         else:
             self.scene_sequence = []
             for scene_name, duration, mode_after in self.modes[mode]:
-                scene = self.scenes[scene_name]
-                self.scene_sequence.append(scene)
-                self.durations_in_s[scene] = duration
+                self.scene_sequence.append(scene_name)
+                self.durations_in_s[scene_name] = duration
                 self.mode_after = mode_after
+        if self.build_scenes == 'mode':
+            for scene_name in list(self.scene_sequence):
+                if scene_name in self.scenes.built:
+                    continue
+                if self._scene(scene_name) is None:
+                    self._skip_scene(scene_name)
+                else:
+                    self._last_shown.setdefault(scene_name, helpers.CLOCK.time())
         self._scene_iterator = itertools.cycle(self.scene_sequence)
         self._previous_mode = self._mode  # for suspend/resume
         self._mode = mode
 
     def play_sound(self, soundpath):
-        LOG.info('Playing sound: %s', '/home/pi/sounds/'+os.path.normpath(soundpath)+'.wav')
-        subprocess.Popen(['aplay', '-D', 'hw:1,0', '/home/pi/sounds/'+os.path.normpath(soundpath)+'.wav'])
+        """Queue a sound by name, like ``doorbell`` for doorbell.wav in the sound directory."""
+        if self.audio is None:
+            LOG.warning('No audio set up. Not playing %s', soundpath)
+            return
+        LOG.info('Playing sound: %s', soundpath)
+        self.audio.play(soundpath)
 
     def change_image_path(self, pathsetting):
         """
@@ -151,11 +400,15 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         """
         try:
             sprite_name, new_path = pathsetting.split('=')
-        except ValueError:
+        except (AttributeError, TypeError, ValueError):
             LOG.error('Path change string %s invalid. Format: spritename=newpath', pathsetting)
             return
-        sprites = self.sprites.get(sprite_name)
+        sprites = self.sprites.get(sprite_name, [])  # other displays get the command too
         LOG.debug('Setting %s path to %s', sprite_name, new_path)
+        if sprite_name in self.sprites.config:
+            self.sprites.paths[sprite_name] = new_path  # for when it's built (again)
+            if not sprites:
+                return
         if not sprites:
             LOG.warning('No sprite named %s to modify.', sprite_name)
             return
@@ -165,15 +418,52 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
         except AttributeError:
             LOG.warning('The %s sprite cannot have its path modified.', sprite_name)
 
+    def memory_report(self):
+        """
+        Bytes of loaded assets, in total, by asset, and by sprite and built scene.
+
+        Assets shared between sprites or scenes count towards each of them.
+        """
+        report = assets.MANAGER.report()
+        report['sprites'] = dict(
+            (name, assets.MANAGER.nbytes(key for sprite in copies for key in sprite.asset_keys()))
+            for name, copies in self.sprites.items())
+        report['scenes'] = dict(
+            (name, assets.MANAGER.nbytes(key for sprite in scene.sprites
+                                         for key in sprite.asset_keys()))
+            for name, scene in self.scenes.built.items())
+        return report
+
     def draw_frame(self):
         """Perform a double-buffered draw frame and frame switch."""
+        self.data_source.sync()
+        self._drawn = (self.active_scene, self.data_source.version, helpers.CLOCK.time())
         self.display.clear()
         self.active_scene.draw_frame(self.display)
         self.display.buffer()
+        startup.TRACE.frame_buffered()
+
+    def _frame_is_current(self, now):
+        """True if the frame on display is what drawing the active scene again would give."""
+        scene, version, drawn_at = self._drawn
+        if not (scene is self.active_scene and version == self.data_source.version and
+                now - drawn_at < STATIC_REFRESH_S and scene.is_static()):
+            return False
+        change = scene.next_change()
+        return change is None or now < change
 
     def init_modes(self, conf):
         """Process modes from configuration."""
+        self._build_modes(conf)
+        default_mode = conf['global'].get('default_mode', MODE_ALL)
+        self.apply_mode(default_mode)
+        self.data_source.store('mode', default_mode)
+        self._change_scene()
+
+    def _build_modes(self, conf):
+        """Build the mode table from configuration and the current scenes."""
         modeconf = conf['modes']
+        self.modes = {}
         self.modes[MODE_BLANK] = [(scenes.SCENE_BLANK, 2.0, None)]  # blank mode for suspend
 
         for mode_name, scenelist in modeconf.items():
@@ -189,52 +479,216 @@ class Driver(object):  # pylint: disable=too-many-instance-attributes
                 continue
             self.modes[MODE_ALL].append((scene_name, MODE_ALL_DURATION, None))
 
-        default_mode = conf['global'].get('default_mode', MODE_ALL)
-        self.apply_mode(default_mode)
-        self.data_source['mode'] = default_mode
-        self._change_scene()
-
 
-def driver_factory(disp, data_src, conf):
+def driver_factory(disp, data_src, conf, name=None):
     """Build factory and add scenes and sprites."""
-    driver = Driver(disp, data_src)
-    driver.sprites = sprites.sprite_factory(conf['sprites'], data_src, disp)
-    driver.scenes = scenes.scene_factory(disp.width, disp.height,
-                                         conf['scenes'], driver.sprites)
-    driver.init_modes(conf)
+    driver = Driver(disp, data_src, name)
+    driver.conf = conf
+    driver.sprites = sprites.SpriteTable(conf['sprites'], data_src, disp, validated=True)
+    driver.scenes = scenes.SceneTable(disp.width, disp.height, conf['scenes'], driver.sprites)
+    with startup.TRACE.phase('scenes'):
+        driver.configure_scenes(conf)
+    with startup.TRACE.phase('modes'):
+        driver.init_modes(conf)
     return driver
 
+def link_drivers(drivers):
+    """
+    Let drivers of several displays know about each other.
+
+    Each gets every command from their common data source, but sounds are only
+    played by the first.
+    """
+    for driver in drivers:
+        driver.peers = list(drivers)
+
+def display_configs(conf):
+    """List (name, display config) for every display. The name is None for a single display."""
+    if conf.get('displays'):
+        return sorted(conf['displays'].items())
+    return [(None, conf)]
+
+def display_view(conf, name):
+    """
+    Get the config as seen by one display of a multi-display config.
+
+    Only the display's scenes (if listed) are kept, and its modes and default mode
+    replace the top-level ones. Top-level modes it inherits lose the scenes it
+    doesn't have, and modes left empty are dropped, as is a default mode that's
+    gone (for ``all``).
+    """
+    if name is None:
+        return conf
+    display_conf = conf['displays'][name]
+    view = dict(conf)
+    if 'scenes' in display_conf:
+        view['scenes'] = dict((scene_name, conf['scenes'][scene_name])
+                              for scene_name in display_conf['scenes'])
+    if 'modes' in display_conf:
+        view['modes'] = display_conf['modes']
+    elif 'scenes' in display_conf:
+        view['modes'] = _modes_showing(conf['modes'], set(view['scenes']))
+    if 'default_mode' in display_conf:
+        view['global'] = dict(conf['global'], default_mode=display_conf['default_mode'])
+    elif conf['global'].get('default_mode') not in (
+            set(view['modes']) | set(view['scenes']) | set([MODE_ALL, MODE_BLANK, None])):
+        LOG.info('Display %s has no scenes of default mode %s. Using %s.',
+                 name, conf['global']['default_mode'], MODE_ALL)
+        view['global'] = dict(conf['global'], default_mode=MODE_ALL)
+    return view
+
+def _modes_showing(modeconf, scene_names):
+    """Modes config cut down to the given scenes, without modes left empty."""
+    modes = {}
+    for mode_name, scenelist in modeconf.items():
+        kept = [sceneinfo for sceneinfo in scenelist
+                if all(scene_name in scene_names or scene_name == scenes.SCENE_BLANK
+                       for scene_name in sceneinfo)]
+        if kept:
+            modes[mode_name] = kept
+    known = set(modes) | scene_names | set([MODE_ALL, MODE_BLANK])
+    for mode_name, scenelist in modes.items():
+        modes[mode_name] = [
+            dict((scene_name, _without_mode_after(scene_params, known))
+                 for scene_name, scene_params in sceneinfo.items())
+            for sceneinfo in scenelist]
+    return modes
+
+def _without_mode_after(scene_params, known):
+    """Scene params of a mode, without a mode_after that isn't in ``known``."""
+    if not isinstance(scene_params, dict) or scene_params.get('mode_after') in known:
+        return scene_params
+    return dict((key, value) for key, value in scene_params.items() if key != 'mode_after')
+
+def run_drivers(drivers):
+    """Run each driver in its own render thread until they all stop."""
+    threads = []
+    for driver in drivers:
+        thread = threading.Thread(target=driver.run, name='render-{}'.format(driver.name))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)  # with a timeout so KeyboardInterrupt gets through
+    finally:
+        for driver in drivers:
+            driver.stop()
+
 def apply_global_config(conf):
     """Apply config items that are global in nature."""
-    from infopanel import helpers
     helpers.FONT_DIR = os.path.expandvars(conf['global']['font_dir'])
-
-def run(conf_file=None):
+    bundle.SHEETS = conf.get('sheets') or {}
+    bundle_path = conf['global'].get('asset_bundle')
+    bundle.use(os.path.expandvars(bundle_path) if bundle_path else None)
+    memory_mb = conf['global'].get('asset_memory_mb')
+    assets.MANAGER.budget = memory_mb * 1024 * 1024 if memory_mb else None
+    scenes.VECTORIZE = conf['global'].get('vectorize', False)
+    if conf['global'].get('seed') is not None:
+        helpers.seed_random(conf['global']['seed'])
+
+def run(conf_file=None, watch=False, record=None, seed=None):
     """Run the screen."""
+    startup.TRACE.mark('python and imports')
     if not conf_file:
         parser = argparse.ArgumentParser()
         parser.add_argument("--config", action="store", help="Point to a YAML configuration file.",
                             default='/etc/infopanel/infopanel.yaml')
+        parser.add_argument("--watch", action="store_true",
+                            help="Reload changed sprites, scenes, and modes when the config "
+                                 "file changes.")
+        parser.add_argument("--record", action="store",
+                            help="Record every frame to this file. See infopanel.recording.")
+        parser.add_argument("--seed", action="store", type=int,
+                            help="Seed the random number generator for a reproducible run.")
 
         args = parser.parse_args()
         conf_file = args.config
-    conf = config.load_config_yaml(conf_file)
-    apply_global_config(conf)
-    disp = display.display_factory(conf)
-    datasrc = data.InputData()
-    infopanel = driver_factory(disp, datasrc, conf)
-
-    if conf.get('mqtt'):
-        client = mqtt.MQTTClient(datasrc, conf['mqtt'])
-        client.start()
+        watch = args.watch
+        record = args.record
+        seed = args.seed
+    with startup.TRACE.phase('config'):
+        conf = config.load_config_yaml(conf_file)
+    with startup.TRACE.phase('global config'):
+        apply_global_config(conf)
+    if seed is not None:
+        helpers.seed_random(seed)
+    if conf.get('mqtt') and conf['mqtt']['separate_process']:
+        region = shared.SharedRegion.create()
+        datasrc = data.SharedInputData(region)
+        client = mqtt.IngestProcess(region, conf['mqtt'], datasrc.changed, datasrc.commands)
+    else:
+        region = None
+        datasrc = data.InputData()
+        client = mqtt.MQTTClient(datasrc, conf['mqtt']) if conf.get('mqtt') else None
+    datasrc.history = history.history_factory(conf)
+    drivers = []
+    recorders = []
+    previews = []
+    pipelines = []
+    for name, display_conf in display_configs(conf):
+        with startup.TRACE.phase('display'):
+            disp = display.display_factory(display_conf)
+        frame_buffers = conf['global'].get('frame_buffers', 1)
+        if frame_buffers > 1:
+            disp = display.pipeline_factory(disp, frame_buffers)
+            pipelines.append(disp)
+        if conf.get('preview'):
+            previews.append(preview.preview_factory(disp, conf['preview'], len(drivers)))
+        if record:
+            path = record
+            if name is not None:
+                root, ext = os.path.splitext(record)
+                path = '{}.{}{}'.format(root, name, ext)
+            recorder = recording.FrameRecorder(path, disp.width, disp.height,
+                                               clock=helpers.CLOCK.time)
+            disp.add_frame_listener(recorder)
+            recorders.append(recorder)
+        drivers.append(driver_factory(disp, datasrc, display_view(conf, name), name))
+        if conf.get('preview'):
+            previews[-1].memory_report = drivers[-1].memory_report
+    link_drivers(drivers)
+    player = audio.audio_factory(conf)
+    for driver in drivers:
+        driver.audio = player
+
+    if client:
+        with startup.TRACE.phase('mqtt'):
+            client.start()
+    player.start()
+    for server in previews:
+        server.start()
+    if watch:
+        def reload_all(new_conf):
+            for driver in drivers:
+                driver.request_reload(display_view(new_conf, driver.name))
+        config_watcher = config.ConfigWatcher(conf_file, reload_all)
+        config_watcher.start()
     else:
-        client = None
+        config_watcher = None
+    asset_watcher = watcher.watcher_factory(conf)
     try:
-        # infopanel.start()  # multiple threads
-        infopanel.run()  # main thread
+        if len(drivers) == 1:
+            drivers[0].run()  # main thread
+        else:
+            run_drivers(drivers)
     finally:
+        if config_watcher:
+            config_watcher.stop()
+        if asset_watcher:
+            asset_watcher.stop()
+        for pipeline in pipelines:
+            pipeline.stop()
+        for recorder in recorders:
+            recorder.close()
+        for server in previews:
+            server.stop()
+        player.stop()
         if client:
             client.stop()
+        if region:
+            region.close()
         LOG.info('Quitting.')
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+"""
+Pure-Python BDF fonts.
+
+These rasterize text exactly like the rgbmatrix library's ``graphics.DrawText`` so
+that displays without the rgbmatrix library (framebuffers, recordings, previews)
+draw the same pixels as the real panel.
+"""
+
+import logging
+import sys
+
+try:
+    from rgbmatrix import graphics
+except ImportError:
+    graphics = None
+
+LOG = logging.getLogger(__name__)
+REPLACEMENT_CHAR = 0xFFFD
+
+
+class BDFFont(object):
+    """
+    A bitmap font loaded from a BDF file.
+
+    Has the same ``height``, ``baseline`` and ``CharacterWidth`` interface as
+    ``rgbmatrix.graphics.Font``. When the rgbmatrix library is available the
+    equivalent native font is loaded too, as ``native``, and the glyphs are only
+    parsed here once something needs them (like pre-rendered text).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.height = 0
+        self.baseline = 0
+        self._glyphs = {}  # codepoint: (advance, ((dx, dy), ...)) relative to baseline
+        self.native = None
+        if path:
+            self.LoadFont(path)
+
+    def LoadFont(self, path):  # pylint: disable=invalid-name
+        """Load glyphs from a BDF file."""
+        self.path = path
+        if graphics is None:
+            self._load(path)
+            return
+        self.native = graphics.Font()
+        self.native.LoadFont(path)
+        with open(path) as fontfile:
+            self._parse(fontfile, header_only=True)
+        self._glyphs = None
+
+    def _load(self, path):
+        self._glyphs = {}
+        with open(path) as fontfile:
+            self._parse(fontfile)
+
+    @property
+    def glyphs(self):
+        """Glyphs by codepoint, parsed on first use."""
+        if self._glyphs is None:
+            self._load(self.path)
+        return self._glyphs
+
+    def _parse(self, lines, header_only=False):
+        codepoint = advance = None
+        bbx = None
+        bitmap = None
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            keyword = fields[0]
+            if header_only and keyword == 'CHARS':
+                return
+            if bitmap is not None and keyword != 'ENDCHAR':
+                bitmap.append(fields[0])
+            elif keyword == 'FONTBOUNDINGBOX':
+                self.height = int(fields[2])
+                self.baseline = self.height + int(fields[4])
+            elif keyword == 'ENCODING':
+                codepoint = int(fields[1])
+            elif keyword == 'DWIDTH':
+                advance = int(fields[1])
+            elif keyword == 'BBX':
+                bbx = [int(field) for field in fields[1:5]]
+            elif keyword == 'BITMAP':
+                bitmap = []
+            elif keyword == 'ENDCHAR':
+                if codepoint is not None and codepoint >= 0 and bbx is not None:
+                    self._glyphs[codepoint] = (advance, _glyph_pixels(bbx, bitmap))
+                codepoint = advance = bbx = bitmap = None
+
+    def nbytes(self):
+        """Rough memory use of the glyphs parsed so far, in bytes."""
+        return sum(sys.getsizeof(pixels) + len(pixels) * sys.getsizeof((0, 0))
+                   for _advance, pixels in (self._glyphs or {}).values())
+
+    def CharacterWidth(self, char):  # pylint: disable=invalid-name
+        """Width in pixels of a character, by codepoint."""
+        glyph = self._find_glyph(char)
+        return glyph[0] if glyph else -1
+
+    def _find_glyph(self, codepoint):
+        glyph = self.glyphs.get(codepoint)
+        if glyph is None:
+            glyph = self.glyphs.get(REPLACEMENT_CHAR)
+        return glyph
+
+    def render_strip(self, segments):
+        """Rasterize ``(text, (r, g, b))`` segments, end to end, into a :py:class:`TextStrip`."""
+        pixels = []
+
+        def collect(x, y, red, green, blue):
+            pixels.append((x, y, red, green, blue))
+
+        x = 0
+        for text, (red, green, blue) in segments:
+            x += self.draw_text(collect, x, 0, red, green, blue, text)
+        return TextStrip(x, pixels)
+
+    def text_width(self, text):
+        """Width of some text in pixels, without drawing it."""
+        width = 0
+        for char in text:
+            glyph = self._find_glyph(ord(char))
+            if glyph is not None:
+                width += glyph[0]
+        return width
+
+    def draw_text(self, set_pixel, x, y, red, green, blue, text, clip_width=None):  # pylint: disable=too-many-arguments
+        """
+        Draw text with its baseline at y by calling ``set_pixel(x, y, r, g, b)``.
+
+        Glyphs that can't land between 0 and ``clip_width`` aren't drawn. Returns the
+        width of the text in pixels, like ``graphics.DrawText``.
+        """
+        start = x
+        overhang = self.height  # glyphs may stick out of their advance a bit
+        for char in text:
+            glyph = self._find_glyph(ord(char))
+            if glyph is None:
+                continue
+            advance, pixels = glyph
+            if clip_width is None or -overhang < x + advance and x < clip_width + overhang:
+                for dx, dy in pixels:
+                    set_pixel(x + dx, y + dy, red, green, blue)
+            x += advance
+        return x - start
+
+
+class TextStrip(object):  # pylint: disable=too-few-public-methods
+    """
+    Text rasterized once into columns of lit pixels, for cheap scrolling.
+
+    Blitting only visits the columns that land on the display, so it costs the
+    same however long the text is.
+    """
+
+    def __init__(self, width, pixels):
+        self.width = width  # advance, like draw_text returns
+        self.origin = min([x for x, _y, _r, _g, _b in pixels] or [0])  # glyphs may hang left
+        end = max([x + 1 for x, _y, _r, _g, _b in pixels] or [0])
+        columns = [[] for _x in range(end - self.origin)]
+        for x, y, red, green, blue in pixels:
+            columns[x - self.origin].append((y, red, green, blue))
+        self.columns = tuple(tuple(column) for column in columns)
+        # rough memory use, for the asset manager
+        self.nbytes = (sys.getsizeof(self.columns) +
+                       sum(sys.getsizeof(column) for column in self.columns) +
+                       len(pixels) * sys.getsizeof((0, 0, 0, 0)))
+
+    def blit(self, set_pixel, x, y, display_width):
+        """Draw the part of the strip visible on a display with its left edge at x."""
+        offset = x + self.origin
+        columns = self.columns
+        for col in range(max(0, -offset), min(len(columns), display_width - offset)):
+            screen_x = offset + col
+            for dy, red, green, blue in columns[col]:
+                set_pixel(screen_x, y + dy, red, green, blue)
+
+
+def _glyph_pixels(bbx, bitmap):
+    """Lit pixel offsets of a glyph relative to its origin on the baseline."""
+    width, height, x_offset, y_offset = bbx
+    top = -height - y_offset
+    pixels = []
+    for row_num, row in enumerate(bitmap[:height]):
+        bits = int(row, 16)
+        num_bits = len(row) * 4
+        for col in range(width):
+            if bits >> (num_bits - 1 - col) & 1:
+                pixels.append((x_offset + col, top + row_num))
+    return tuple(pixels)
@@ -1,40 +1,67 @@
 """Helpers."""
 
-import datetime
+import logging
 import os
+import random
 
+from infopanel import assets, fonts, clock
+
+LOG = logging.getLogger(__name__)
+# All randomness comes from here so runs can be made reproducible with seed_random.
+RANDOM = random.Random()
+# All waiting and time of day comes from here so it can be virtualized.
+CLOCK = clock.Clock()
 
 FONTS = {}
 FONT_DIR = None
 
+def seed_random(seed):
+    """Seed the shared random number generator for reproducible runs."""
+    RANDOM.seed(seed)
+
 def day_of_week():
     """Get day of week, like MONDAY."""
-    today = datetime.datetime.today()
+    today = CLOCK.now()
     return today.strftime("%A").upper()
 
 def time_now():
     """Current time like 17:05."""
-    now = datetime.datetime.now()
+    now = CLOCK.now()
     return now.strftime('%H:%M')
 
 def date():
     """Date today, like: FEB 02"""
-    now = datetime.datetime.now()
+    now = CLOCK.now()
     return now.strftime('%b %d').upper()
 
 def load_font(name):
+    """
+    Load a BDF font from the font directory, with caching.
 
-
-    global FONTS
+    Returns a :py:class:`infopanel.fonts.BDFFont`, or None if the font can't be read.
+    """
     font = FONTS.get(name)
 
-    if font is None:
+    if font is None and name not in FONTS:
         # cache it
+        if FONT_DIR is None:
+            LOG.warning('No font_dir configured. Cannot load font %s', name)
+            FONTS[name] = None
+            return None
         try:
-            from rgbmatrix import graphics
-            font = graphics.Font()
-            font.LoadFont(os.path.join(FONT_DIR, name))  # slow.
-        except ImportError:
+            font = fonts.BDFFont(os.path.join(FONT_DIR, name))  # slow.
+        except (IOError, OSError, ValueError) as exc:
+            LOG.warning('Could not load font %s: %s', name, exc)
             font = None
+        else:
+            assets.MANAGER.pin(('font', font.path), font, font.nbytes())
         FONTS[name] = font
     return font
+
+def rss_bytes():
+    """Resident memory of this process in bytes, or None where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -0,0 +1,131 @@
+"""
+Recent history of selected data keys, for graphs.
+
+Each tracked key has one fixed-size ring of float32 values per tier, one slot per
+``resolution`` seconds, averaging whatever arrived in that time. Slot times are
+implicit in the slot position, so memory per key is just
+``4 * sum(capacity)`` bytes no matter how often values come in. Slots that got no
+values are NaN.
+"""
+
+import array
+import math
+
+from infopanel import helpers
+
+# (seconds per slot, number of slots): the last hour at 10 s and the last day at 5 min.
+DEFAULT_TIERS = ((10, 360), (300, 288))
+NAN = float('nan')
+
+
+class Series(object):
+    """Averages of a value over consecutive fixed-length time slots."""
+
+    __slots__ = ('resolution', 'capacity', 'values', '_slot', '_sum', '_count')
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.values = array.array('f', [NAN]) * capacity
+        self._slot = None  # absolute slot number of the newest value
+        self._sum = 0.0
+        self._count = 0
+
+    def add(self, timestamp, value):
+        """Fold a value into the slot for its time. Values for older slots are dropped."""
+        slot = int(timestamp // self.resolution)
+        if self._slot is None or slot > self._slot:
+            if self._slot is not None:
+                for skipped in range(self._slot + 1, min(slot, self._slot + self.capacity + 1)):
+                    self.values[skipped % self.capacity] = NAN
+            self._slot = slot
+            self._sum = 0.0
+            self._count = 0
+        elif slot < self._slot:
+            return
+        self._sum += value
+        self._count += 1
+        self.values[slot % self.capacity] = self._sum / self._count
+
+    def latest(self, num, now=None):
+        """The last ``num`` slot values up to now, oldest first. NaN where there's nothing."""
+        num = min(num, self.capacity)
+        if self._slot is None:
+            return [NAN] * num
+        end = self._slot if now is None else max(self._slot, int(now // self.resolution))
+        values = self.values
+        return [values[slot % self.capacity] if end - slot < self.capacity and slot <= self._slot
+                else NAN for slot in range(end - num + 1, end + 1)]
+
+    def times(self, num, now=None):
+        """Start times of the slots that :py:meth:`latest` returns."""
+        end = self._slot if now is None else max(self._slot or 0, int(now // self.resolution))
+        num = min(num, self.capacity)
+        return [slot * self.resolution for slot in range(end - num + 1, end + 1)]
+
+
+class History(object):
+    """
+    Tiered series for each tracked key.
+
+    Values that aren't numbers (like ``'unknown'``) are ignored.
+    """
+
+    def __init__(self, keys=(), tiers=DEFAULT_TIERS):
+        self.tiers = tuple(sorted(tuple(tier) for tier in tiers))
+        self.series = {}
+        for key in keys:
+            self.track(key)
+
+    def __contains__(self, key):
+        return key in self.series
+
+    def track(self, key):
+        """Start keeping history of a key."""
+        if key not in self.series:
+            self.series[key] = [Series(resolution, capacity)
+                                for resolution, capacity in self.tiers]
+
+    @property
+    def nbytes(self):
+        """Memory used by the values of all keys."""
+        return sum(series.values.itemsize * series.capacity
+                   for tiers in self.series.values() for series in tiers)
+
+    def record(self, key, value, timestamp=None):
+        """Add a value for a tracked key."""
+        tiers = self.series.get(key)
+        if tiers is None:
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if math.isnan(value):
+            return
+        if timestamp is None:
+            timestamp = helpers.CLOCK.time()
+        for series in tiers:
+            series.add(timestamp, value)
+
+    def recent(self, key, num, span):
+        """
+        Up to ``num`` values covering the last ``span`` seconds, oldest first.
+
+        Uses the finest tier that reaches back that far, one value per slot.
+        """
+        tiers = self.series.get(key)
+        if not tiers:
+            return []
+        for series in tiers:
+            if series.resolution * series.capacity >= span:
+                break
+        slots = max(1, int(math.ceil(float(span) / series.resolution)))
+        return series.latest(min(num, slots), helpers.CLOCK.time())
+
+
+def history_factory(conf):
+    """Build the history store from the optional ``history`` config section."""
+    if not conf.get('history'):
+        return None
+    return History(conf['history']['keys'], conf['history']['tiers'])
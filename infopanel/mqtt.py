@@ -1,11 +1,14 @@
 """MQTT client to get data into the display from some data source."""
 
 import logging
+import multiprocessing
 
 import paho.mqtt.client as mqtt
-import json
+
+from infopanel import payloads, shared
 
 LOG = logging.getLogger(__name__)
+STOP_TIMEOUT_S = 5.0  # for the ingestion process to disconnect and exit
 
 class MQTTClient(object):
     """MQTT Client."""
@@ -14,6 +17,7 @@ class MQTTClient(object):
         self._client = None
         self._data_container = data_container
         self.conf = conf
+        self.deltas = payloads.DeltaTracker()
 
     def on_connect(self, client, userdata, flags, rc):  # pylint: disable=unused-argument, invalid-name
         """Callback for when MQTT server connects."""
@@ -24,26 +28,39 @@ class MQTTClient(object):
         """Callback for when MQTT receives a message."""
         LOG.debug("%s %s", msg.topic, str(msg.payload))
         key = msg.topic.split('/')[-1]
-        if key == 'multi':
-            self.handle_json_message(msg.payload)
-        elif msg.topic in self.conf['mappings']:
+        mappings = self.conf.get('mappings') or {}
+        if key in payloads.BATCH_TOPICS:
+            self.handle_batch(key, msg.payload)
+            return
+        payload = msg.payload
+        if isinstance(payload, bytes):  # always, on Python 3
+            payload = payload.decode('utf-8', 'replace')
+        if msg.topic in mappings:
             LOG.debug("Found topic %s", msg.topic)
-            if msg.payload in self.conf['mappings'][msg.topic]:
-                LOG.debug("Found Handle %s: %s", msg.payload, self.conf['mappings'][msg.topic])
-                self.handle_json_message(self.conf['mappings'][msg.topic][msg.payload])
+            if payload in mappings[msg.topic]:
+                LOG.debug("Found Handle %s: %s", payload, mappings[msg.topic])
+                self.handle_json_message(mappings[msg.topic][payload])
         else:
-            self._data_container[key] = msg.payload
+            self._data_container[key] = payload
 
-    def handle_json_message(self, payload):
+    def handle_batch(self, topic, payload):
+        """Decode a batch of values (see :py:mod:`infopanel.payloads`) and write them at once."""
         try:
-            if isinstance(payload, basestring):
-                values = json.loads(payload)
-            else:
-                values = payload
-            for valueKey, value in values.iteritems():
-                self._data_container[valueKey] = value
-        except ValueError, e:
-            LOG.debug("Bad JSON", e)
+            values = payloads.decode(topic, payload)
+            if topic == 'delta':
+                values = self.deltas.accept(values)
+        except ValueError as exc:
+            LOG.warning("Bad %s message: %s", topic, exc)
+            return
+        if values:
+            self._data_container.update(values)
+
+    def handle_json_message(self, payload):
+        """Write every value of a JSON object, or of an already decoded dict."""
+        if isinstance(payload, dict):
+            self._data_container.update(payload)
+        else:
+            self.handle_batch('multi', payload)
 
     def start(self):
         """Connect to the MQTT server."""
@@ -62,3 +79,55 @@ class MQTTClient(object):
     def stop(self):
         """End the MQTT connection."""
         self._client.loop_stop()
+
+
+def _ingest(conf, region_name, changed, commands, stop):
+    """Child process body: write MQTT data into the shared region until told to stop."""
+    region = shared.SharedRegion.attach(region_name)
+    client = MQTTClient(shared.SharedDataWriter(region, changed, commands), conf)
+    client.start()
+    try:
+        stop.wait()
+    finally:
+        client.stop()  # waits for a message being written, so no slot is left mid-write
+        region.close()
+
+
+class IngestProcess(object):
+    """
+    Run an :py:class:`MQTTClient` in a child process.
+
+    Parsing, payload decoding and logging then happen outside the render process, which
+    reads the values from ``region`` (see :py:class:`infopanel.data.SharedInputData`)
+    and the control commands from ``commands``. Has the same ``start``/``stop``
+    interface as the client.
+    """
+
+    def __init__(self, region, conf, changed=None, commands=None):
+        self.region = region
+        self.conf = conf
+        self.changed = changed
+        self.commands = commands
+        self._stop = multiprocessing.Event()
+        self._process = None
+
+    def start(self):
+        """Start the ingestion process."""
+        LOG.info('Starting MQTT ingestion process')
+        self._stop.clear()
+        self._process = multiprocessing.Process(target=_ingest, name='infopanel-mqtt',
+                                                args=(self.conf, self.region.name, self.changed,
+                                                      self.commands, self._stop))
+        self._process.daemon = True
+        self._process.start()
+
+    def stop(self):
+        """Stop the ingestion process, killing it only if it doesn't stop in time."""
+        if self._process is not None:
+            self._stop.set()
+            self._process.join(STOP_TIMEOUT_S)
+            if self._process.is_alive():
+                LOG.warning('MQTT ingestion process did not stop. Terminating it.')
+                self._process.terminate()
+                self._process.join()
+            self._process = None
@@ -0,0 +1,376 @@
+"""
+Stream frames over the network to a remote panel.
+
+A fast machine runs the scenes with a ``Network`` display, which sends each
+buffered frame to a Pi that just shows them::
+
+    python -m infopanel.network --config infopanel.yaml --port 5005
+
+Frames go out as deltas against the previous frame: each changed row is trimmed to
+the span that changed and run-length encoded. Every packet has a sequence number;
+a receiver that misses one ignores deltas until the next keyframe, which is sent
+every ``keyframe_interval`` frames, and after any send error. UDP or TCP can be
+used. The sender connects (again) in the background of sending frames, so the
+receiver may start after it or restart.
+"""
+
+import argparse
+import logging
+import socket
+import struct
+import sys
+import time
+
+from PIL import Image as PILImage
+
+from infopanel import display
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'IPNF'
+PACKET = struct.Struct('<4sBIdHHH')  # magic, kind, sequence, sent time, width, height, spans
+SPAN = struct.Struct('<IH')  # first pixel, number of runs
+RUN = struct.Struct('<B3s')  # run length, rgb
+LENGTH = struct.Struct('<I')  # prefix for each packet on TCP
+DELTA = 0
+KEYFRAME = 1
+MAX_UDP_PAYLOAD = 65507
+STATS_INTERVAL = 60.0
+CONNECT_TIMEOUT_S = 1.0
+RECONNECT_S = 2.0  # between tries to reach a receiver that's down
+
+
+def _encode_runs(pixels):
+    """Run-length encode raw RGB bytes as (count, rgb) runs."""
+    runs = []
+    count = 0
+    current = None
+    for i in range(0, len(pixels), 3):
+        rgb = pixels[i:i + 3]
+        if rgb == current and count < 255:
+            count += 1
+        else:
+            if current is not None:
+                runs.append(RUN.pack(count, current))
+            current = rgb
+            count = 1
+    if current is not None:
+        runs.append(RUN.pack(count, current))
+    return runs
+
+
+def encode_frame(frame, previous, width, height, sequence, keyframe=False, sent=None):  # pylint: disable=too-many-arguments
+    """
+    Encode a frame as a packet.
+
+    Keyframes encode every row; deltas only the rows that differ from
+    ``previous``, trimmed to the pixels that changed.
+    """
+    row_size = width * 3
+    spans = []
+    for row in range(height):
+        start = row * row_size
+        end = start + row_size
+        if not keyframe and frame[start:end] == previous[start:end]:
+            continue
+        if not keyframe:
+            while frame[start:start + 3] == previous[start:start + 3]:
+                start += 3
+            while frame[end - 3:end] == previous[end - 3:end]:
+                end -= 3
+        runs = _encode_runs(frame[start:end])
+        spans.append(SPAN.pack(start // 3, len(runs)) + b''.join(runs))
+    header = PACKET.pack(MAGIC, KEYFRAME if keyframe else DELTA, sequence,
+                         time.time() if sent is None else sent, width, height, len(spans))
+    return header + b''.join(spans)
+
+
+class Packet(object):  # pylint: disable=too-few-public-methods
+    """A decoded packet header."""
+
+    def __init__(self, data):
+        (magic, self.kind, self.sequence, self.sent,
+         self.width, self.height, self.num_spans) = PACKET.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('Not an infopanel frame packet')
+        self.data = data
+
+    def apply(self, pixels):
+        """Write this packet's pixels into a bytearray frame."""
+        offset = PACKET.size
+        data = self.data
+        for _span in range(self.num_spans):
+            first, num_runs = SPAN.unpack_from(data, offset)
+            offset += SPAN.size
+            i = first * 3
+            for _run in range(num_runs):
+                count, rgb = RUN.unpack_from(data, offset)
+                offset += RUN.size
+                pixels[i:i + count * 3] = rgb * count
+                i += count * 3
+
+
+class SenderStats(object):
+    """Bandwidth and encoding time of a sender."""
+
+    def __init__(self):
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes = 0
+        self.encode_time = 0.0
+        self.started = time.time()
+
+    def summary(self):
+        """One line describing the stats so far."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        return ('sent {} frames ({} keyframes), {:.1f} kB/s, {:.0f} B/frame, '
+                '{:.2f} ms/frame encoding'.format(
+                    self.frames, self.keyframes, self.bytes / elapsed / 1000.0,
+                    self.bytes / float(max(self.frames, 1)),
+                    1000.0 * self.encode_time / max(self.frames, 1)))
+
+
+class ReceiverStats(object):
+    """Frames, losses, bandwidth and latency seen by a receiver."""
+
+    def __init__(self):
+        self.frames = 0
+        self.dropped = 0
+        self.lost = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started = time.time()
+
+    def add_latency(self, latency):
+        """Record send-to-apply latency of one frame."""
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def summary(self):
+        """One line describing the stats so far."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        return ('shown {} frames, {} lost, {} dropped, {:.1f} kB/s, latency {:.2f} ms mean '
+                '{:.2f} ms max'.format(
+                    self.frames, self.lost, self.dropped, self.bytes / elapsed / 1000.0,
+                    1000.0 * self.latency_total / max(self.frames, 1),
+                    1000.0 * self.latency_max))
+
+
+class FrameSender(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Send frames to a receiver. Use as a display frame listener.
+
+    The connection is made with the first frame, and made again after an error,
+    at most every ``RECONNECT_S``. Frames until then are skipped, and the first
+    one sent after an error is a keyframe. The clocks of both machines must agree
+    for the latency stats to mean anything.
+    """
+
+    def __init__(self, host, port, width, height, protocol='udp', keyframe_interval=30):  # pylint: disable=too-many-arguments
+        self.address = (host, port)
+        self.width = width
+        self.height = height
+        self.protocol = protocol
+        self.keyframe_interval = keyframe_interval
+        self.sequence = 0
+        self.stats = SenderStats()
+        self._previous = None  # the last frame the receiver got, as far as we know
+        self._socket = None
+        self._retry_at = 0.0
+
+    def _connect(self):
+        """Open the socket if it isn't. Returns False while waiting to retry."""
+        if self._socket is not None:
+            return True
+        now = time.time()
+        if now < self._retry_at:
+            return False
+        try:
+            if self.protocol == 'tcp':
+                self._socket = socket.create_connection(self.address, CONNECT_TIMEOUT_S)
+                self._socket.settimeout(None)
+                LOG.info('Sending frames to %s:%d', *self.address)
+            else:
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except socket.error as err:
+            LOG.warning('Could not connect to %s:%d: %s', self.address[0], self.address[1], err)
+            self._retry_at = now + RECONNECT_S
+            return False
+        return True
+
+    def __call__(self, frame):
+        """Encode and send one frame."""
+        if not self._connect():
+            return
+        start = time.time()
+        keyframe = self._previous is None or not self.sequence % self.keyframe_interval
+        packet = encode_frame(frame, self._previous, self.width, self.height, self.sequence,
+                              keyframe, sent=start)
+        self.stats.encode_time += time.time() - start
+        try:
+            if self.protocol == 'tcp':
+                self._socket.sendall(LENGTH.pack(len(packet)) + packet)
+            elif len(packet) > MAX_UDP_PAYLOAD:
+                LOG.warning('Frame %d is too big for UDP (%d bytes)', self.sequence, len(packet))
+                frame = None
+            else:
+                self._socket.sendto(packet, self.address)
+        except socket.error as err:
+            LOG.warning('Could not send frame %d: %s', self.sequence, err)
+            self.close()
+            self._retry_at = time.time() + RECONNECT_S
+            frame = None
+        self._previous = frame  # None makes the next frame a keyframe
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        self.stats.frames += 1
+        self.stats.keyframes += keyframe
+        self.stats.bytes += len(packet)
+        if self.stats.frames % 1000 == 0:
+            LOG.info('Network display %s', self.stats.summary())
+
+    def close(self):
+        """Close the connection."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class NetworkDisplay(display.FrameBufferDisplay):
+    """A display that draws into a framebuffer and sends each frame to a receiver."""
+
+    def __init__(self, width, height, host, port, protocol='udp', keyframe_interval=30):  # pylint: disable=too-many-arguments
+        display.FrameBufferDisplay.__init__(self, width, height)
+        self.sender = FrameSender(host, port, width, height, protocol, keyframe_interval)
+        self.add_frame_listener(self.sender)
+
+
+class FrameReceiver(object):
+    """
+    Receive frames and apply them to a display.
+
+    Call :py:meth:`serve_forever`, or :py:meth:`receive` for one packet.
+    """
+
+    def __init__(self, disp, port, host='', protocol='udp'):
+        self.display = disp
+        self.protocol = protocol
+        self.stats = ReceiverStats()
+        self.pixels = None
+        self._size = None
+        self._expected = None  # next sequence number, or None while waiting for a keyframe
+        self._last_report = time.time()
+        self._connection = None
+        if protocol == 'tcp':
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind((host, port))
+            self._server.listen(1)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._server.bind((host, port))
+        self.port = self._server.getsockname()[1]
+
+    def _read_packet(self):
+        if self.protocol != 'tcp':
+            return self._server.recv(MAX_UDP_PAYLOAD)
+        while True:
+            if self._connection is None:
+                self._connection, address = self._server.accept()
+                LOG.info('Frames coming from %s', address)
+                self._expected = None
+            try:
+                length = LENGTH.unpack(self._recv_exactly(LENGTH.size))[0]
+                return self._recv_exactly(length)
+            except (EOFError, socket.error):
+                self._connection.close()
+                self._connection = None
+
+    def _recv_exactly(self, size):
+        chunks = []
+        while size:
+            chunk = self._connection.recv(size)
+            if not chunk:
+                raise EOFError
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def receive(self):
+        """Receive one packet. Returns True if it was shown."""
+        data = self._read_packet()
+        self.stats.bytes += len(data)
+        try:
+            packet = Packet(data)
+        except (ValueError, struct.error):
+            LOG.debug('Ignoring bad packet')
+            return False
+        return self.handle(packet)
+
+    def handle(self, packet):
+        """Apply a packet and show the frame, unless a packet before it went missing."""
+        if self._expected is not None and packet.sequence != self._expected:
+            self.stats.lost += (packet.sequence - self._expected) & 0xFFFFFFFF
+            self._expected = None
+        if packet.kind == KEYFRAME:
+            if self._size != (packet.width, packet.height):
+                self._size = (packet.width, packet.height)
+                self.pixels = bytearray(packet.width * packet.height * 3)
+        elif self._expected is None:
+            self.stats.dropped += 1  # can't apply a delta without its base frame
+            return False
+        packet.apply(self.pixels)
+        self._expected = (packet.sequence + 1) & 0xFFFFFFFF
+        self.show()
+        self.stats.frames += 1
+        self.stats.add_latency(time.time() - packet.sent)
+        return True
+
+    def show(self):
+        """Push the current frame to the display."""
+        self.display.set_image(PILImage.frombytes('RGB', self._size, bytes(self.pixels)))
+        self.display.buffer()
+
+    def serve_forever(self):
+        """Show frames until interrupted, logging stats now and then."""
+        while True:
+            self.receive()
+            if time.time() - self._last_report > STATS_INTERVAL:
+                LOG.info('Network receiver %s', self.stats.summary())
+                self._last_report = time.time()
+
+    def close(self):
+        """Stop listening."""
+        if self._connection:
+            self._connection.close()
+        self._server.close()
+
+
+def main(argv=None):
+    """Receive frames from the network and show them on the panel."""
+    from infopanel import config
+    parser = argparse.ArgumentParser(description='Show frames sent by a Network display.')
+    parser.add_argument('--config', default='/etc/infopanel/infopanel.yaml',
+                        help='YAML configuration file with the RGBMatrix section.')
+    parser.add_argument('--port', type=int, default=5005, help='Port to listen on.')
+    parser.add_argument('--tcp', action='store_true', help='Use TCP instead of UDP.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    conf = config.load_config_yaml(args.config)
+    if not conf.get('RGBMatrix'):
+        parser.error('{} has no RGBMatrix section'.format(args.config))
+    disp = display.display_factory({'RGBMatrix': conf['RGBMatrix']})
+    receiver = FrameReceiver(disp, args.port, protocol='tcp' if args.tcp else 'udp')
+    try:
+        receiver.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        LOG.info('Network receiver %s', receiver.stats.summary())
+        receiver.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Faster-than-realtime offline rendering.
+
+Runs the normal :py:class:`infopanel.driver.Driver` against a headless framebuffer
+on a virtual clock, as fast as the CPU allows, and streams the frames to a raw
+video file or an image sequence::
+
+    python -m infopanel.offline --config infopanel.yaml --duration 60 --output demo.rgb
+    ffmpeg -f rawvideo -pix_fmt rgb24 -s 64x32 -r 30 -i demo.rgb demo.webm
+
+Use an output with a ``%`` in it (like ``frames/frame_%05d.png``) for an image
+sequence. Leave the output off for a soak run that just exercises the scenes.
+"""
+
+import argparse
+import math
+import sys
+import time
+
+from PIL import Image as PILImage
+
+from infopanel import clock, config, data, display, driver, helpers, history
+
+PANEL_COLUMNS = 32
+DEFAULT_SIZE = (64, 32)
+
+
+def framebuffer_size(conf):
+    """Width and height of the panel described by a config."""
+    matrix = conf.get('RGBMatrix')
+    if not matrix:
+        return DEFAULT_SIZE
+    return PANEL_COLUMNS * matrix['led-chain'], matrix['led-rows'] * matrix['led-parallel']
+
+
+class RawVideoWriter(object):
+    """Write frames as headerless rgb24 video. A path of ``-`` means stdout."""
+
+    def __init__(self, path):
+        if path == '-':
+            self._file = getattr(sys.stdout, 'buffer', sys.stdout)
+        else:
+            self._file = open(path, 'wb')
+
+    def __call__(self, frame):
+        self._file.write(frame)
+
+    def close(self):
+        """Finish writing."""
+        if self._file is not getattr(sys.stdout, 'buffer', sys.stdout):
+            self._file.close()
+
+
+class ImageSequenceWriter(object):
+    """Write each frame as an image, e.g. to ``frames/frame_%05d.png``."""
+
+    def __init__(self, pattern, width, height, scale=1):
+        self.pattern = pattern
+        self.size = (width, height)
+        self.scale = scale
+        self.num_frames = 0
+
+    def __call__(self, frame):
+        image = PILImage.frombytes('RGB', self.size, frame)
+        if self.scale != 1:
+            image = image.resize((self.size[0] * self.scale, self.size[1] * self.scale),
+                                 PILImage.NEAREST)
+        image.save(self.pattern % self.num_frames)
+        self.num_frames += 1
+
+    def close(self):
+        """Nothing to finish."""
+        pass
+
+
+def render(conf, duration, fps, writer=None, seed=None, size=None, start=None):  # pylint: disable=too-many-arguments
+    """
+    Render a config for some seconds of virtual time at a constant frame rate.
+
+    Frames are written to ``writer(frame)``, repeating frames where a scene (like
+    Blank) waits longer than one frame. Returns the number of frames written.
+    """
+    num_frames = int(round(duration * fps))
+    previous_clock = helpers.CLOCK
+    virtual = clock.VirtualClock(start)
+    helpers.CLOCK = virtual
+    try:
+        driver.apply_global_config(conf)
+        if seed is not None:
+            helpers.seed_random(seed)
+        width, height = size or framebuffer_size(conf)
+        disp = display.FrameBufferDisplay(width, height)
+        datasrc = data.InputData()
+        datasrc.history = history.history_factory(conf)
+        infopanel = driver.driver_factory(disp, datasrc, conf)
+        infopanel.frame_delay = 1.0 / fps
+        t_start = virtual.time()
+        emitted = [0]
+
+        def on_frame(frame):
+            """Emit the frame for every frame slot up to now."""
+            due = int(math.floor((virtual.time() - t_start) * fps + 1e-6)) + 1
+            for _i in range(min(due, num_frames) - emitted[0]):
+                if writer:
+                    writer(frame)
+                emitted[0] += 1
+            if emitted[0] >= num_frames:
+                infopanel.stop()
+
+        disp.add_frame_listener(on_frame)
+        if num_frames:
+            infopanel.run()
+    finally:
+        helpers.CLOCK = previous_clock
+    return emitted[0]
+
+
+def main(argv=None):
+    """Render a config offline from the command line."""
+    parser = argparse.ArgumentParser(description='Render infopanel scenes offline, '
+                                                 'faster than real time.')
+    parser.add_argument('--config', default='/etc/infopanel/infopanel.yaml',
+                        help='Point to a YAML configuration file.')
+    parser.add_argument('--output', help='Raw rgb24 video file (or - for stdout), or an '
+                                         'image file pattern like frames/%%05d.png')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds of virtual time to render.')
+    parser.add_argument('--fps', type=float, default=30.0, help='Output frames per second.')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible output.')
+    parser.add_argument('--scale', type=int, default=1, help='Upscale factor for images.')
+    parser.add_argument('--size', help='Override the display size, like 64x32.')
+    args = parser.parse_args(argv)
+
+    conf = config.load_config_yaml(args.config)
+    size = tuple(int(dim) for dim in args.size.split('x')) if args.size else None
+    width, height = size or framebuffer_size(conf)
+    if not args.output:
+        writer = None
+    elif '%' in args.output:
+        writer = ImageSequenceWriter(args.output, width, height, args.scale)
+    else:
+        writer = RawVideoWriter(args.output)
+    wall_start = time.time()
+    try:
+        num_frames = render(conf, args.duration, args.fps, writer, args.seed, (width, height))
+    finally:
+        if writer:
+            writer.close()
+    elapsed = time.time() - wall_start
+    sys.stderr.write('Rendered {} frames ({:.1f} s) of {}x{} in {:.2f} s: {:.1f}x real time.\n'
+                     ''.format(num_frames, args.duration, width, height, elapsed,
+                               args.duration / elapsed if elapsed else float('inf')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Batched MQTT payloads.
+
+Publishers with many values can send them in one message, to one of these topics
+under the root topic:
+
+``multi``
+    A JSON object of key: value.
+``multipack``
+    The same as a MessagePack map, which is smaller, and faster to decode with
+    the ``msgpack`` package.
+``delta``
+    Only the values that changed, as ``{"seq": 12, "values": {...}}`` in JSON or
+    MessagePack. ``seq`` counts up by one per message (per ``source``, if there
+    are several publishers). Older messages that arrive late are dropped, and gaps
+    are counted. Send ``"reset": true`` when a publisher starts counting again.
+
+MessagePack is decoded with the ``msgpack`` package if it's installed, and with
+the small pure-Python decoder here otherwise. Decoding happens on the MQTT client's
+thread (or in its process, with ``separate_process``), never while rendering. To
+compare how fast each format decodes::
+
+    python -m infopanel.payloads --keys 50 --messages 2000
+"""
+
+import argparse
+import json
+import logging
+import struct
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LOG = logging.getLogger(__name__)
+
+BATCH_TOPICS = frozenset(['multi', 'multipack', 'delta'])
+REORDER_WINDOW = 100  # a seq this far behind the last means the publisher restarted
+
+_FIXED = {0xc0: None, 0xc2: False, 0xc3: True}
+_STRUCTS = {0xca: struct.Struct('>f'), 0xcb: struct.Struct('>d'),
+            0xcc: struct.Struct('>B'), 0xcd: struct.Struct('>H'),
+            0xce: struct.Struct('>I'), 0xcf: struct.Struct('>Q'),
+            0xd0: struct.Struct('>b'), 0xd1: struct.Struct('>h'),
+            0xd2: struct.Struct('>i'), 0xd3: struct.Struct('>q')}
+_LENGTHS = {0xc4: _STRUCTS[0xcc], 0xc5: _STRUCTS[0xcd], 0xc6: _STRUCTS[0xce],  # bin
+            0xd9: _STRUCTS[0xcc], 0xda: _STRUCTS[0xcd], 0xdb: _STRUCTS[0xce],  # str
+            0xdc: _STRUCTS[0xcd], 0xdd: _STRUCTS[0xce],  # array
+            0xde: _STRUCTS[0xcd], 0xdf: _STRUCTS[0xce]}  # map
+
+
+def _unpack(data, offset):  # pylint: disable=too-many-return-statements, too-many-branches
+    """Decode the MessagePack object at offset. Returns it and the offset after it."""
+    byte = data[offset]
+    offset += 1
+    if byte <= 0x7f:
+        return byte, offset
+    if byte >= 0xe0:
+        return byte - 0x100, offset
+    if 0xa0 <= byte <= 0xbf:
+        length, kind = byte & 0x1f, 'str'
+    elif 0x90 <= byte <= 0x9f:
+        length, kind = byte & 0x0f, 'array'
+    elif 0x80 <= byte <= 0x8f:
+        length, kind = byte & 0x0f, 'map'
+    elif byte in _FIXED:
+        return _FIXED[byte], offset
+    elif byte in _STRUCTS:
+        fmt = _STRUCTS[byte]
+        return fmt.unpack_from(data, offset)[0], offset + fmt.size
+    elif byte in _LENGTHS:
+        fmt = _LENGTHS[byte]
+        length = fmt.unpack_from(data, offset)[0]
+        offset += fmt.size
+        kind = ('bin' if byte <= 0xc6 else 'str' if byte <= 0xdb else
+                'array' if byte <= 0xdd else 'map')
+    else:
+        raise ValueError('Unsupported MessagePack type 0x{:02x}'.format(byte))
+    if kind in ('str', 'bin'):
+        end = offset + length
+        if end > len(data):
+            raise ValueError('MessagePack data is truncated')
+        raw = bytes(data[offset:end])
+        return (raw.decode('utf-8') if kind == 'str' else raw), end
+    if kind == 'array':
+        items = []
+        for _i in range(length):
+            item, offset = _unpack(data, offset)
+            items.append(item)
+        return items, offset
+    mapping = {}
+    for _i in range(length):
+        key, offset = _unpack(data, offset)
+        mapping[key], offset = _unpack(data, offset)
+    return mapping, offset
+
+
+def unpackb(payload):
+    """Decode MessagePack bytes. Raises ValueError if they're malformed."""
+    if msgpack is not None:
+        try:
+            return msgpack.unpackb(payload, raw=False)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise ValueError('Bad MessagePack: {}'.format(exc))
+    return unpackb_python(payload)
+
+
+def unpackb_python(payload):
+    """Decode MessagePack bytes without the msgpack package."""
+    data = bytearray(payload)
+    try:
+        value, offset = _unpack(data, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise ValueError('Bad MessagePack: {}'.format(exc))
+    if offset != len(data):
+        raise ValueError('Extra data after MessagePack object')
+    return value
+
+
+def _pack(value, out):  # pylint: disable=too-many-branches
+    if value is None:
+        out.append(0xc0)
+    elif value is True or value is False:
+        out.append(0xc3 if value else 0xc2)
+    elif isinstance(value, int):
+        if 0 <= value <= 0x7f or -32 <= value < 0:
+            out.extend(struct.pack('>b', value) if value < 0 else bytearray([value]))
+        elif -2 ** 63 <= value < 0:
+            out.extend(struct.pack('>Bq', 0xd3, value))
+        elif value <= 0xffffffff:
+            out.extend(struct.pack('>BI', 0xce, value))
+        else:
+            out.extend(struct.pack('>BQ', 0xcf, value))
+    elif isinstance(value, float):
+        out.extend(struct.pack('>Bd', 0xcb, value))
+    elif isinstance(value, (bytes, bytearray)):
+        out.extend(struct.pack('>BI', 0xc6, len(value)))
+        out.extend(value)
+    elif isinstance(value, str):
+        raw = value.encode('utf-8')
+        if len(raw) <= 31:
+            out.append(0xa0 | len(raw))
+        else:
+            out.extend(struct.pack('>BI', 0xdb, len(raw)))
+        out.extend(raw)
+    elif isinstance(value, (list, tuple)):
+        out.extend(struct.pack('>BI', 0xdd, len(value)))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        out.extend(struct.pack('>BI', 0xdf, len(value)))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        raise TypeError('Cannot pack {!r} as MessagePack'.format(value))
+
+
+def packb(value):
+    """Encode plain values (like a dict of readings) as MessagePack, for publishers and tests."""
+    if msgpack is not None:
+        return msgpack.packb(value, use_bin_type=True)
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+def decode_json(payload):
+    """Decode JSON from bytes or text. Raises ValueError if it's malformed."""
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    return json.loads(payload)
+
+
+def _decode_any(payload):
+    """JSON if it looks like a JSON object, else MessagePack."""
+    if payload.lstrip()[:1] in (b'{', '{'):
+        return decode_json(payload)
+    return unpackb(payload)
+
+
+def decode(topic, payload):
+    """Decode a batch payload from one of the :py:data:`BATCH_TOPICS` into a dict."""
+    if topic == 'multi':
+        values = decode_json(payload)
+    elif topic == 'multipack':
+        values = unpackb(payload)
+    else:
+        values = _decode_any(payload)
+    if not isinstance(values, dict):
+        raise ValueError('Expected a map, got {}'.format(type(values).__name__))
+    return values
+
+
+class DeltaTracker(object):
+    """Sequence numbers of delta messages, per source."""
+
+    def __init__(self):
+        self.last = {}  # source: seq
+        self.applied = 0
+        self.stale = 0
+        self.gaps = 0
+
+    def accept(self, message):
+        """The values of a delta message to apply, or None if it's stale."""
+        try:
+            seq, values = int(message['seq']), message['values']
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Delta messages need a seq and values')
+        if not isinstance(values, dict):
+            raise ValueError('Delta values must be a map')
+        source = message.get('source', '')
+        last = self.last.get(source)
+        if last is not None and not message.get('reset') and last - REORDER_WINDOW < seq <= last:
+            self.stale += 1
+            LOG.debug('Dropping stale delta %d from %r (at %d)', seq, source, last)
+            return None
+        if last is not None and seq > last + 1 and not message.get('reset'):
+            self.gaps += seq - last - 1
+            LOG.warning('Missed %d delta messages from %r', seq - last - 1, source)
+        self.last[source] = seq
+        self.applied += 1
+        return values
+
+
+def _sample(num_keys):
+    values = {}
+    for num in range(num_keys):
+        if num % 4 == 3:
+            values['sensor_{}'.format(num)] = 'state {}'.format(num)
+        else:
+            values['sensor_{}'.format(num)] = num * 1.5
+    return values
+
+
+def benchmark(num_keys=50, num_messages=1000):
+    """
+    Time decoding a batch of ``num_keys`` values in each format.
+
+    Returns ``{format: (messages per second, payload bytes)}``. Deltas carry a
+    tenth of the keys.
+    """
+    values = _sample(num_keys)
+    changed = dict(list(values.items())[:max(1, num_keys // 10)])
+    encoded = [('multi (JSON)', 'multi', json.dumps(values).encode('utf-8'), decode),
+               ('multipack (pure Python)', 'multipack', packb(values),
+                lambda _topic, payload: unpackb_python(payload))]
+    if msgpack is not None:
+        encoded.append(('multipack (msgpack)', 'multipack', packb(values), decode))
+    encoded.append(('delta', 'delta', packb({'seq': 1, 'values': changed}), decode))
+    results = {}
+    for name, topic, payload, decoder in encoded:
+        start = time.time()
+        for _num in range(num_messages):
+            decoder(topic, payload)
+        elapsed = max(time.time() - start, 1e-9)
+        results[name] = (num_messages / elapsed, len(payload))
+    return results
+
+
+def main(argv=None):
+    """Run the decoding benchmark from the command line."""
+    parser = argparse.ArgumentParser(description='Compare how fast batched MQTT payload '
+                                     'formats decode.')
+    parser.add_argument('--keys', type=int, default=50, help='Values per batch.')
+    parser.add_argument('--messages', type=int, default=2000, help='Batches to decode per format.')
+    args = parser.parse_args(argv)
+    for name, (rate, size) in sorted(benchmark(args.keys, args.messages).items()):
+        print('{:<26} {:>6} bytes {:>10.0f} messages/s'.format(name, size, rate))
+
+
+if __name__ == '__main__':
+    main()
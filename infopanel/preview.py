@@ -0,0 +1,257 @@
+"""
+Live preview of the panel over HTTP.
+
+Point a browser at ``http://<host>:<port>/`` to watch an MJPEG stream of the panel,
+scaled up, or fetch ``/frame.png`` for the current frame. ``/memory.json`` reports
+the memory used by images and text (see :py:mod:`infopanel.assets`).
+
+The render loop only drops a reference to each buffered frame into a
+:py:class:`SnapshotRing`. Encoding happens on one background thread, at most
+``max_fps`` times a second and only while someone is watching, however many
+viewers there are. An RGB matrix can't be read back, so it only mirrors its
+drawing into a framebuffer for the preview while there are viewers.
+"""
+
+import io
+import json
+import logging
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from PIL import Image as PILImage
+
+from infopanel import assets
+
+LOG = logging.getLogger(__name__)
+
+BOUNDARY = 'infopanelframe'
+PAGE = (b'<html><head><title>infopanel</title></head>'
+        b'<body style="background:#222"><img src="/stream.mjpg"></body></html>')
+
+
+class SnapshotRing(object):
+    """
+    The last few buffered frames. Use as a display frame listener.
+
+    Frames are immutable bytes, and storing one is a single reference assignment
+    followed by bumping ``index``, so readers never need a lock.
+    """
+
+    def __init__(self, size=4):
+        self._slots = [None] * size
+        self.index = 0  # number of frames stored so far
+
+    def __call__(self, frame):
+        self._slots[self.index % len(self._slots)] = frame
+        self.index += 1
+
+    def latest(self):
+        """Return ``(index, frame)`` for the newest frame, or ``(0, None)`` before any."""
+        index = self.index
+        if not index:
+            return 0, None
+        return index, self._slots[(index - 1) % len(self._slots)]
+
+
+class _Encoder(threading.Thread):
+    """Encode the newest frame into each format someone is waiting for."""
+
+    def __init__(self, ring, width, height, scale, max_fps):  # pylint: disable=too-many-arguments
+        threading.Thread.__init__(self, name='infopanel-preview')
+        self.daemon = True
+        self.ring = ring
+        self.size = (width, height)
+        self.scale = scale
+        self.period = 1.0 / max_fps
+        self.encoded = {}  # format: (frame index, data)
+        self.changed = threading.Condition()
+        self._demand = {'JPEG': 0, 'PNG': 0}
+        self._stop_event = threading.Event()
+        self.num_encoded = 0
+
+    def want(self, fmt, delta):
+        """Add or remove a viewer of a format."""
+        with self.changed:
+            self._demand[fmt] += delta
+            self.changed.notify_all()
+
+    def wait_for(self, fmt, after):
+        """Wait for an encoded frame newer than ``after``. Returns (index, data)."""
+        with self.changed:
+            while not self._stop_event.is_set():
+                index, data = self.encoded.get(fmt, (0, None))
+                if index > after:
+                    return index, data
+                self.changed.wait(1.0)
+        return None, None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self.changed:
+                while not any(self._demand.values()) and not self._stop_event.is_set():
+                    self.changed.wait()
+                wanted = [fmt for fmt, viewers in self._demand.items() if viewers]
+            start = time.time()
+            index, frame = self.ring.latest()
+            for fmt in wanted:
+                if frame is not None and self.encoded.get(fmt, (0, None))[0] != index:
+                    data = self.encode(frame, fmt)
+                    with self.changed:
+                        self.encoded[fmt] = (index, data)
+                        self.changed.notify_all()
+            self._stop_event.wait(max(0.0, self.period - (time.time() - start)))
+
+    def encode(self, frame, fmt):
+        """Turn a raw frame into a scaled-up image file."""
+        image = PILImage.frombytes('RGB', self.size, frame)
+        if self.scale != 1:
+            image = image.resize((self.size[0] * self.scale, self.size[1] * self.scale),
+                                 PILImage.NEAREST)
+        out = io.BytesIO()
+        image.save(out, fmt)
+        self.num_encoded += 1
+        return out.getvalue()
+
+    def stop(self):
+        """Stop encoding and release any waiting viewers."""
+        self._stop_event.set()
+        with self.changed:
+            self.changed.notify_all()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve the preview page, stream and still frame."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handle a request."""
+        server = self.server
+        if self.path == '/':
+            self._reply(PAGE, 'text/html')
+        elif self.path == '/memory.json':
+            self._reply(json.dumps(server.memory_report(), sort_keys=True).encode('utf-8'),
+                        'application/json')
+        elif self.path not in ('/frame.png', '/stream.mjpg'):
+            self.send_error(404)
+        elif not server.add_viewer():
+            self.send_error(503, 'Too many viewers')
+        else:
+            try:
+                if self.path == '/frame.png':
+                    self._still()
+                else:
+                    self._stream()
+            finally:
+                server.remove_viewer()
+
+    def _reply(self, data, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _still(self):
+        encoder = self.server.encoder
+        encoder.want('PNG', 1)
+        try:
+            _index, data = encoder.wait_for('PNG', self.server.ring.index - 1)
+        finally:
+            encoder.want('PNG', -1)
+        if data is None:
+            self.send_error(503)
+        else:
+            self._reply(data, 'image/png')
+
+    def _stream(self):
+        encoder = self.server.encoder
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        encoder.want('JPEG', 1)
+        index = 0
+        try:
+            while True:
+                index, data = encoder.wait_for('JPEG', index)
+                if data is None:
+                    return
+                self.wfile.write('--{}\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\n\r\n'
+                                 ''.format(BOUNDARY, len(data)).encode('ascii'))
+                self.wfile.write(data + b'\r\n')
+        except (IOError, OSError):
+            LOG.debug('Preview viewer went away')
+        finally:
+            encoder.want('JPEG', -1)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOG.debug(format, *args)
+
+
+class PreviewServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server for the preview of one display.
+
+    Add ``ring`` as a frame listener of the display, then :py:meth:`start`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, ring, width, height, port=8080, host='',  # pylint: disable=too-many-arguments
+                 scale=8, max_fps=10, max_viewers=4):
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.ring = ring
+        self.encoder = _Encoder(ring, width, height, scale, max_fps)
+        self.max_viewers = max_viewers
+        self.viewers = 0
+        self.memory_report = assets.MANAGER.report  # the driver's, with sprites and scenes
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        """Port being served, useful when asking for any free one with 0."""
+        return self.server_address[1]
+
+    def add_viewer(self):
+        """Count a new viewer. False if there are too many already."""
+        with self._lock:
+            if self.viewers >= self.max_viewers:
+                return False
+            self.viewers += 1
+            return True
+
+    def remove_viewer(self):
+        """A viewer left."""
+        with self._lock:
+            self.viewers -= 1
+
+    def start(self):
+        """Serve in the background."""
+        LOG.info('Serving preview at http://localhost:%d/', self.port)
+        self.encoder.start()
+        self._thread = threading.Thread(target=self.serve_forever, name='infopanel-preview-http')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.encoder.stop()
+        self.shutdown()
+        self.server_close()
+
+
+def preview_factory(disp, conf, offset=0):
+    """Serve a preview of a display as set up in the ``preview`` config section."""
+    ring = SnapshotRing()
+    server = PreviewServer(ring, disp.width, disp.height, conf['port'] + offset, conf['host'],
+                           conf['scale'], conf['max_fps'], conf['max_viewers'])
+    # an RGB matrix only mirrors its frames for the ring while someone is watching
+    disp.add_frame_listener(ring, lambda: server.viewers > 0)
+    return server
@@ -0,0 +1,155 @@
+"""
+Frame recording and replay comparison.
+
+A recording is a compact stream of every frame a display buffered, with a timestamp
+and a SHA-1 hash of each frame. Frames are stored XORed against the previous frame
+and zlib compressed, so unchanging pixels cost almost nothing.
+
+Compare two recordings frame by frame (e.g. before and after a render-path change,
+with the same ``--seed``)::
+
+    python -m infopanel.recording compare before.iprec after.iprec
+
+"""
+
+import argparse
+import collections
+import hashlib
+import struct
+import sys
+import time
+import zlib
+
+MAGIC = b'IPREC\x01'
+HEADER = struct.Struct('<HH')  # width, height
+RECORD = struct.Struct('<d20sI')  # timestamp, frame sha1, payload length
+
+RecordedFrame = collections.namedtuple('RecordedFrame', ['timestamp', 'digest', 'frame'])
+Mismatch = collections.namedtuple('Mismatch', ['index', 'pixels_different'])
+
+
+def frame_digest(frame):
+    """Hash of a raw RGB frame."""
+    return hashlib.sha1(frame).digest()
+
+
+def _xor(frame_a, frame_b):
+    """XOR two equal-length byte strings."""
+    size = len(frame_a)
+    return (int.from_bytes(frame_a, 'big') ^ int.from_bytes(frame_b, 'big')).to_bytes(size, 'big')
+
+
+class FrameRecorder(object):
+    """
+    Write each buffered frame to a recording file.
+
+    Use as a display frame listener::
+
+        recorder = FrameRecorder('run.iprec', disp.width, disp.height)
+        disp.add_frame_listener(recorder)
+    """
+
+    def __init__(self, path, width, height, clock=time.time):
+        self.width = width
+        self.height = height
+        self.clock = clock
+        self.num_frames = 0
+        self._previous = bytes(bytearray(width * height * 3))
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + HEADER.pack(width, height))
+
+    def __call__(self, frame):
+        """Record one frame of raw RGB bytes."""
+        payload = zlib.compress(_xor(frame, self._previous))
+        self._file.write(RECORD.pack(self.clock(), frame_digest(frame), len(payload)))
+        self._file.write(payload)
+        self._previous = frame
+        self.num_frames += 1
+
+    def close(self):
+        """Finish the recording."""
+        self._file.close()
+
+
+def read_header(recfile):
+    """Read and check a recording header. Returns (width, height)."""
+    if recfile.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not an infopanel recording')
+    return HEADER.unpack(recfile.read(HEADER.size))
+
+
+def read_recording(path):
+    """Yield each :py:class:`RecordedFrame` in a recording."""
+    with open(path, 'rb') as recfile:
+        width, height = read_header(recfile)
+        previous = bytes(bytearray(width * height * 3))
+        while True:
+            record = recfile.read(RECORD.size)
+            if len(record) < RECORD.size:
+                return
+            timestamp, digest, size = RECORD.unpack(record)
+            frame = _xor(zlib.decompress(recfile.read(size)), previous)
+            yield RecordedFrame(timestamp, digest, frame)
+            previous = frame
+
+
+def compare(path_a, path_b):
+    """
+    Compare two recordings frame by frame.
+
+    Returns ``(num_compared, length_difference, mismatches)`` where mismatches is a
+    list of :py:class:`Mismatch` for frames whose hashes differ.
+    """
+    frames_a = read_recording(path_a)
+    frames_b = read_recording(path_b)
+    mismatches = []
+    num_compared = 0
+    while True:
+        rec_a = next(frames_a, None)
+        rec_b = next(frames_b, None)
+        if rec_a is None or rec_b is None:
+            break
+        if rec_a.digest != rec_b.digest:
+            mismatches.append(Mismatch(num_compared, _pixels_different(rec_a.frame, rec_b.frame)))
+        num_compared += 1
+    remaining_a = (rec_a is not None) + sum(1 for _frame in frames_a)
+    remaining_b = (rec_b is not None) + sum(1 for _frame in frames_b)
+    length_difference = remaining_a - remaining_b
+    return num_compared, length_difference, mismatches
+
+
+def _pixels_different(frame_a, frame_b):
+    if len(frame_a) != len(frame_b):
+        return max(len(frame_a), len(frame_b)) // 3
+    return sum(1 for i in range(0, len(frame_a), 3) if frame_a[i:i + 3] != frame_b[i:i + 3])
+
+
+def main(argv=None):
+    """Command line tool for recordings."""
+    parser = argparse.ArgumentParser(description='Inspect and compare infopanel recordings.')
+    subparsers = parser.add_subparsers(dest='command')
+    hashes = subparsers.add_parser('hashes', help='List the hash of every frame.')
+    hashes.add_argument('recording')
+    comparison = subparsers.add_parser('compare', help='Diff two recordings frame by frame.')
+    comparison.add_argument('recording_a')
+    comparison.add_argument('recording_b')
+    args = parser.parse_args(argv)
+
+    if args.command == 'hashes':
+        for i, rec in enumerate(read_recording(args.recording)):
+            print('{:6d} {:.3f} {}'.format(i, rec.timestamp, rec.digest.hex()))
+        return 0
+    if args.command == 'compare':
+        num_compared, length_difference, mismatches = compare(args.recording_a, args.recording_b)
+        for mismatch in mismatches:
+            print('Frame {} differs in {} pixels'.format(*mismatch))
+        if length_difference:
+            print('Recordings differ in length by {} frames'.format(length_difference))
+        print('{} frames compared, {} differ'.format(num_compared, len(mismatches)))
+        return 1 if mismatches or length_difference else 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
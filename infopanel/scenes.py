@@ -1,31 +1,65 @@
 """Scenes. One of these will be active at any given time."""
 
-import time
 import inspect
 import sys
 import copy
 import logging
 import voluptuous as vol
 
-from infopanel import sprites, helpers
+from infopanel import sprites, helpers, simulation, startup
 
 LOG = logging.getLogger(__name__)
 SCENE_BLANK = 'blank'
+VECTORIZE = False  # advance sprites with a vectorized simulation. Set from global config.
 
 class Scene(object):
     """A single screen's worth of sprites."""
-    CONF = vol.Schema({vol.Optional('mode_after', default=None): str
+    CONF = vol.Schema({vol.Optional('mode_after', default=None): vol.Any(None, str)
                        }, extra=vol.ALLOW_EXTRA)
 
     def __init__(self, width, height):
         self.width = width
         self.height = height
         self.sprites = []
+        self._simulations = None
 
     def draw_frame(self, display):
-        """Render all sprites in this scene to display."""
+        """
+        Render all sprites in this scene to display.
+
+        Sprites that are entirely off the display only advance.
+        """
+        if self._simulations:
+            before, after = self._simulations
+            before.step()
+            self._render_sprites(display)
+            after.step()
+            return
+        self._render_sprites(display)
+
+    def _render_sprites(self, display):
+        width, height = display.width, display.height
         for sprite in self.sprites:
-            sprite.render(display)
+            if sprite.visible_on(width, height):
+                sprite.render(display)
+            else:
+                sprite.advance()
+
+    def is_static(self):
+        """
+        True if this scene's frames only change when the data does.
+
+        Scenes that draw their own frames have to say so themselves.
+        """
+        if type(self).draw_frame is not Scene.draw_frame:
+            return False
+        return not any(sprite.is_animated() for sprite in self.sprites)
+
+    def next_change(self):
+        """Clock time at which a static scene will next look different on its own, or None."""
+        changes = [change for change in (sprite.next_change() for sprite in self.sprites)
+                   if change is not None]
+        return min(changes) if changes else None
 
     def apply_config(self, conf, existing_sprites):
         """Apply optional extra config."""
@@ -41,13 +75,22 @@ class Scene(object):
 
     def reinit(self):
         """Called when scene comes back up on the screen."""
+        if self._simulations:
+            for sim in self._simulations:
+                sim.release()
+            self._simulations = None
         for sprite in self.sprites:
             sprite.reinit()
+        if VECTORIZE and self.sprites:
+            self._simulations = simulation.scene_simulations(self.sprites)
 
 class Blank(Scene):
     """Just a blank screen."""
     def draw_frame(self, display):
-        time.sleep(1.0)
+        helpers.CLOCK.sleep(1.0)
+
+    def is_static(self):
+        return True
 
 class Welcome(Scene):
     """Just a welcome message."""
@@ -58,6 +101,9 @@ class Welcome(Scene):
     def draw_frame(self, display):
         display.rainbow_text(self.font, 5, 20, 'HELLO!')
 
+    def is_static(self):
+        return True
+
 
 class Giraffes(Scene):
     """A field of giraffes saying things."""
@@ -88,21 +134,25 @@ class Giraffes(Scene):
                     sprite.phrases.extend([phrase_sprite] * self._extra_phrase_frequency)
 
 
-def scene_factory(width, height, conf, existing_sprites):  # pylint: disable=too-many-locals
-    """Build scenes from config."""
-    scenes = {SCENE_BLANK: Blank(width, height)}  # alway add blank scene for suspend
-    cls = None
-    for name, scene_data in conf.items():
-        for cls_name, cls in inspect.getmembers(sys.modules[__name__]):
-            if scene_data['type'] == cls_name:
-                break
-        else:
-            raise ValueError('{} is invalid active_scene'.format(name))
-        del scene_data['type']
-        if 'sprites' in scene_data:
-            sprites_to_add = scene_data.pop('sprites')
-        else:
-            sprites_to_add = []
+def _build_registry():
+    """Map scene type names to their classes."""
+    return {name: cls for name, cls in inspect.getmembers(sys.modules[__name__], inspect.isclass)
+            if issubclass(cls, Scene)}
+
+SCENE_TYPES = _build_registry()
+
+def build_scene(width, height, name, conf, existing_sprites):  # pylint: disable=too-many-locals
+    """Build the named scene of a scenes config, with copies of the sprites it uses."""
+    scene_data = dict(conf[name])
+    try:
+        cls = SCENE_TYPES[scene_data.pop('type')]
+    except KeyError:
+        raise ValueError('{} is invalid active_scene'.format(name))
+    if 'sprites' in scene_data:
+        sprites_to_add = scene_data.pop('sprites')
+    else:
+        sprites_to_add = []
+    with startup.TRACE.phase('scenes/' + name):
         LOG.debug('Initializing %s', cls)
         scene = cls(width, height, **scene_data)
         for sprite_data in sprites_to_add:
@@ -120,6 +170,68 @@ def scene_factory(width, height, conf, existing_sprites):  # pylint: disable=too
             scene.sprites.append(sprite)
 
         scene.apply_config(conf, existing_sprites)
+    return scene
 
-        scenes[name] = scene
+def sprite_names(scene_conf):
+    """Names of all configured sprites a scene config refers to."""
+    names = set(scene_conf.get('extra_phrases') or [])
+    for sprite_data in scene_conf.get('sprites') or []:
+        names.update(sprite_data)
+    return names
+
+def scene_factory(width, height, conf, existing_sprites):
+    """Build scenes from config."""
+    scenes = {SCENE_BLANK: Blank(width, height)}  # alway add blank scene for suspend
+    for name in conf:
+        scenes[name] = build_scene(width, height, name, conf, existing_sprites)
     return scenes
+
+
+class SceneTable(object):
+    """
+    Scenes by name, each built the first time it's looked up.
+
+    Iterating and ``in`` see every configured scene, built or not, plus the blank
+    scene. Scenes can also be added directly, like in a dict.
+    """
+
+    def __init__(self, width, height, conf, existing_sprites):
+        self.width = width
+        self.height = height
+        self.conf = dict(conf)
+        self.sprites = existing_sprites
+        self.built = {SCENE_BLANK: Blank(width, height)}  # alway add blank scene for suspend
+
+    def __getitem__(self, name):
+        scene = self.built.get(name)
+        if scene is None:
+            if name not in self.conf:
+                raise KeyError(name)
+            scene = build_scene(self.width, self.height, name, self.conf, self.sprites)
+            self.built[name] = scene
+        return scene
+
+    def __setitem__(self, name, scene):
+        self.built[name] = scene
+
+    def __contains__(self, name):
+        return name in self.conf or name in self.built
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        """Names of all scenes, built or not."""
+        return sorted(set(self.conf) | set(self.built))
+
+    def pop(self, name, default=None):
+        """Forget a built scene. It's built again the next time it's looked up."""
+        return self.built.pop(name, default)
+
+    def build_all(self):
+        """Build every configured scene now."""
+        for name in self.conf:
+            self[name]  # pylint: disable=pointless-statement
@@ -0,0 +1,225 @@
+"""
+A shared-memory, versioned key/value region.
+
+One process (MQTT ingestion) writes values; others read them without locks or
+pickling. Each slot is guarded by a sequence counter: the writer makes it odd
+while writing and even when done, and readers retry if it was odd or changed
+while they read. Readers give up after a few tries, since a writer killed
+mid-write leaves its slot odd until it's written again.
+"""
+
+import json
+import logging
+import struct
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from infopanel import commands as commands_, helpers
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'IPDS'
+HEADER = struct.Struct('<4sIIIII')  # magic, num_slots, key_size, value_size, used, version
+SLOT_HEADER = struct.Struct('<IHHc3x')  # sequence, key length, value length, type tag
+USED_OFFSET = 16
+VERSION_OFFSET = 20
+COUNTER = struct.Struct('<I')
+
+DEFAULT_SLOTS = 256
+DEFAULT_KEY_SIZE = 64
+DEFAULT_VALUE_SIZE = 256
+READ_TRIES = 100  # a write takes microseconds, so this many failed reads means no writer
+
+
+def encode_value(value):
+    """Turn a value into a type tag and bytes."""
+    if isinstance(value, bytes):
+        return b'b', value
+    if isinstance(value, bool):
+        return b'j', json.dumps(value).encode('utf-8')
+    if isinstance(value, int):
+        return b'i', str(value).encode('ascii')
+    if isinstance(value, float):
+        return b'f', repr(value).encode('ascii')
+    if isinstance(value, str):
+        return b's', value.encode('utf-8')
+    return b'j', json.dumps(value).encode('utf-8')
+
+
+def decode_value(tag, payload):
+    """Inverse of :py:func:`encode_value`."""
+    if tag == b's':
+        return payload.decode('utf-8')
+    if tag == b'i':
+        return int(payload)
+    if tag == b'f':
+        return float(payload)
+    if tag == b'b':
+        return payload
+    return json.loads(payload.decode('utf-8'))
+
+
+class SharedRegion(object):  # pylint: disable=too-many-instance-attributes
+    """
+    A fixed-size table of key/value slots in shared memory.
+
+    Create it in the parent with :py:meth:`create` and attach to it in a child with
+    :py:meth:`attach` using its ``name``. Keys are never removed.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._owner = owner
+        self.name = shm.name
+        self.buf = shm.buf
+        (magic, self.num_slots, self.key_size, self.value_size,
+         _used, _version) = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError('Not an infopanel shared data region')
+        self.slot_size = SLOT_HEADER.size + self.key_size + self.value_size
+        self._slots = {}  # key: slot index, as far as this process has seen
+        self._scanned = 0
+
+    @classmethod
+    def create(cls, num_slots=DEFAULT_SLOTS, key_size=DEFAULT_KEY_SIZE,
+               value_size=DEFAULT_VALUE_SIZE):
+        """Make a new region."""
+        if shared_memory is None:
+            raise RuntimeError('Shared memory needs Python 3.8 or newer.')
+        slot_size = SLOT_HEADER.size + key_size + value_size
+        shm = shared_memory.SharedMemory(create=True, size=HEADER.size + num_slots * slot_size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, num_slots, key_size, value_size, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to a region made by another process."""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def close(self):
+        """Detach, and free the memory if this process made it."""
+        self.buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    @property
+    def used(self):
+        """Number of slots holding keys."""
+        return COUNTER.unpack_from(self.buf, USED_OFFSET)[0]
+
+    @property
+    def version(self):
+        """Counter that changes whenever any value is written."""
+        return COUNTER.unpack_from(self.buf, VERSION_OFFSET)[0]
+
+    def _offset(self, slot):
+        return HEADER.size + slot * self.slot_size
+
+    def find(self, key):
+        """Slot index of a key, or None if it has never been written."""
+        slot = self._slots.get(key)
+        if slot is None:
+            used = self.used
+            while self._scanned < used:
+                offset = self._offset(self._scanned)
+                key_len = SLOT_HEADER.unpack_from(self.buf, offset)[1]
+                start = offset + SLOT_HEADER.size
+                name = bytes(self.buf[start:start + key_len]).decode('utf-8')
+                self._slots[name] = self._scanned
+                self._scanned += 1
+            slot = self._slots.get(key)
+        return slot
+
+    def sequence(self, slot):
+        """Sequence counter of a slot. Changes whenever its value is written."""
+        return COUNTER.unpack_from(self.buf, self._offset(slot))[0]
+
+    def read(self, slot):
+        """
+        Read a consistent ``(sequence, value)`` from a slot.
+
+        Returns None if the slot stays mid-write, like when its writer was killed.
+        """
+        offset = self._offset(slot)
+        value_start = offset + SLOT_HEADER.size + self.key_size
+        for _try in range(READ_TRIES):
+            sequence, _key_len, value_len, tag = SLOT_HEADER.unpack_from(self.buf, offset)
+            if sequence & 1:
+                continue  # being written right now.
+            payload = bytes(self.buf[value_start:value_start + value_len])
+            if COUNTER.unpack_from(self.buf, offset)[0] == sequence:
+                return sequence, decode_value(tag, payload)
+        return None
+
+    def write(self, key, value):
+        """Write a value. Only one process may write to a region."""
+        tag, payload = encode_value(value)
+        if len(payload) > self.value_size:
+            LOG.warning('Value for %s is %d bytes; only %d fit. Ignoring it.',
+                        key, len(payload), self.value_size)
+            return
+        slot = self.find(key)
+        if slot is None:
+            slot = self._add_key(key)
+            if slot is None:
+                return
+        offset = self._offset(slot)
+        writing = self.sequence(slot) | 1  # already odd if the last writer died mid-write
+        COUNTER.pack_into(self.buf, offset, writing)
+        key_len = SLOT_HEADER.unpack_from(self.buf, offset)[1]
+        SLOT_HEADER.pack_into(self.buf, offset, writing, key_len, len(payload), tag)
+        value_start = offset + SLOT_HEADER.size + self.key_size
+        self.buf[value_start:value_start + len(payload)] = payload
+        COUNTER.pack_into(self.buf, offset, writing + 1)
+        COUNTER.pack_into(self.buf, VERSION_OFFSET, (self.version + 1) & 0xFFFFFFFF)
+
+    def _add_key(self, key):
+        encoded = key.encode('utf-8')
+        used = self.used
+        if used >= self.num_slots or len(encoded) > self.key_size:
+            LOG.warning('No room for key %s in shared data.', key)
+            return None
+        offset = self._offset(used)
+        SLOT_HEADER.pack_into(self.buf, offset, 0, len(encoded), 0, b'j')
+        start = offset + SLOT_HEADER.size
+        self.buf[start:start + len(encoded)] = encoded
+        COUNTER.pack_into(self.buf, USED_OFFSET, used + 1)  # publish the key last
+        self._slots[key] = used
+        self._scanned = used + 1
+        return used
+
+
+class SharedDataWriter(object):
+    """
+    Dict-like writer side of a region, for use as an MQTT data container.
+
+    Sets the ``changed`` event, if given, after every write so readers can sleep
+    until something happens. Control commands are also put on the ``commands``
+    queue, if given, so none are lost between reads.
+    """
+
+    def __init__(self, region, changed=None, commands=None):
+        self.region = region
+        self.changed = changed
+        self.commands = commands
+
+    def __setitem__(self, key, value):
+        self._write(key, value)
+        if self.changed is not None:
+            self.changed.set()
+
+    def update(self, values):
+        """Write a batch of values, setting ``changed`` once."""
+        for key, value in values.items():
+            self._write(key, value)
+        if self.changed is not None:
+            self.changed.set()
+
+    def _write(self, key, value):
+        if self.commands is not None and key in commands_.COMMANDS:
+            self.commands.put((key, value, helpers.CLOCK.time()))
+        self.region.write(key, value)
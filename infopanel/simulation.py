@@ -0,0 +1,194 @@
+"""
+Vectorized sprite simulation.
+
+Advances the motion and animation counters of all the sprites in a scene at once
+with NumPy instead of calling :py:meth:`infopanel.sprites.Sprite.tick` on each one.
+The rules are exactly those of ``Sprite.tick``. Only the rare parts that depend on
+randomness or sprite size (flipping or wrapping at an edge, changing phrases) call
+back into the individual sprites, in sprite order.
+"""
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from infopanel import sprites
+
+LOG = logging.getLogger(__name__)
+
+FRAMES_PINGPONG = 0
+FRAMES_STILL = 1
+FRAMES_LOOP = 2
+# how each known check_frame_bounds implementation behaves.
+FRAME_BOUNDS = {sprites.Sprite: FRAMES_PINGPONG,
+                sprites.FancyText: FRAMES_STILL,
+                sprites.AnimatedGif: FRAMES_LOOP}
+# sprites overriding any of these do something we can't vectorize.
+FIXED_METHODS = ('tick', 'update_frame_num', 'check_movement', 'check_tick_bounds', 'move')
+
+
+def _defined_in(cls, name):
+    """Find the class in the MRO that defines an attribute."""
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return klass
+    return None
+
+
+def can_simulate(sprite):
+    """Check whether a sprite's tick can be handled by a :py:class:`SpriteSimulation`."""
+    cls = type(sprite)
+    if any(_defined_in(cls, name) is not sprites.Sprite for name in FIXED_METHODS):
+        return False
+    return _defined_in(cls, 'check_frame_bounds') in FRAME_BOUNDS
+
+
+def scene_simulations(scene_sprites):
+    """
+    Build the simulations for a scene's sprites.
+
+    Text sprites tick before they render while other sprites tick after, so they get
+    separate simulations. Returns ``(before_render, after_render)`` or None if NumPy
+    is not available.
+    """
+    if np is None:
+        LOG.warning('NumPy not found. Cannot use vectorized simulation.')
+        return None
+    eligible = [sprite for sprite in scene_sprites if can_simulate(sprite)]
+    before = [sprite for sprite in eligible if isinstance(sprite, sprites.FancyText)]
+    after = [sprite for sprite in eligible if not isinstance(sprite, sprites.FancyText)]
+    return SpriteSimulation(before), SpriteSimulation(after)
+
+
+class SpriteSimulation(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Struct-of-arrays state for many sprites, advanced one vectorized step per frame.
+
+    While attached, the sprites' own ``tick`` does nothing. Positions and frame numbers
+    are written back to the sprites after each step so rendering is unchanged.
+    """
+
+    def __init__(self, sprite_list):
+        self.sprites = list(sprite_list)
+        for sprite in self.sprites:
+            if not can_simulate(sprite):
+                raise ValueError('{} cannot be simulated'.format(sprite))
+        num = len(self.sprites)
+        for name in ('x', 'y', 'dx', 'dy', 'max_x', 'max_y', 'ticks', 'frame_num',
+                     'frame_delta', 'num_frames', 'ticks_per_frame', 'ticks_per_movement',
+                     'ticks_per_phrase'):
+            setattr(self, name, np.zeros(num, dtype=np.int64))
+        self.frame_mode = np.array([FRAME_BOUNDS[_defined_in(type(sprite), 'check_frame_bounds')]
+                                    for sprite in self.sprites], dtype=np.int8)
+        self.load()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def load(self):
+        """(Re)read the state of all sprites, e.g. after they were reinitialized."""
+        sprs = self.sprites
+        self.x[:] = [sprite.x for sprite in sprs]
+        self.y[:] = [sprite.y for sprite in sprs]
+        self.dx[:] = [sprite.dx for sprite in sprs]
+        self.dy[:] = [sprite.dy for sprite in sprs]
+        self.max_x[:] = [sprite.max_x for sprite in sprs]
+        self.max_y[:] = [sprite.max_y for sprite in sprs]
+        self.ticks[:] = [sprite._ticks for sprite in sprs]  # pylint: disable=protected-access
+        self.frame_num[:] = [sprite._frame_num for sprite in sprs]  # pylint: disable=protected-access
+        self.frame_delta[:] = [sprite._frame_delta for sprite in sprs]  # pylint: disable=protected-access
+        self.num_frames[:] = [len(sprite.frames) for sprite in sprs]
+        self.ticks_per_frame[:] = [sprite.ticks_per_frame for sprite in sprs]
+        self.ticks_per_movement[:] = [sprite.ticks_per_movement for sprite in sprs]
+        self.ticks_per_phrase[:] = [sprite.ticks_per_phrase for sprite in sprs]
+        for sprite in sprs:
+            sprite._simulated = True  # pylint: disable=protected-access
+
+    def release(self):
+        """Write all state back to the sprites and let them tick themselves again."""
+        for i, sprite in enumerate(self.sprites):
+            self._store(i, sprite)
+            sprite._simulated = False  # pylint: disable=protected-access
+
+    def step(self):
+        """Advance all sprites by one tick. Equivalent to ``Sprite.tick`` on each."""
+        if not self.sprites:
+            return
+        x, y, dx, dy = self.x, self.y, self.dx, self.dy
+        frame_num, frame_delta, ticks = self.frame_num, self.frame_delta, self.ticks
+        old_x, old_y, old_frame = x.copy(), y.copy(), frame_num.copy()
+
+        ticks += 1
+        due = ticks % self.ticks_per_frame == 0
+        frame_num[due] += frame_delta[due]
+
+        moving = (dx != 0) | (dy != 0)
+        move = moving & (ticks % self.ticks_per_movement == 0)
+        x[move] += dx[move]
+        y[move] += dy[move]
+        # left and top wraps also depend on size, so these are just candidates.
+        right = moving & (x > self.max_x) & (dx > 0)
+        left = moving & (x < 0) & (dx < 0)
+        down = moving & (y > self.max_y) & (dy > 0)
+        up = moving & (y < 0) & (dy < 0)
+        frame_at_move = frame_num.copy()
+
+        ticks[ticks > sprites.MAX_TICKS] = 0
+
+        last = frame_num == self.num_frames - 1
+        pingpong = self.frame_mode == FRAMES_PINGPONG
+        single = self.num_frames == 1
+        frame_delta[pingpong & single] = 0
+        frame_delta[pingpong & ~single & last] = -1
+        frame_delta[pingpong & ~single & ~last & (frame_num == 0)] = 1
+        frame_delta[self.frame_mode == FRAMES_STILL] = 0
+        frame_num[(self.frame_mode == FRAMES_LOOP) & last] = 0
+
+        phrase = ticks % self.ticks_per_phrase == 0
+        events = right | left | down | up | phrase
+        for i in np.flatnonzero(events).tolist():
+            self._handle_events(i, right[i], left[i], down[i], up[i], phrase[i],
+                                int(frame_at_move[i]))
+
+        changed = (x != old_x) | (y != old_y) | (frame_num != old_frame) | events
+        for i in np.flatnonzero(changed).tolist():
+            sprite = self.sprites[i]
+            sprite.x = int(x[i])
+            sprite.y = int(y[i])
+            sprite._frame_num = int(frame_num[i])  # pylint: disable=protected-access
+
+    def _handle_events(self, i, right, left, down, up, phrase, frame_at_move):  # pylint: disable=too-many-arguments
+        """Do the per-sprite parts of a tick, exactly like ``Sprite.check_movement``."""
+        sprite = self.sprites[i]
+        self._store(i, sprite)
+        # pylint: disable=protected-access
+        sprite._frame_num = frame_at_move
+        if right:
+            if not sprite._maybe_flip():
+                sprite.x = 0 - sprite.width - sprite._phrase_width
+        elif left and sprite.x + sprite.width + sprite._phrase_width < 0:
+            if not sprite._maybe_flip():
+                sprite.x = sprite.max_x
+        if down:
+            sprite.y = 0 - sprite.height
+        elif up and sprite.y + sprite.height < 0:
+            sprite.y = sprite.max_y
+        if phrase:
+            sprite.update_phrase()
+        self.x[i] = sprite.x
+        self.y[i] = sprite.y
+        self.dx[i] = sprite.dx
+        self.ticks_per_phrase[i] = sprite.ticks_per_phrase
+
+    def _store(self, i, sprite):
+        """Write one sprite's full state back to it."""
+        # pylint: disable=protected-access
+        sprite.x = int(self.x[i])
+        sprite.y = int(self.y[i])
+        sprite.dx = int(self.dx[i])
+        sprite._ticks = int(self.ticks[i])
+        sprite._frame_num = int(self.frame_num[i])
+        sprite._frame_delta = int(self.frame_delta[i])
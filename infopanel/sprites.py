@@ -1,19 +1,20 @@
 """There are multiple sprites in any given scene."""
 
-import random
+import bisect
 import inspect
 import sys
 import logging
 import datetime
-import os
-
-from PIL import Image as PILImage
-from PIL import ImageSequence
 
 from matplotlib import cm
 import voluptuous as vol
 
-from infopanel import helpers, colors, data
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from infopanel import helpers, colors, data, assets, bundle, startup
 
 
 MAX_TICKS = 10000
@@ -24,12 +25,75 @@ GOOFY_EXCLAMATIONS = ['OW', 'HI', 'YUM', 'WOO', 'YES', 'CRAP', 'DANG', 'WHOOPS',
                       'DERP', 'MERP', 'YAH', 'HEY', 'HO', 'BOOP', 'HMM', 'YAYA', 'SUP',
                       'BOP']
 PALLETE_SCHEMA = vol.Schema({vol.Any(int, str): list})
+# strftime codes that change every second, so a Clock showing one redraws every second
+SECOND_CODES = ('%S', '%s', '%T', '%X', '%c', '%r', '%f')
 
 FRAMES_SCHEMA = vol.Schema([str])
 LOG = logging.getLogger(__name__)
 
+EMPTY_FRAMES = assets.frameset([[[]]])
+GIRAFFE_FRAMES = assets.frameset([[[0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 1],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 1, 1, 0],
+                                   [0, 1, 1, 1, 0],
+                                   [1, 1, 1, 1, 0],
+                                   [1, 0, 0, 1, 0],
+                                   [1, 0, 0, 0, 1],
+                                   [1, 0, 0, 0, 1]],
+
+                                  [[0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 1],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 0, 1, 0],
+                                   [0, 0, 1, 1, 0],
+                                   [0, 1, 1, 1, 0],
+                                   [1, 1, 1, 1, 0],
+                                   [1, 0, 0, 1, 0],
+                                   [1, 0, 0, 1, 0],
+                                   [0, 1, 1, 0, 0]]])
+
+PLANT_FRAMES = assets.frameset([[[0, 1, 1, 1, 1, 0],
+                                 [1, 0, 0, 1, 0, 1],
+                                 [1, 0, 2, 0, 0, 1],
+                                 [0, 0, 2, 0, 0, 0],
+                                 [0, 0, 2, 2, 0, 0],
+                                 [0, 0, 2, 2, 0, 0]],
+
+                                [[1, 1, 1, 1, 1, 0],
+                                 [1, 0, 0, 1, 0, 1],
+                                 [0, 0, 0, 2, 1, 0],
+                                 [0, 0, 0, 2, 0, 0],
+                                 [0, 0, 2, 2, 0, 0],
+                                 [0, 0, 2, 2, 0, 0]]])
+
+GIRAFFE_PALLETE = {1: (255, 255, 0), 'text':[0, 255, 0]}
+PLANT_PALLETE = {1: (0, 240, 0),
+                 2: (165, 42, 42)}
+
 class Sprite(object):  # pylint: disable=too-many-instance-attributes
-    """A thing that may be animated or not, and may move or not."""
+    """
+    A thing that may be animated or not, and may move or not.
+
+    Sprites only hold small per-instance state in ``__slots__``. Frames, palettes and
+    compiled bitmaps are shared, read-only assets (see :py:mod:`infopanel.assets`),
+    so subclasses must declare ``__slots__`` for any new attributes and replace
+    (rather than mutate) ``frames`` and ``pallete``.
+    """
+
+    __slots__ = ('x', 'y', 'max_x', 'max_y', '_frame_num', '_ticks', 'ticks_per_frame',
+                 'ticks_per_movement', 'ticks_per_phrase', 'min_ticks_per_phrase',
+                 'max_ticks_per_phrase', 'pallete', 'dx', 'dy', 'font', 'text', 'phrases',
+                 'data_source', 'frames', '_frame_delta', 'can_flip', '_phrase_width',
+                 'init_x', 'init_y', '_bitmaps', '_bitmap_rows', '_bitmap_frames',
+                 '_bitmap_pallete', '_simulated')
 
     CONF = vol.Schema({vol.Optional('dx', default=0): int,
                        vol.Optional('dy', default=0): int,
@@ -45,7 +109,8 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
                        vol.Optional('pallete', default={1: [255, 255, 255],
                                                         'text':[0, 255, 0],
                                                         'label':[255, 255, 0]}): PALLETE_SCHEMA,
-                       vol.Optional('frames', default=None): FRAMES_SCHEMA,
+                       vol.Optional('frames', default=None): vol.Any(None, FRAMES_SCHEMA),
+                       vol.Optional('sheet', default=None): vol.Any(None, str),
                        vol.Optional('text', default=''): str,
                        vol.Optional('can_flip', default=True): bool,
                        vol.Optional('data_label', default=''): str
@@ -69,24 +134,31 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
         if data_source is None:
             data_source = data.InputData()
         self.data_source = data_source
-        self.frames = []
+        self.frames = ()
         self._frame_delta = 0
         self.can_flip = None
         self._phrase_width = 0
         self.init_x, self.init_y = None, None
+        self._bitmaps = None
+        self._bitmap_rows = None
+        self._bitmap_frames = None
+        self._bitmap_pallete = None
+        self._simulated = False  # ticks are done by a simulation.SpriteSimulation
 
     def __repr__(self):
         return ('<{} at {}, {}. dx/dy: ({}, {}), size: ({}, {})>'
                 ''.format(self.__class__.__name__, self.x, self.y,
                           self.dx, self.dy, self.max_x, self.max_y))
 
-    def apply_config(self, conf):
+    def apply_config(self, conf, validated=False):
         """
         Validate and apply configuration to this sprite.
 
-        Generally, each config item becomes a instance attribute.
+        Generally, each config item becomes a instance attribute. If ``validated``
+        is True, conf has already been through this sprite's CONF schema.
         """
-        conf = self.CONF(conf)
+        if not validated:
+            conf = self.CONF(conf)
         for key, val in conf.items():
             if not hasattr(self, key):
                 # this isn't a configurable attribute. May have special behavior.
@@ -95,36 +167,30 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
                 # allow subclasses to force non-None attributes in their constructors
                 setattr(self, key, val)
         self.font = helpers.load_font(conf['font_name'])
-        if conf['frames']:
+        if conf['sheet']:
+            self._use_sheet(conf['sheet'])
+        elif conf['frames']:
             self._build_frames(conf['frames'])
 
         return conf
 
     def _build_frames(self, frames):
         """Convert user-input custom frames into usable frames."""
-        new_frames = []
-        for framestr in frames:
-            frame = []
-            for intstr in framestr.split():
-                row = []
-                for char in intstr:
-                    row.append(int(char))
-                frame.append(row)
-            new_frames.append(frame)
         LOG.info('Built custom frames for %s.', self)
-        self.frames = new_frames
+        self.frames = assets.parse_frames(frames)
+
+    def _use_sheet(self, name):
+        """Take frames, and any colors, from a sprite sheet (see :py:mod:`infopanel.bundle`)."""
+        frames, pallete = bundle.sheet(name)
+        self.frames = frames
+        if pallete:
+            merged = dict(self.pallete or {})
+            merged.update(pallete)
+            self.pallete = merged
 
     def flip_horizontal(self):
         """Flip the sprite horizontally."""
-        flipped = []
-        for frame in self.frames:
-            flipped_frame = []
-            for row in frame:
-                flipped_row = row[:]
-                flipped_row.reverse()
-                flipped_frame.append(flipped_row)
-            flipped.append(flipped_frame)
-        self.frames = flipped
+        self.frames = assets.flipped(assets.frameset(self.frames))
 
     @property
     def width(self):
@@ -143,6 +209,8 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
 
     def tick(self):
         """Update the animation ticks."""
+        if self._simulated:
+            return
         self._ticks += 1
         self.update_frame_num()
         self.check_movement()
@@ -178,7 +246,7 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
     def _maybe_flip(self):
         if not self.can_flip:
             return False
-        multiplier = random.choice([1, -1])
+        multiplier = helpers.RANDOM.choice([1, -1])
         self.dx *= multiplier
         if multiplier == -1:
             self.flip_horizontal()
@@ -206,7 +274,7 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
     def update_phrase(self):
         """Change the phrase the thing is saying."""
         if not self._ticks % self.ticks_per_phrase:
-            text_src = random.choice(self.phrases)
+            text_src = helpers.RANDOM.choice(self.phrases)
             min_ticks = self.min_ticks_per_phrase
             if callable(text_src):
                 # allow callable helpers for current date, time, etc.
@@ -217,7 +285,7 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
                 min_ticks *= 2  # let live data stay a bit longer
 
             self.text = text_src
-            self.ticks_per_phrase = random.randint(min_ticks, self.max_ticks_per_phrase)
+            self.ticks_per_phrase = helpers.RANDOM.randint(min_ticks, self.max_ticks_per_phrase)
 
     def move(self):
         """Move around on the screen."""
@@ -232,15 +300,36 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
 
     def _render_frame(self, display):
         """Render main part of the sprite."""
+        if self._bitmap_frames is not self.frames or self._bitmap_pallete is not self.pallete:
+            # frames or colors were swapped out. Look up the shared compiled bitmaps.
+            self.frames = assets.frameset(self.frames)
+            self._bitmaps = assets.compile_frames(self.frames, self.pallete)
+            self._bitmap_rows = None  # looked up when first partly off the display
+            self._bitmap_frames = self.frames
+            self._bitmap_pallete = self.pallete
         # local variables for speed deep in the loop
         x = self.x
-        pallete = self.pallete
-        for yi, row in enumerate(self.frame):
-            y = self.y + yi
-            for xi, val in enumerate(row):
-                if val:
-                    red, green, blue = pallete[val]
-                    display.set_pixel(x + xi, y, red, green, blue)
+        y = self.y
+        set_pixel = display.set_pixel
+        width, height = display.width, display.height
+        if x < 0 or y < 0 or x + self.width > width or y + self.height > height:
+            self._render_clipped(set_pixel, width, height)
+            return
+        for xi, yi, red, green, blue in self._bitmaps[self._frame_num]:
+            set_pixel(x + xi, y + yi, red, green, blue)
+
+    def _render_clipped(self, set_pixel, width, height):
+        """Render only the rows and columns of the frame that land on the display."""
+        if self._bitmap_rows is None:
+            self._bitmap_rows = assets.compile_rows(self.frames, self.pallete)
+        x, y = self.x, self.y
+        rows = self._bitmap_rows[self._frame_num]
+        for yi in range(max(0, -y), min(len(rows), height - y)):
+            xs, pixels = rows[yi]
+            start = bisect.bisect_left(xs, -x) if x < 0 else 0
+            end = bisect.bisect_left(xs, width - x)
+            for xi, red, green, blue in pixels[start:end]:
+                set_pixel(x + xi, y + yi, red, green, blue)
 
     def _render_phrase(self, display):
         """Render optional follower phrase."""
@@ -253,10 +342,65 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
                 self.text.x = xtext
                 self.text.y = ytext
                 self._phrase_width = self.text.render(display)  # pylint:disable=no-member
+            elif (xtext >= display.width or ytext - self.font.height >= display.height or
+                  ytext + self.font.height <= 0 or
+                  xtext < 0 and xtext + self.font.text_width(self.text) <= 0):
+                # no row or column of it lands on the display. Just keep its width.
+                self._phrase_width = self.font.text_width(self.text)
             else:
                 red, green, blue = self.pallete['text']
                 self._phrase_width = display.text(self.font, xtext, ytext, red, green, blue, self.text)
 
+    def visible_on(self, width, height):
+        """
+        True if the sprite might draw something on a display of this size.
+
+        Errs on the side of True, including a bit of slack for moving this frame.
+        """
+        if self.x is None or self.y is None:
+            return True
+        try:
+            right, bottom = self.x + self.width, self.y + self.height
+        except (IndexError, AttributeError):
+            return True  # nothing to measure yet
+        slack = abs(self.dx or 0) + abs(self.dy or 0)
+        right += slack
+        bottom += slack
+        if self.text and self.font is not None:
+            right += 1 + self._phrase_width
+            bottom = max(bottom, self.y + 2 * self.font.height + slack)
+        return right > 0 and bottom > 0 and self.x - slack < width and self.y - slack < height
+
+    def advance(self):
+        """Tick without drawing, for when the sprite is off the display."""
+        self.tick()
+        if self.text and self.font is not None and not isinstance(self.text, Sprite):
+            self._phrase_width = self.font.text_width(self.text)  # it may have changed
+
+    def is_animated(self):
+        """
+        True if this sprite changes on its own rather than only when its data does.
+
+        Scenes with no animated sprites can reuse their last frame.
+        """
+        if self.dx or self.dy or len(self.frames) > 1 or len(self.phrases or ()) > 1:
+            return True
+        if any(callable(phrase) for phrase in self.phrases or ()):
+            return True  # like the time of day
+        return isinstance(self.text, Sprite) and self.text.is_animated()
+
+    def asset_keys(self):  # pylint: disable=no-self-use
+        """Keys of the managed assets (see :py:mod:`infopanel.assets`) this sprite uses."""
+        return []
+
+    def next_change(self):  # pylint: disable=no-self-use
+        """
+        Clock time at which this sprite will look different on its own, or None.
+
+        For sprites that aren't animated but change with the time, like clocks.
+        """
+        return None
+
     def reinit(self):
         if not self.init_x:
             LOG.debug('setting x y %s %s, %s %s', self.x, self.y, self.init_x, self.init_y)
@@ -270,21 +414,25 @@ class Sprite(object):  # pylint: disable=too-many-instance-attributes
 class FancyText(Sprite):
     """Text with multiple colors and stuff that can move."""
 
+    __slots__ = ('_text', '_width', 'data_label', 'value', 'last_val', '_strip', '_strip_key')
+
     def __init__(self, max_x, max_y, data_source=None):
         Sprite.__init__(self, max_x, max_y, data_source=data_source)
-        self.frames = [[[]]]
+        self.frames = EMPTY_FRAMES
         self._text = []
         self._width = 0
         self.data_label = None
         self.value = ""
         self.last_val = None
+        self._strip = None  # pre-rendered text, for scrolling
+        self._strip_key = None
 
     def check_frame_bounds(self):
         """No frames, no frame delta. ."""
         self._frame_delta = 0
 
-    def apply_config(self, conf):
-        conf = Sprite.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = Sprite.apply_config(self, conf, validated)
         if self.text:
             self.add(self.text, self.pallete['text'])
         elif conf['data_label']:
@@ -321,11 +469,17 @@ class FancyText(Sprite):
         """
         Render fancy text to screen.
 
-        Can have lines that end with newline, and can have multiple colors.
+        Can have lines that end with newline, and can have multiple colors. Moving
+        text is drawn from a pre-rendered strip.
         """
         self.update_text()
-        x = 0
         self.tick()
+        if (self.dx or self.dy) and self.font is not None:
+            strip = self._current_strip()
+            strip.blit(display.set_pixel, self.x, self.y, display.width)
+            self._width = strip.width
+            return self._width
+        x = 0
         for text, rgb in self._text:
             if callable(text):
                 text = str(text())  # for dynamic values
@@ -334,6 +488,42 @@ class FancyText(Sprite):
         self._width = x
         return x
 
+    def _current_strip(self):
+        """
+        The pre-rendered text, looked up again only when the text changes.
+
+        Strips are managed assets, so sprites showing the same text in the same font
+        (like copies of a sprite in several scenes) share one.
+        """
+        segments = tuple((str(text()) if callable(text) else text, tuple(rgb))
+                         for text, rgb in self._text)
+        if segments != self._strip_key:
+            font = self.font
+
+            def load():
+                strip = font.render_strip(segments)
+                return strip, strip.nbytes
+            self._strip = assets.MANAGER.ref(('text', font.path or id(font), segments), load)
+            self._strip_key = segments
+        return self._strip.get()
+
+    def asset_keys(self):
+        return [self._strip.key] if self._strip is not None else []
+
+    def visible_on(self, width, height):
+        """True if the text might land on a display of this size, going by its last width."""
+        if self.x is None or self.y is None or self.font is None or not self._width:
+            return True
+        slack = abs(self.dx or 0) + abs(self.dy or 0) + self.font.height
+        return (self.x + self._width + slack > 0 and self.x - slack < width and
+                self.y + slack > 0 and self.y - slack < height)
+
+    def advance(self):
+        self.update_text()
+        self.tick()
+        if (self.dx or self.dy) and self.font is not None:
+            self._width = self._current_strip().width  # the wrap-around depends on it
+
     def _make_text(self):
         """Make elements of a duration with label and text."""
         val = self.value  # pylint: disable=not-callable
@@ -357,6 +547,8 @@ class FancyText(Sprite):
 
 class TextWithBackground(FancyText):
 
+    __slots__ = ('rgb', 'background_rgb')
+
     CONF = FancyText.CONF.extend({vol.Optional('rgb', default=[0, 0, 0]): vol.Coerce(list),
                                   vol.Optional('background_rgb', default=[0, 0, 0]): vol.Coerce(list)})
 
@@ -365,8 +557,8 @@ class TextWithBackground(FancyText):
         self.rgb = None
         self.background_rgb = None
 
-    def apply_config(self, conf):
-        conf = FancyText.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = FancyText.apply_config(self, conf, validated)
         self._make_text()
         return conf
 
@@ -400,14 +592,16 @@ class TextWithBackground(FancyText):
 
 class ColorText(FancyText):
 
+    __slots__ = ('rgb',)
+
     CONF = FancyText.CONF.extend({vol.Optional('rgb', default=[0, 0, 0]): vol.Coerce(list)})
 
     def __init__(self, max_x, max_y, data_source):
         FancyText.__init__(self, max_x, max_y, data_source=data_source)
         self.rgb = None
 
-    def apply_config(self, conf):
-        conf = FancyText.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = FancyText.apply_config(self, conf, validated)
         self._make_text()
         return conf
 
@@ -439,6 +633,8 @@ class ColorText(FancyText):
 class Duration(FancyText):  # pylint:disable=too-many-instance-attributes
     """Text that represents a duration with a green-to-red color."""
 
+    __slots__ = ('color', 'low_val', 'high_val', 'label', 'label_fmt', 'val_fmt', 'cmap')
+
     CONF = FancyText.CONF.extend({'label': vol.Coerce(str),
                                   vol.Optional('low_val', default=13.0):vol.Coerce(float),
                                   vol.Optional('high_val', default=23.0): vol.Coerce(float),
@@ -457,8 +653,8 @@ class Duration(FancyText):  # pylint:disable=too-many-instance-attributes
         self.val_fmt = None
         self.cmap = colors.GREEN_RED
 
-    def apply_config(self, conf):
-        conf = FancyText.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = FancyText.apply_config(self, conf, validated)
         if conf['data_label']:
             # make function to get live data off of object
             self.value = lambda: self._convert_data(self.data_source[conf['data_label']])
@@ -501,6 +697,8 @@ class Duration(FancyText):  # pylint:disable=too-many-instance-attributes
 class Temperature(Duration):
     """A temperature with color dependent on a high and low bound."""
 
+    __slots__ = ()
+
     # updating defaults in a schema is broken in voluptuous 0.9.3 but fixed in master.
     # for now you will have to enter the lows and highs manually.
     # low_val with two different defaults gets treated as two keys and config value gets destroyed.
@@ -524,74 +722,230 @@ class Temperature(Duration):
             return None
 
 
+class Sparkline(Sprite):  # pylint:disable=too-many-instance-attributes
+    """
+    A little line graph of the recent history of a data value.
+
+    One column per history slot, newest on the right, colored like a Duration.
+    Without ``low_val`` and ``high_val`` it scales to the values shown.
+    """
+
+    __slots__ = ('data_label', 'graph_width', 'graph_height', 'span', 'low_val', 'high_val',
+                 'cmap')
+
+    CONF = Sprite.CONF.extend({'data_label': str,
+                               vol.Optional('graph_width', default=32): int,
+                               vol.Optional('graph_height', default=8): int,
+                               vol.Optional('span', default=3600): vol.Coerce(float),
+                               vol.Optional('low_val', default=None):
+                                   vol.Any(None, vol.Coerce(float)),
+                               vol.Optional('high_val', default=None):
+                                   vol.Any(None, vol.Coerce(float)),
+                               vol.Optional('cmap', default=None): vol.Any(None, str)})
+
+    def __init__(self, max_x, max_y, data_source=None):
+        Sprite.__init__(self, max_x, max_y, data_source)
+        self.frames = EMPTY_FRAMES
+        self.data_label = None
+        self.graph_width = None
+        self.graph_height = None
+        self.span = None
+        self.low_val = None
+        self.high_val = None
+        self.cmap = None
+
+    def apply_config(self, conf, validated=False):
+        conf = Sprite.apply_config(self, conf, validated)
+        self.cmap = getattr(cm, conf['cmap']) if conf['cmap'] else colors.GREEN_RED
+        self.data_source.track_history(self.data_label)
+        return conf
+
+    @property
+    def width(self):
+        return self.graph_width
+
+    @property
+    def height(self):
+        return self.graph_height
+
+    def _render_frame(self, display):
+        if self.data_source.history is None:
+            return
+        values = self.data_source.history.recent(self.data_label, self.graph_width, self.span)
+        left = self.x + self.graph_width - len(values)  # right-align a short history
+        bottom = self.y + self.graph_height - 1
+        set_pixel = display.set_pixel
+        for column, level, (red, green, blue) in self.scale(values):
+            self._draw_column(set_pixel, left + column, bottom, level, red, green, blue)
+
+    def _draw_column(self, set_pixel, x, bottom, level, red, green, blue):  # pylint: disable=too-many-arguments
+        set_pixel(x, bottom - level, red, green, blue)
+
+    def scale(self, values):
+        """
+        Turn values into ``(column, level, (r, g, b))`` for the columns that have a value.
+
+        Levels go from 0 at the bottom to ``graph_height - 1`` at the top.
+        """
+        if np is None:
+            return self._scale_slowly(values)
+        values = np.array(values, dtype=float)
+        known = np.flatnonzero(~np.isnan(values))
+        if not len(known):  # pylint: disable=len-as-condition
+            return []
+        low, high = self._bounds(values[known].min(), values[known].max())
+        fractions = np.clip((values[known] - low) / (high - low), 0.0, 1.0)
+        levels = np.rint(fractions * (self.graph_height - 1)).astype(int)
+        rgb = (self.cmap(fractions)[:, :3] * 255).astype(int)
+        return [(int(column), int(level), tuple(int(channel) for channel in color))
+                for column, level, color in zip(known, levels, rgb)]
+
+    def _scale_slowly(self, values):
+        known = [(column, value) for column, value in enumerate(values) if value == value]
+        if not known:
+            return []
+        low, high = self._bounds(min(value for _c, value in known),
+                                 max(value for _c, value in known))
+        scaled = []
+        for column, value in known:
+            fraction = min(1.0, max(0.0, (value - low) / (high - low)))
+            red, green, blue, _alpha = self.cmap(fraction)
+            scaled.append((column, int(round(fraction * (self.graph_height - 1))),
+                           (int(red * 255), int(green * 255), int(blue * 255))))
+        return scaled
+
+    def _bounds(self, low, high):
+        low = low if self.low_val is None else self.low_val
+        high = high if self.high_val is None else self.high_val
+        if high <= low:
+            high = low + 1.0
+        return low, high
+
+
+class BarGraph(Sparkline):
+    """Like a Sparkline, but with a filled bar in each column."""
+
+    __slots__ = ()
+
+    def _draw_column(self, set_pixel, x, bottom, level, red, green, blue):  # pylint: disable=too-many-arguments
+        for y in range(bottom - level, bottom + 1):
+            set_pixel(x, y, red, green, blue)
+
+
+class Clock(Sprite):
+    """
+    The time or date in any ``strftime`` format, like ``%H:%M`` or ``%a %b %d``.
+
+    Each character is rasterized once. The text is only worked out again when the
+    time shown changes, at the next second or minute, and frames in between blit
+    the same glyphs. Scenes with a still clock are only redrawn then.
+    """
+
+    __slots__ = ('format', '_glyphs', '_layout', '_width', '_period', '_next_change')
+
+    CONF = Sprite.CONF.extend({vol.Optional('format', default='%H:%M'): str})
+
+    def __init__(self, max_x, max_y, data_source=None):
+        Sprite.__init__(self, max_x, max_y, data_source)
+        self.frames = EMPTY_FRAMES
+        self.format = None
+        self._glyphs = {}  # (character, rgb): TextStrip, shared with copies
+        self._layout = ()  # (x offset, TextStrip) for each character shown
+        self._width = 0
+        self._period = 60
+        self._next_change = None
+
+    def apply_config(self, conf, validated=False):
+        conf = Sprite.apply_config(self, conf, validated)
+        self._period = 1 if any(code in self.format for code in SECOND_CODES) else 60
+        self._next_change = None
+        return conf
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self.font.height
+
+    def next_change(self):
+        return self._next_change
+
+    def _update(self):
+        """Lay out the glyphs of the current time, if it changed since the last time."""
+        now = helpers.CLOCK.time()
+        if self._next_change is not None and now < self._next_change:
+            return
+        text = datetime.datetime.fromtimestamp(now).strftime(self.format)
+        rgb = tuple(self.pallete['text'])
+        layout = []
+        x = 0
+        for char in text:
+            glyph = self._glyphs.get((char, rgb))
+            if glyph is None:
+                glyph = self._glyphs[(char, rgb)] = self.font.render_strip(((char, rgb),))
+            layout.append((x, glyph))
+            x += glyph.width
+        self._layout = tuple(layout)
+        self._width = x
+        self._next_change = (now // self._period + 1) * self._period
+
+    def _render_frame(self, display):
+        if self.font is None:
+            return
+        self._update()
+        set_pixel, x, y, width = display.set_pixel, self.x, self.y, display.width
+        for offset, glyph in self._layout:
+            glyph.blit(set_pixel, x + offset, y, width)
+
+    def render(self, display):
+        """Render and return the width, so clocks can be phrases too."""
+        Sprite.render(self, display)
+        return self._width
+
+    def advance(self):
+        if self.font is not None:
+            self._update()
+        Sprite.advance(self)
+
+
 class Giraffe(Sprite):
     """An animated Giraffe."""
 
+    __slots__ = ()
+
     def __init__(self, max_x, max_y, data_source=None):
         Sprite.__init__(self, max_x, max_y, data_source)
         self.ticks_per_frame = 3
-        self.pallete = {1: (255, 255, 0), 'text':[0, 255, 0]}
+        self.pallete = GIRAFFE_PALLETE
         self.dx = 1
         self.phrases = [''] * 6 + GOOFY_EXCLAMATIONS + [helpers.day_of_week,
                                                         helpers.time_now,
                                                         helpers.date]
-        self.frames = [[[0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 1],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 1, 1, 0],
-                        [0, 1, 1, 1, 0],
-                        [1, 1, 1, 1, 0],
-                        [1, 0, 0, 1, 0],
-                        [1, 0, 0, 0, 1],
-                        [1, 0, 0, 0, 1]],
-
-                       [[0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 1],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 0, 1, 0],
-                        [0, 0, 1, 1, 0],
-                        [0, 1, 1, 1, 0],
-                        [1, 1, 1, 1, 0],
-                        [1, 0, 0, 1, 0],
-                        [1, 0, 0, 1, 0],
-                        [0, 1, 1, 0, 0]]]
+        self.frames = GIRAFFE_FRAMES
 
 
 class Plant(Sprite):
     """A tropical plant."""
+
+    __slots__ = ()
+
     def __init__(self, max_x, max_y, data_source=None):
         Sprite.__init__(self, max_x, max_y, data_source)
-        self.frames = [[[0, 1, 1, 1, 1, 0],
-                        [1, 0, 0, 1, 0, 1],
-                        [1, 0, 2, 0, 0, 1],
-                        [0, 0, 2, 0, 0, 0],
-                        [0, 0, 2, 2, 0, 0],
-                        [0, 0, 2, 2, 0, 0]],
-
-                       [[1, 1, 1, 1, 1, 0],
-                        [1, 0, 0, 1, 0, 1],
-                        [0, 0, 0, 2, 1, 0],
-                        [0, 0, 0, 2, 0, 0],
-                        [0, 0, 2, 2, 0, 0],
-                        [0, 0, 2, 2, 0, 0]]]
-
-        self.ticks_per_frame = random.randint(10, 20)
-        self.pallete = {1: (0, 240, 0),
-                        2: (165, 42, 42)}
+        self.frames = PLANT_FRAMES
+        self.ticks_per_frame = helpers.RANDOM.randint(10, 20)
+        self.pallete = PLANT_PALLETE
 
 class BaseImage(Sprite):
     """Abstract image."""
+
+    __slots__ = ()
+
     CONF = Sprite.CONF.extend({'path': vol.Coerce(str)})
 
-    def apply_config(self, conf):
-        conf = Sprite.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = Sprite.apply_config(self, conf, validated)
         self.set_source_path(conf['path'])
         return conf
 
@@ -609,6 +963,9 @@ class BaseImage(Sprite):
 
 class Image(BaseImage):
     """Bitmap image that doesn't animate."""
+
+    __slots__ = ('_image',)
+
     def __init__(self, *args, **kwargs):
         BaseImage.__init__(self, *args, **kwargs)
         self._image = None
@@ -616,37 +973,44 @@ class Image(BaseImage):
     def set_source_path(self, path):
         """Set this image source to a new path."""
         LOG.debug('New image path %s', path)
-        with PILImage.open(os.path.expandvars(path)) as image:
-            image.thumbnail((self.max_x, self.max_y), PILImage.ANTIALIAS)
-            self._image = image.convert('RGB')
+        self._image = bundle.image_ref(path, self.max_x, self.max_y, animated=False)
+
+    def asset_keys(self):
+        return [self._image.key] if self._image is not None else []
 
     @property
     def frame(self):
-        return self._image
+        return self._image[0]
 
     @property
     def width(self):
-        return self._image.size[0]
+        return self.frame.size[0]
 
     @property
     def height(self):
-        return self._image.size[1]
+        return self.frame.size[1]
 
 
 class AnimatedGif(BaseImage):
     """Animated gif sprite."""
 
+    __slots__ = ()
+
     def set_source_path(self, path):
-        image = PILImage.open(os.path.expandvars(path))
-        frames = [frame.copy() for frame in ImageSequence.Iterator(image)]
-        for frame in frames:
-            frame.thumbnail((self.max_x, self.max_y), PILImage.ANTIALIAS)
-        self.frames = [frame.convert('RGB') for frame in frames]
+        self.frames = bundle.image_ref(path, self.max_x, self.max_y)
         self._frame_delta = 1
 
+    @property
+    def frame(self):
+        frames = self.frames.get() if isinstance(self.frames, assets.AssetRef) else self.frames
+        return frames[self._frame_num % len(frames)]  # the file may change under us
+
+    def asset_keys(self):
+        return [self.frames.key] if isinstance(self.frames, assets.AssetRef) else []
+
     def check_frame_bounds(self):
         """Roll back to first frame if all have been seen."""
-        if self._frame_num == len(self.frames) - 1:
+        if self._frame_num >= len(self.frames) - 1:
             self._frame_num = 0
 
     @property
@@ -662,6 +1026,9 @@ class AnimatedGif(BaseImage):
 
 class Reddit(FancyText):
     """The titles of some top posts in various subreddits."""
+
+    __slots__ = ('_praw', 'subreddits', 'num_headlines', 'update_minutes', '_last_update_time')
+
     CONF = FancyText.CONF.extend({'client_id': str,
                                   'client_secret': str,
                                   vol.Optional('user_agent', default='infopanel'): str,
@@ -676,10 +1043,10 @@ class Reddit(FancyText):
         self.subreddits = None
         self.num_headlines = None
         self.update_minutes = None
-        self._last_update_time = datetime.datetime.now()
+        self._last_update_time = helpers.CLOCK.now()
 
-    def apply_config(self, conf):
-        conf = FancyText.apply_config(self, conf)
+    def apply_config(self, conf, validated=False):
+        conf = FancyText.apply_config(self, conf, validated)
         import praw
         self._praw = praw.Reddit(client_id=conf['client_id'],
                                  client_secret=conf['client_secret'],
@@ -701,7 +1068,7 @@ class Reddit(FancyText):
     def update_phrase(self):
         """Occasionally update the headlines."""
         if not self._ticks % self.ticks_per_phrase:
-            now = datetime.datetime.now()
+            now = helpers.CLOCK.now()
             if now - self._last_update_time > datetime.timedelta(minutes=self.update_minutes):
                 self.update_headlines()
                 self._last_update_time = now
@@ -709,23 +1076,78 @@ class Reddit(FancyText):
     def _maybe_flip(self):
         return False
 
+    def is_animated(self):
+        """Headlines refresh on their own."""
+        return True
+
+
+def _build_registry():
+    """Map sprite type names to their classes."""
+    return {name: cls for name, cls in inspect.getmembers(sys.modules[__name__], inspect.isclass)
+            if issubclass(cls, Sprite)}
+
+SPRITE_TYPES = _build_registry()
 
-def sprite_factory(config, data_source, disp):
-    """Build sprites from config file."""
+def sprite_factory(config, data_source, disp, validated=False):
+    """
+    Build sprites from config file.
+
+    If ``validated`` is True, sprite configs have already been normalized
+    (see :py:func:`infopanel.config.normalize_sprites`).
+    """
     sprites = {}
     for name, sprite_conf in config.items():
-        for cls_name, cls in inspect.getmembers(sys.modules[__name__]):
-            try:
-                if sprite_conf['type'] == cls_name:
-                    break
-            except KeyError:
-                LOG.error("%s", name)
-                raise
-        else:
+        sprite_conf = dict(sprite_conf)
+        try:
+            cls = SPRITE_TYPES[sprite_conf.pop('type')]
+        except KeyError:
             raise ValueError('{} is invalid sprite'.format(name))
-        del sprite_conf['type']
-        sprite = cls(disp.width, disp.height, data_source=data_source)  # pylint:disable=undefined-loop-variable
-        sprite.apply_config(sprite_conf)
+        with startup.TRACE.phase('sprites/' + name):
+            sprite = cls(disp.width, disp.height, data_source=data_source)
+            sprite.apply_config(sprite_conf, validated=validated)
         sprites[name] = [sprite]  # track as list b/c copies will be added later and we track all.
         LOG.debug('Build %s', sprite)
     return sprites
+
+
+class SpriteTable(dict):
+    """
+    Sprites by name, each built the first time it's looked up.
+
+    Like the result of :py:func:`sprite_factory`, maps names to the template sprite
+    followed by its copies in scenes, but only for sprites some scene has used.
+    ``get`` and ``in`` only see sprites that are built.
+    """
+
+    def __init__(self, config, data_source, disp, validated=False):
+        dict.__init__(self)
+        self.config = dict(config)
+        self.data_source = data_source
+        self.disp = disp
+        self.validated = validated
+        self.paths = {}  # name: source path set by command, kept across rebuilds
+
+    def __missing__(self, name):
+        if name not in self.config:
+            raise KeyError(name)
+        sprite = sprite_factory({name: self.config[name]}, self.data_source, self.disp,
+                                self.validated)[name][0]
+        if name in self.paths:
+            try:
+                sprite.set_source_path(self.paths[name])
+            except (IOError, OSError) as exc:
+                LOG.warning('Keeping the configured path of %s: %s', name, exc)
+        self[name] = [sprite]
+        return self[name]
+
+    def build_all(self):
+        """Build every configured sprite now."""
+        for name in self.config:
+            self[name]  # pylint: disable=pointless-statement
+
+    def configure(self, config, stale):
+        """Switch to a new config, dropping the named sprites so they get rebuilt."""
+        self.config = dict(config)
+        for name in stale:
+            self.pop(name, None)
+            self.paths.pop(name, None)
@@ -0,0 +1,185 @@
+"""
+Where the time goes between starting the process and showing the first frame.
+
+The driver times each startup phase, and each sprite and scene it builds, into
+:py:data:`TRACE`, and logs a breakdown when the first frame is buffered. To
+measure a config from a cold process, and fail if it's over budget::
+
+    python -m infopanel.startup --config infopanel.yaml --runs 5 --budget 4.0
+
+That starts a fresh Python for each run and builds the config's scenes on a
+headless display of the same size, so it works off the Pi too. MQTT isn't
+started. Only the standard library is imported here so importing this module
+doesn't skew the numbers.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+LOG = logging.getLogger(__name__)
+RESULT_PREFIX = 'STARTUP '
+NUM_SLOWEST = 5  # sprites or scenes to list
+
+
+def process_start_time():
+    """Wall-clock time this process started, from /proc, or None where that's unavailable."""
+    try:
+        with open('/proc/self/stat') as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as uptime:
+            seconds_up = float(uptime.read().split()[0])
+        return time.time() - seconds_up + int(fields[19]) / float(os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTrace(object):
+    """
+    Durations of named startup phases, until the first frame.
+
+    Names with a ``/`` (like ``sprites/flag``) are parts of the phase before it.
+    Timing stops once the first frame is buffered, so rebuilding sprites on a
+    config reload isn't counted.
+    """
+
+    def __init__(self, start=None):
+        self.start = start or process_start_time() or time.time()
+        self.phases = []  # (name, seconds), in the order they finished
+        self.first_frame = None  # seconds from the start
+        self.finished = False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the body of a ``with`` block."""
+        if self.finished:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+
+    def mark(self, name):
+        """Record everything from the start until now as a phase."""
+        if not self.finished:
+            self.phases.append((name, time.time() - self.start))
+
+    def frame_buffered(self):
+        """Note that a frame went up. Logs the breakdown after the first."""
+        if self.finished:
+            return
+        self.finished = True
+        self.first_frame = time.time() - self.start
+        LOG.info('\n'.join(self.report()))
+
+    def report(self):
+        """Lines breaking down the startup time, with the slowest parts of each phase."""
+        lines = []
+        if self.first_frame is not None:
+            lines.append('First frame after {:.3f} s'.format(self.first_frame))
+        parts = {}
+        for name, seconds in self.phases:
+            group, _slash, part = name.partition('/')
+            if part:
+                parts.setdefault(group, []).append((seconds, part))
+        for name, seconds in self.phases:
+            if '/' in name:
+                continue
+            lines.append('  {:<24} {:8.3f} s'.format(name, seconds))
+            lines.extend(self._slowest(parts.pop(name, [])))
+        for group, group_parts in sorted(parts.items()):
+            # built inside another phase, like sprites built along with their scenes
+            lines.append('  {:<24} {:8.3f} s (within the above)'.format(
+                group, sum(seconds for seconds, _part in group_parts)))
+            lines.extend(self._slowest(group_parts))
+        return lines
+
+    @staticmethod
+    def _slowest(parts):
+        return ['    {:<22} {:8.3f} s'.format(part, seconds)
+                for seconds, part in sorted(parts, reverse=True)[:NUM_SLOWEST]]
+
+
+TRACE = StartupTrace()
+
+
+def _first_frame(conf_path):
+    """Child process body: start up like the driver does, then report the first frame."""
+    from infopanel import startup  # the driver traces into that one, not __main__
+    trace = startup.TRACE
+    trace.mark('python')
+    with trace.phase('imports'):
+        from infopanel import config, data, display, driver, offline
+    with trace.phase('config'):
+        conf = config.load_config_yaml(conf_path)
+    with trace.phase('global config'):
+        driver.apply_global_config(conf)
+    name, display_conf = driver.display_configs(conf)[0]
+    for section in ('Network', 'FrameBuffer'):
+        if section in display_conf:
+            size = display_conf[section]['width'], display_conf[section]['height']
+            break
+    else:
+        size = offline.framebuffer_size(display_conf)
+    disp = display.FrameBufferDisplay(*size)
+    infopanel = driver.driver_factory(disp, data.InputData(), driver.display_view(conf, name))
+    infopanel.draw_frame()
+    # other output (like rgbmatrix warnings) may be on stdout too
+    sys.stdout.write('\n' + RESULT_PREFIX + json.dumps({'first_frame': time.time(),
+                                                         'phases': trace.phases}) + '\n')
+
+
+def benchmark(conf_path, runs=3):
+    """
+    Time process start to first frame for a config, in fresh processes.
+
+    Returns a list of ``(seconds, phases)`` for each run.
+    """
+    results = []
+    for _run in range(runs):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-m', 'infopanel.startup',
+                                          '--child', conf_path])
+        line = [line for line in output.decode('utf-8').splitlines()
+                if line.startswith(RESULT_PREFIX)][-1]
+        result = json.loads(line[len(RESULT_PREFIX):])
+        results.append((result['first_frame'] - start,
+                        [tuple(phase) for phase in result['phases']]))
+    return results
+
+
+def main(argv=None):
+    """Run the time-to-first-frame benchmark from the command line."""
+    parser = argparse.ArgumentParser(description='Time infopanel from process start to the '
+                                     'first frame.')
+    parser.add_argument('--config', default='/etc/infopanel/infopanel.yaml',
+                        help='Point to a YAML configuration file.')
+    parser.add_argument('--runs', type=int, default=3, help='Number of fresh processes to time.')
+    parser.add_argument('--budget', type=float,
+                        help='Fail if the median time to first frame is over this many seconds.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _first_frame(args.child)
+        return 0
+    results = sorted(benchmark(args.config, args.runs))
+    median, phases = results[len(results) // 2]
+    trace = StartupTrace(start=1.0)
+    trace.phases, trace.first_frame = phases, median
+    print('\n'.join(['Median of {} runs (fastest {:.3f} s, slowest {:.3f} s):'.format(
+        len(results), results[0][0], results[-1][0])] + trace.report()))
+    if args.budget is not None and median > args.budget:
+        print('Over the budget of {:.3f} s'.format(args.budget))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
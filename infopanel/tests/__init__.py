@@ -19,3 +19,17 @@ class MockDisplay(display.Display):
     @property
     def width(self):
         return 64
+
+    @property
+    def brightness(self):
+        return 100
+
+    @brightness.setter
+    def brightness(self, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def buffer(self):
+        pass
@@ -0,0 +1,91 @@
+"""Tests for the asset manager."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image as PILImage
+
+from infopanel import assets, sprites
+
+
+class TestAssetManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = assets.AssetManager()
+        self.num_loads = 0
+
+    def _loader(self, nbytes):
+        def load():
+            self.num_loads += 1
+            return [nbytes], nbytes
+        return load
+
+    def test_dedupe(self):
+        """Make sure an asset is loaded once however many handles there are."""
+        first = self.manager.ref(('image', 'a.png', (64, 32), 'still'), self._loader(100))
+        second = self.manager.ref(('image', 'a.png', (64, 32), 'still'), self._loader(100))
+        self.assertIs(first.get(), second.get())
+        self.assertEqual(self.num_loads, 1)
+        self.assertEqual(self.manager.nbytes(), 100)
+        del first, second
+        self.manager.ref(('image', 'b.png', (64, 32), 'still'), self._loader(10))
+        self.assertEqual(self.manager.nbytes(), 10)  # nobody held a.png any more
+
+    def test_budget(self):
+        """Make sure the least recently used assets go over budget and come back when used."""
+        self.manager.budget = 250
+        refs = [self.manager.ref(('image', name, (64, 32), 'still'), self._loader(100))
+                for name in ('a', 'b')]
+        refs[0].get()  # b is now the least recently used
+        refs.append(self.manager.ref(('image', 'c', (64, 32), 'still'), self._loader(100)))
+        self.assertEqual(self.manager.nbytes(), 200)
+        self.assertEqual(self.manager.evictions, 1)
+        self.assertEqual(len(refs[1]), 1)  # b is loaded again, and a goes
+        self.assertEqual(self.num_loads, 4)
+        report = self.manager.report()
+        self.assertEqual(report['bytes'], 200)
+        self.assertEqual(sorted(asset['key'] for asset in report['assets'] if asset['loaded']),
+                         ['image:b:64x32:still', 'image:c:64x32:still'])
+
+    def test_pinned(self):
+        """Make sure pinned assets count but are never dropped."""
+        self.manager.budget = 50
+        self.manager.pin(('font', '5x8.bdf'), object(), 40)
+        ref = self.manager.ref(('text', '5x8.bdf', 'HI'), self._loader(30))
+        self.assertEqual(self.manager.nbytes(), 70)
+        self.assertEqual(self.manager.evictions, 0)
+        self.assertEqual(ref[0], 30)
+
+
+class TestSharedImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'flag.png')
+        PILImage.new('RGB', (16, 8), (1, 2, 3)).save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_image_sprites(self):
+        """Make sure sprites showing the same image share it and get it back after eviction."""
+        first, second = sprites.Image(64, 32), sprites.Image(64, 32)
+        for sprite in (first, second):
+            sprite.apply_config({'path': self.path})
+        self.assertIs(first.frame, second.frame)
+        self.assertEqual(first.asset_keys(), second.asset_keys())
+        self.assertEqual(assets.MANAGER.nbytes(first.asset_keys()), 16 * 8 * 3)
+        previous_budget = assets.MANAGER.budget
+        assets.MANAGER.budget = 1
+        try:
+            gif = sprites.AnimatedGif(64, 32)
+            gif.apply_config({'path': self.path})  # pushes the image out
+            self.assertEqual(assets.MANAGER.nbytes(first.asset_keys()), 0)
+            self.assertEqual(first.width, 16)
+        finally:
+            assets.MANAGER.budget = previous_budget
+
+
+if __name__ == "__main__":
+    unittest.main()
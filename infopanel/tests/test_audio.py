@@ -0,0 +1,79 @@
+"""Tests for the audio worker."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import wave
+
+from infopanel import audio
+
+
+def _write_wav(path, num_frames):
+    wav = wave.open(path, 'wb')
+    wav.setnchannels(1)
+    wav.setsampwidth(2)
+    wav.setframerate(8000)
+    wav.writeframes(b'\x01\x00' * num_frames)
+    wav.close()
+
+
+class TestAudio(unittest.TestCase):
+
+    def setUp(self):
+        self.sound_dir = tempfile.mkdtemp()
+        for name in ('beep', 'boop', 'alarm'):
+            _write_wav(os.path.join(self.sound_dir, name + '.wav'), 800)
+        self.sink = audio.NullSink()
+        self.worker = audio.AudioWorker(audio.WavCache(self.sound_dir), self.sink, max_queue=2,
+                                        priorities={'alarm': 5})
+
+    def tearDown(self):
+        self.worker.stop()
+        shutil.rmtree(self.sound_dir)
+
+    def _wait_for(self, num_played):
+        for _i in range(100):
+            if len(self.sink.played) >= num_played:
+                return
+            time.sleep(0.01)
+
+    def test_cache(self):
+        """Make sure sounds are decoded once and names can't escape the sound directory."""
+        cache = self.worker.cache
+        cache.preload()
+        self.assertEqual(cache.num_loaded, 3)
+        sound = cache.get('beep')
+        self.assertIs(cache.get('beep'), sound)
+        self.assertEqual(cache.num_loaded, 3)
+        self.assertAlmostEqual(sound.duration, 0.1)
+        with self.assertRaises(ValueError):
+            cache.get('../beep')
+
+    def test_queue_rules(self):
+        """Make sure repeats coalesce, priorities go first, and a full queue drops extras."""
+        self.assertTrue(self.worker.play(b'beep'))
+        self.assertTrue(self.worker.play('beep'))
+        self.assertTrue(self.worker.play('boop'))
+        self.assertTrue(self.worker.play('alarm'))  # bumps boop, the newest low priority
+        self.assertFalse(self.worker.play('missing'))
+        self.worker.start()
+        self._wait_for(2)
+        self.assertEqual(self.sink.played, ['alarm', 'beep'])
+        stats = self.worker.stats.summary()
+        self.assertEqual((stats['coalesced'], stats['dropped'], stats['max_depth']), (1, 2, 2))
+        self.assertEqual(stats['played'], 2)
+        self.assertGreaterEqual(stats['mean_latency'], 0.0)
+
+    def test_bad_sound(self):
+        """Make sure a missing sound is counted and the worker keeps going."""
+        self.worker.start()
+        self.worker.play('missing')
+        self.worker.play('beep')
+        self._wait_for(1)
+        self.assertEqual(self.sink.played, ['beep'])
+        self.assertEqual(self.worker.stats.failed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
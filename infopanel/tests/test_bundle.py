@@ -0,0 +1,81 @@
+"""Tests for memory-mapped asset bundles."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image as PILImage
+
+from infopanel import bundle, display, sprites
+
+FRAMES = ['0110 1221', '1001 0220']
+PALLETE = {1: [255, 0, 0], 2: [0, 0, 255]}
+
+
+class TestBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.tmpdir, 'flag.png')
+        image = PILImage.new('RGB', (128, 64), (10, 20, 30))
+        image.putpixel((0, 0), (200, 100, 50))
+        image.save(self.image_path)
+        sheet_path = os.path.join(self.tmpdir, 'sheet.png')
+        sheet = PILImage.new('RGBA', (6, 2), (0, 0, 0, 0))
+        sheet.putpixel((1, 0), (0, 255, 0, 255))
+        sheet.putpixel((4, 1), (0, 255, 0, 255))
+        sheet.save(sheet_path)
+        self.conf = {'FrameBuffer': {'width': 64, 'height': 32},
+                     'sheets': {'blob': {'frames': FRAMES, 'pallete': PALLETE},
+                                'png': {'image': sheet_path, 'frame_width': 3}},
+                     'sprites': {'flag': {'type': 'Image', 'path': self.image_path},
+                                 'giraffe': {'type': 'Giraffe'}}}
+        self.path = os.path.join(self.tmpdir, 'assets.bundle')
+        bundle.build(self.conf, self.path)
+        bundle.SHEETS = self.conf['sheets']
+        bundle.use(self.path)
+
+    def tearDown(self):
+        bundle.use(None)
+        bundle.SHEETS = {}
+        shutil.rmtree(self.tmpdir)
+
+    def test_sheets(self):
+        """Make sure bundled sheets match their source and PNG sheets get cut into frames."""
+        blob, pallete = bundle.sheet('blob')
+        self.assertEqual(blob, bundle.decode_sheet(self.conf['sheets']['blob'])[0])
+        self.assertEqual(pallete, PALLETE)
+        frames, pallete = bundle.sheet('png')
+        self.assertEqual(frames, (((0, 1, 0), (0, 0, 0)), ((0, 0, 0), (0, 1, 0))))
+        self.assertEqual(pallete, {1: [0, 255, 0]})
+        sprite = sprites.Sprite(64, 32)
+        sprite.apply_config({'sheet': 'blob', 'pallete': {'text': [1, 2, 3]}})
+        self.assertIs(sprite.frames, blob)
+        self.assertEqual(sprite.pallete, {1: [255, 0, 0], 2: [0, 0, 255], 'text': [1, 2, 3]})
+
+    def test_images(self):
+        """Make sure images come pre-scaled out of the map and blit like decoded ones."""
+        sprite = sprites.Image(64, 32)
+        sprite.apply_config({'path': self.image_path})
+        self.assertIsInstance(sprite.frame, bundle.ImageView)
+        self.assertEqual(sprite.frame.size, (64, 32))
+        decoded = bundle.decode_image(self.image_path, 64, 32, animated=False)[0]
+        from_bundle = display.FrameBufferDisplay(64, 32)
+        from_file = display.FrameBufferDisplay(64, 32)
+        from_bundle.set_image(sprite.frame, 3, -2)
+        from_file.set_image(decoded, 3, -2)
+        self.assertEqual(from_bundle.pixels, from_file.pixels)
+        self.assertEqual(sprite.frame.as_pil().tobytes(), decoded.tobytes())
+
+    def test_stale(self):
+        """Make sure changed sources are loaded from their files instead."""
+        os.utime(self.image_path, (1, 1))
+        sprite = sprites.Image(64, 32)
+        sprite.apply_config({'path': self.image_path})
+        self.assertNotIsInstance(sprite.frame, bundle.ImageView)
+        bundle.SHEETS = {'blob': {'frames': ['22 11']}}
+        self.assertEqual(bundle.sheet('blob'), ((((2, 2), (1, 1)),), None))
+
+
+if __name__ == "__main__":
+    unittest.main()
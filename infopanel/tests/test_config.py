@@ -0,0 +1,82 @@
+"""Tests for config loading."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from infopanel import config
+from infopanel.tests import TEST_ROOT
+
+class TestConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(TEST_ROOT, 'test_config.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_roundtrip(self):
+        """Make sure a cached config is identical to a freshly validated one."""
+        fresh = config.load_config_yaml(self.path, cache_dir=None)
+        first = config.load_config_yaml(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        cached = config.load_config_yaml(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(fresh, first)
+        self.assertEqual(fresh, cached)
+
+    def test_schema_change(self):
+        """Make sure a cache written with other schemas isn't reused."""
+        config.load_config_yaml(self.path, cache_dir=self.cache_dir)
+        before = os.listdir(self.cache_dir)
+        key = config.SCHEMA_KEY
+        try:
+            config.SCHEMA_KEY = 'changed'
+            config.load_config_yaml(self.path, cache_dir=self.cache_dir)
+        finally:
+            config.SCHEMA_KEY = key
+        self.assertEqual(len(key), 12)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertNotEqual(os.listdir(self.cache_dir), before)
+
+    def test_sprites_normalized(self):
+        """Make sure sprite defaults are filled in at load time."""
+        conf = config.load_config_yaml(self.path, cache_dir=None)
+        self.assertEqual(conf['sprites']['I90']['type'], 'Duration')
+        self.assertEqual(conf['sprites']['I90']['dx'], 0)
+
+    def test_stale_cache_replaced(self):
+        """Make sure editing the config invalidates and replaces the old cache."""
+        path = os.path.join(self.cache_dir, 'infopanel.yaml')
+        shutil.copy(self.path, path)
+        config.load_config_yaml(path, cache_dir=self.cache_dir)
+        with open(path, 'a') as configfile:
+            configfile.write('\n# edited\n')
+        config.load_config_yaml(path, cache_dir=self.cache_dir)
+        caches = [name for name in os.listdir(self.cache_dir) if name.endswith('.cache')]
+        self.assertEqual(len(caches), 1)
+
+class TestReferences(unittest.TestCase):
+
+    def setUp(self):
+        self.conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                            cache_dir=None)
+
+    def test_consistent(self):
+        """Make sure the test config passes."""
+        config.check_references(self.conf)
+
+    def test_missing(self):
+        """Make sure every missing scene, sprite, and mode is reported."""
+        del self.conf['scenes']['giraffes']
+        self.conf['scenes']['giraffe2']['sprites'].append({'nope': None})
+        self.conf['modes']['morning'].append({'traffic': {'duration': 5, 'mode_after': 'x'}})
+        self.conf['global']['default_mode'] = 'evening'
+        self.conf['scenes']['traffic']['sprites'][0]['I90']['colour'] = 'red'
+        with self.assertRaises(ValueError) as context:
+            config.check_references(self.conf)
+        for name in ('giraffes', 'nope', 'mode x', 'evening', 'colour'):
+            self.assertIn(name, str(context.exception))
+
+if __name__ == "__main__":
+    unittest.main()
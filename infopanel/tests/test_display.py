@@ -0,0 +1,237 @@
+"""Tests for displays."""
+import os
+import time
+import unittest
+
+from PIL import Image as PILImage
+
+from infopanel import display, fonts
+from infopanel.tests import TEST_ROOT
+
+def load_test_font():
+    """A tiny font with just A and the replacement character."""
+    return fonts.BDFFont(os.path.join(TEST_ROOT, 'test_font.bdf'))
+
+def lit_pixels(disp):
+    """Coordinates of all non-black pixels in the last buffered frame."""
+    frame = bytearray(disp.frame)
+    return set((i // 3 % disp.width, i // 3 // disp.width)
+               for i in range(0, len(frame), 3) if any(frame[i:i + 3]))
+
+class TestFrameBufferDisplay(unittest.TestCase):
+
+    def setUp(self):
+        self.disp = display.FrameBufferDisplay(8, 6)
+
+    def test_text(self):
+        """Make sure BDF glyphs land on the baseline and advance."""
+        width = self.disp.text(load_test_font(), 1, 4, 255, 0, 0, 'A?')
+        self.disp.buffer()
+        self.assertEqual(width, 8)
+        pixels = lit_pixels(self.disp)
+        self.assertIn((2, 0), pixels)  # top of the A
+        self.assertNotIn((1, 0), pixels)
+        self.assertIn((5, 4), pixels)  # replacement glyph descends below the baseline
+
+    def test_clipping(self):
+        """Make sure drawing off the edges is ignored."""
+        self.disp.set_pixel(-1, 0, 1, 1, 1)
+        self.disp.set_pixel(8, 0, 1, 1, 1)
+        self.disp.set_image(PILImage.new('RGB', (4, 4), (0, 9, 0)), 6, 4)
+        self.disp.buffer()
+        self.assertEqual(lit_pixels(self.disp), set([(6, 4), (7, 4), (6, 5), (7, 5)]))
+
+    def test_listeners(self):
+        """Make sure listeners get every buffered frame."""
+        frames = []
+        self.disp.add_frame_listener(frames.append)
+        self.disp.set_pixel(0, 0, 1, 2, 3)
+        self.disp.buffer()
+        self.disp.clear()
+        self.disp.buffer()
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(bytearray(frames[0][:3]), bytearray([1, 2, 3]))
+        self.assertEqual(frames[1], bytes(bytearray(8 * 6 * 3)))
+
+class FakeFont(object):  # pylint: disable=too-few-public-methods
+    """Stands in for an rgbmatrix font."""
+    loads = 0
+
+    def LoadFont(self, path):  # pylint: disable=invalid-name, unused-argument
+        FakeFont.loads += 1
+
+class TestNativeFont(unittest.TestCase):
+
+    def setUp(self):
+        self.graphics = fonts.graphics
+        fonts.graphics = FakeGraphics
+
+    def tearDown(self):
+        fonts.graphics = self.graphics
+
+    def test_glyphs_parsed_lazily(self):
+        """Make sure glyphs aren't parsed in Python too until something draws with them."""
+        loads = FakeFont.loads
+        font = load_test_font()
+        self.assertEqual((FakeFont.loads - loads, font.height, font.baseline), (1, 5, 4))
+        self.assertEqual(font.nbytes(), 0)
+        self.assertEqual(font.render_strip((('A', (1, 1, 1)),)).width, 4)
+        self.assertGreater(font.nbytes(), 0)
+
+class FakeCanvas(object):
+    """Stands in for an rgbmatrix canvas."""
+
+    def __init__(self):
+        self.pixels = {}
+
+    def SetPixel(self, x, y, red, green, blue):  # pylint: disable=invalid-name
+        self.pixels[x, y] = (red, green, blue)
+
+    def Clear(self):  # pylint: disable=invalid-name
+        self.pixels = {}
+
+class FakeMatrix(object):
+    """Stands in for an rgbmatrix matrix."""
+    width = 8
+    height = 6
+    brightness = 100
+
+    def CreateFrameCanvas(self):  # pylint: disable=invalid-name
+        return FakeCanvas()
+
+    def SwapOnVSync(self, canvas):  # pylint: disable=invalid-name
+        return canvas
+
+class VSyncMatrix(FakeMatrix):
+    """Shows canvases and hands back the one shown before, like the real one."""
+
+    def __init__(self):
+        self.canvases = []
+        self.on_screen = self.CreateFrameCanvas()
+        self.shown = []
+
+    def CreateFrameCanvas(self):  # pylint: disable=invalid-name
+        canvas = FakeCanvas()
+        self.canvases.append(canvas)
+        return canvas
+
+    def SwapOnVSync(self, canvas):  # pylint: disable=invalid-name
+        time.sleep(0.005)
+        self.shown.append(dict(canvas.pixels))
+        shown, self.on_screen = self.on_screen, canvas
+        return shown
+
+class FakeGraphics(object):  # pylint: disable=too-few-public-methods
+    Color = staticmethod(lambda red, green, blue: (red, green, blue))
+    Font = FakeFont
+
+class TestRGBMatrixDisplay(unittest.TestCase):
+
+    def setUp(self):
+        self.graphics = getattr(display, 'graphics', None)
+        display.graphics = FakeGraphics
+        self.disp = display.RGBMatrixDisplay(FakeMatrix())
+
+    def tearDown(self):
+        if self.graphics is None:
+            del display.graphics
+        else:
+            display.graphics = self.graphics
+
+    def test_mirror_only_when_wanted(self):
+        """Make sure drawing is only mirrored for listeners that want frames now."""
+        frames, watching = [], []
+        self.disp.add_frame_listener(frames.append, lambda: bool(watching))
+        for watch in (False, True, False):
+            watching[:] = [True] if watch else []
+            self.disp.clear()
+            self.disp.set_pixel(1, 0, 255, 0, 0)
+            self.disp.buffer()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(bytearray(frames[0][3:6]), bytearray([255, 0, 0]))
+        self.assertEqual(self.disp.canvas.pixels[1, 0], (255, 0, 0))
+
+    def test_pipeline(self):
+        """Make sure pipelined frames are drawn in spare canvases and all get shown."""
+        matrix = VSyncMatrix()
+        disp = display.pipeline_factory(display.RGBMatrixDisplay(matrix), 3)
+        drawn = set()
+        for num in range(6):
+            disp.clear()
+            disp.set_pixel(num, 0, 255, 0, 0)
+            drawn.add(id(disp.canvas))
+            disp.buffer()
+        disp.brightness = 30
+        stats = disp.stats
+        disp.stop()
+        self.assertEqual([sorted(canvas) for canvas in matrix.shown],
+                         [[(num, 0)] for num in range(6)])
+        self.assertEqual(len(drawn), 4)  # 3 buffers, then the one the matrix started with
+        self.assertEqual(stats.frames, 6)
+        self.assertTrue(all(canvas.brightness == 30 for canvas in matrix.canvases))
+
+class SlowDisplay(display.FrameBufferDisplay):
+    """Takes a while to show each frame, like waiting for vsync."""
+
+    def buffer(self):
+        time.sleep(0.02)
+        display.FrameBufferDisplay.buffer(self)
+
+class BrokenDisplay(display.FrameBufferDisplay):
+    """Fails to show every other frame."""
+
+    def buffer(self):
+        if bytearray(self.pixels).index(255) % 2:
+            raise IOError('display went away')
+        display.FrameBufferDisplay.buffer(self)
+
+class TestPipelinedDisplay(unittest.TestCase):
+
+    def _draw(self, disp, num_frames):
+        start = time.time()
+        for num in range(num_frames):
+            disp.clear()
+            disp.set_pixel(num, 0, 255, 0, 0)
+            time.sleep(0.02)  # drawing takes as long as presenting
+            disp.buffer()
+        if isinstance(disp, display.PipelinedDisplay):
+            disp.flush()
+        return time.time() - start
+
+    def test_frames_in_order(self):
+        """Make sure every frame reaches the target intact and in order."""
+        target = display.FrameBufferDisplay(8, 6)
+        frames = []
+        disp = display.PipelinedDisplay(target, buffers=3)
+        disp.add_frame_listener(frames.append)
+        disp.brightness = 40
+        self._draw(disp, 5)
+        disp.stop()
+        self.assertEqual(target.brightness, 40)
+        self.assertEqual([bytearray(frame).index(255) // 3 for frame in frames], list(range(5)))
+        self.assertEqual(disp.stats.frames, 5)
+
+    def test_overlap(self):
+        """Make sure drawing overlaps presenting."""
+        serial = self._draw(SlowDisplay(8, 6), 10)
+        disp = display.PipelinedDisplay(SlowDisplay(8, 6), buffers=2)
+        pipelined = self._draw(disp, 10)
+        disp.stop()
+        self.assertLess(pipelined, serial * 0.8)
+
+    def test_present_fails(self):
+        """Make sure a frame that fails to show is skipped without stalling drawing."""
+        target = BrokenDisplay(8, 6)
+        frames = []
+        target.add_frame_listener(frames.append)
+        disp = display.PipelinedDisplay(target, buffers=2)
+        for num in range(4):
+            disp.clear()
+            disp.set_pixel(num, 0, 255, 0, 0)
+            disp.buffer()
+        disp.stop()
+        self.assertEqual([bytearray(frame).index(255) // 3 for frame in frames], [0, 2])
+        self.assertEqual(disp.stats.frames, 4)
+
+if __name__ == "__main__":
+    unittest.main()
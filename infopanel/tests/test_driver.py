@@ -0,0 +1,381 @@
+"""Tests for the driver."""
+import copy
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from PIL import Image as PILImage
+
+from infopanel import driver, clock, config, data, display, helpers, mqtt, scenes
+from infopanel.tests import TEST_ROOT, load_test_config, MockDisplay
+
+class TestReload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_test_config()
+
+    def setUp(self):
+        self.conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                            cache_dir=None)
+        self.driver = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+
+    def test_unchanged(self):
+        """Make sure reloading an identical config keeps everything."""
+        old_scenes = dict(self.driver.scenes)
+        self.driver.reload_config(copy.deepcopy(self.conf))
+        for name, scene in old_scenes.items():
+            self.assertIs(self.driver.scenes[name], scene)
+
+    def test_changed_sprite(self):
+        """Make sure only scenes using a changed sprite get rebuilt."""
+        old_scenes = dict(self.driver.scenes)
+        old_flag = self.driver.sprites['flag'][0]
+        new_conf = copy.deepcopy(self.conf)
+        new_conf['sprites']['I90']['low_val'] = 5.0
+        self.driver.reload_config(new_conf)
+        self.assertEqual(self.driver.sprites['I90'][0].low_val, 5.0)
+        self.assertIsNot(self.driver.scenes['traffic'], old_scenes['traffic'])
+        self.assertIsNot(self.driver.scenes['giraffes'], old_scenes['giraffes'])
+        self.assertIs(self.driver.scenes['welcome'], old_scenes['welcome'])
+        self.assertIs(self.driver.sprites['flag'][0], old_flag)
+        # template plus the one copy in the rebuilt traffic scene.
+        self.assertEqual(len(self.driver.sprites['I90']), 2)
+
+    def test_removed_scene(self):
+        """Make sure removed scenes disappear from modes."""
+        new_conf = copy.deepcopy(self.conf)
+        del new_conf['scenes']['giraffe2']
+        self.driver.reload_config(new_conf)
+        self.assertNotIn('giraffe2', self.driver.scenes)
+        self.assertNotIn('giraffe2', [name for name, _d, _m in self.driver.modes[driver.MODE_ALL]])
+        self.assertEqual(len(self.driver.sprites['giraffe2']), 1)
+
+    def test_missing_scene(self):
+        """Make sure a config whose modes show a removed scene is ignored."""
+        self.driver.apply_mode('morning')
+        new_conf = copy.deepcopy(self.conf)
+        del new_conf['scenes']['giraffes']
+        self.driver.reload_config(new_conf)
+        self.assertIs(self.driver.conf, self.conf)
+        self.assertIn('giraffes', self.driver.scenes)
+        new_conf = copy.deepcopy(self.conf)
+        new_conf['scenes']['traffic']['sprites'].append({'nope': None})
+        self.driver.reload_config(new_conf)
+        self.assertIs(self.driver.conf, self.conf)
+
+class CountingDisplay(MockDisplay):
+    num_buffered = 0
+
+    def text(self, font, x, y, red, green, blue, text):
+        return 0
+
+    def set_pixel(self, x, y, r, g, b):
+        pass
+
+    def set_image(self, image, x=0, y=0):
+        pass
+
+    def buffer(self):
+        self.num_buffered += 1
+
+class TestIdle(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_test_config()
+
+    def setUp(self):
+        conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                       cache_dir=None)
+        self.display = CountingDisplay()
+        self.driver = driver.driver_factory(self.display, data.InputData(), conf)
+        self.thread = threading.Thread(target=self.driver.run)
+        self.driver.data_source['mode'] = 'giraffe2'  # a scene that needs no fonts
+        self.driver.apply_mode('giraffe2')
+        self.driver._change_scene()  # pylint: disable=protected-access
+
+    def tearDown(self):
+        self.driver.stop()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_power_off(self):
+        """Make sure power off blanks once, then nothing renders until power comes back."""
+        self.driver.data_source['power'] = '0'
+        self.thread.start()
+        time.sleep(0.2)
+        self.assertEqual(self.display.num_buffered, 1)
+        self.driver.data_source['power'] = '1'
+        time.sleep(0.2)
+        self.assertGreater(self.display.num_buffered, 5)
+
+    def test_blank_mode(self):
+        """Make sure blank mode parks the loop and a mode command wakes it."""
+        self.driver.data_source['mode'] = driver.MODE_BLANK
+        self.driver.apply_mode(driver.MODE_BLANK)
+        self.thread.start()
+        time.sleep(0.2)
+        self.assertEqual(self.display.num_buffered, 1)
+        self.driver.data_source['mode'] = 'giraffe2'
+        time.sleep(0.2)
+        self.assertFalse(self.driver.idle)
+        self.assertIs(self.driver.active_scene, self.driver.scenes['giraffe2'])
+        self.assertGreater(self.display.num_buffered, 5)
+
+    def test_static_scene(self):
+        """Make sure a static scene keeps its frame until the data changes."""
+        still = scenes.Scene(64, 32)
+        still.sprites = [self.driver.sprites['vehicle'][0]]
+        self.driver.scenes['still'] = still
+        self.driver.data_source['mode'] = 'still'
+        self.driver.apply_mode('still')
+        self.driver._change_scene()  # pylint: disable=protected-access
+        self.assertTrue(still.is_static())
+        self.assertFalse(self.driver.scenes['traffic'].is_static())
+        self.thread.start()
+        time.sleep(0.3)
+        num_buffered = self.display.num_buffered
+        self.assertLessEqual(num_buffered, 2)
+        self.driver.data_source['travel_time_i90'] = 12
+        time.sleep(0.1)
+        self.assertEqual(self.display.num_buffered, num_buffered + 1)
+
+class TestCommands(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_test_config()
+
+    def setUp(self):
+        conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                       cache_dir=None)
+        self.display = CountingDisplay()
+        self.driver = driver.driver_factory(self.display, data.InputData(), conf)
+        self.driver._check_for_command()  # pylint: disable=protected-access
+
+    def test_in_order_and_none_lost(self):
+        """Make sure every command is applied, oldest first, with its latency measured."""
+        paths = []
+        self.driver.change_image_path = paths.append
+        datasrc = self.driver.data_source
+        datasrc['image_path'] = 'flag=a.png'
+        datasrc['brightness'] = 30
+        datasrc['image_path'] = 'flag=b.png'
+        datasrc['brightness'] = 60
+        self.assertFalse(self.driver._check_for_command())  # pylint: disable=protected-access
+        self.assertEqual(paths, ['flag=a.png', 'flag=b.png'])
+        self.assertEqual(self.driver._brightness, 60)  # pylint: disable=protected-access
+        stats = self.driver.commands.stats.summary()
+        self.assertEqual(stats['image_path']['count'], 2)
+        self.assertGreaterEqual(stats['brightness']['max'], 0.0)
+
+    def test_bounded(self):
+        """Make sure a flood of commands is spread over several frames."""
+        for level in range(driver.MAX_COMMANDS_PER_FRAME + 5):
+            self.driver.data_source['brightness'] = level
+        self.driver._check_for_command()  # pylint: disable=protected-access
+        self.assertEqual(len(self.driver.commands), 5)
+        self.driver._check_for_command()  # pylint: disable=protected-access
+        self.assertEqual(self.driver._brightness,  # pylint: disable=protected-access
+                         driver.MAX_COMMANDS_PER_FRAME + 4)
+
+    def test_mode_applies_now(self):
+        """Make sure a new mode puts up its scene right away, not at the next switch."""
+        self.driver.data_source['mode'] = 'giraffe2'
+        self.assertTrue(self.driver._check_for_command())  # pylint: disable=protected-access
+        self.assertIs(self.driver.active_scene, self.driver.scenes['giraffe2'])
+
+    def test_reading_missing_key(self):
+        """Make sure reading a key nobody wrote isn't a change or a command."""
+        datasrc = self.driver.data_source
+        version = datasrc.version
+        self.assertEqual((datasrc['sound'], datasrc['never_written']), (0, 0))
+        self.assertEqual(datasrc.version, version)
+        self.assertEqual(len(self.driver.commands), 0)
+
+    def test_mqtt_bytes(self):
+        """Make sure commands work when MQTT hands over payloads as bytes."""
+        # pylint: disable=protected-access
+        client = mqtt.MQTTClient(self.driver.data_source, {'topic': 'house/screen/#'})
+        for key, payload in (('mode', b'giraffe2'), ('random', b'1'),
+                             ('image_path', b'flag=foo.png')):
+            client.on_message(None, None, Message('house/screen/' + key, payload))
+        self.assertTrue(self.driver._check_for_command())
+        self.assertEqual(self.driver._mode, 'giraffe2')
+        self.assertEqual(self.driver._randomize_scenes, driver.ON)
+        self.assertEqual(self.driver.sprites.paths['flag'], 'foo.png')
+
+    def test_bad_values(self):
+        """Make sure values of the wrong type are normalized or skipped, not fatal."""
+        # pylint: disable=protected-access
+        self.driver.data_source.update({'random': 1, 'image_path': 5})
+        self.driver._check_for_command()
+        self.assertEqual(self.driver._randomize_scenes, driver.ON)
+
+class Message(object):  # pylint: disable=too-few-public-methods
+    """Stands in for a paho MQTT message."""
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class TestLazyScenes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_test_config()
+
+    def setUp(self):
+        self.previous_clock = helpers.CLOCK
+        helpers.CLOCK = clock.VirtualClock(start=1000.0)
+        self.conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                            cache_dir=None)
+        self.conf['global']['default_mode'] = 'morning'
+        self.conf['global']['evict_scenes_after'] = 30.0
+
+    def tearDown(self):
+        helpers.CLOCK = self.previous_clock
+
+    def test_mode(self):
+        """Make sure only the scenes and sprites of the active mode get built."""
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        self.assertEqual(sorted(drv.scenes.built), ['blank', 'giraffes', 'traffic'])
+        self.assertNotIn('flag', drv.sprites)
+        self.assertIn('welcome', drv.scenes)
+        self.assertIn('welcome', [name for name, _d, _m in drv.modes[driver.MODE_ALL]])
+
+    def test_shown(self):
+        """Make sure scenes can wait until they're shown, and all be built up front."""
+        self.conf['global']['build_scenes'] = 'shown'
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        self.assertEqual(len(drv.scenes.built), 2)
+        self.assertIn(drv.active_scene, drv.scenes.built.values())
+        self.conf['global']['build_scenes'] = 'all'
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        self.assertEqual(len(drv.scenes.built), 5)
+        self.assertIn('flag', drv.sprites)
+
+    def test_evict(self):
+        """Make sure scenes that go unshown are dropped, with their sprites, and come back."""
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        traffic = drv.scenes['traffic']
+        drv.apply_mode('giraffe2')
+        drv._change_scene()  # pylint: disable=protected-access
+        self.assertIn('traffic', drv.scenes.built)
+        helpers.CLOCK.advance(60)
+        drv._change_scene()  # pylint: disable=protected-access
+        self.assertEqual(sorted(drv.scenes.built), ['blank', 'giraffe2'])
+        self.assertEqual(sorted(drv.sprites), ['giraffe2'])
+        drv.apply_mode('traffic')
+        drv._change_scene()  # pylint: disable=protected-access
+        self.assertIsNot(drv.active_scene, traffic)
+        self.assertEqual(len(drv.sprites['I90']), 2)
+
+    def test_broken_scene(self):
+        """Make sure a scene that can't be built is skipped when its mode is applied."""
+        self.conf['scenes']['traffic']['sprites'][0]['I90']['colour'] = 'red'
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        self.assertNotIn('traffic', drv.scene_sequence)
+        self.assertIn('giraffes', drv.scene_sequence)
+        drv.apply_mode('morning')
+        self.assertEqual(drv.scene_sequence, ['giraffes'])
+        drv.apply_mode('traffic')
+        self.assertEqual(drv.scene_sequence, [scenes.SCENE_BLANK])
+        drv._change_scene()  # pylint: disable=protected-access
+        self.assertIs(drv.active_scene, drv.scenes[scenes.SCENE_BLANK])
+
+    def test_memory_report(self):
+        """Make sure asset memory is reported for built scenes and their sprites."""
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        report = drv.memory_report()
+        self.assertEqual(sorted(report['scenes']), ['blank', 'giraffes', 'traffic'])
+        self.assertIn('I90', report['sprites'])
+        self.assertGreaterEqual(report['bytes'], report['scenes']['traffic'])
+
+    def test_memory_budget(self):
+        """Make sure idle scenes stay while memory use is within the budget."""
+        self.conf['global']['scene_memory_mb'] = 1024 * 1024
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), self.conf)
+        drv.apply_mode('giraffe2')
+        helpers.CLOCK.advance(60)
+        drv._change_scene()  # pylint: disable=protected-access
+        self.assertIn('traffic', drv.scenes.built)
+
+class TestMultipleDisplays(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_test_config()
+
+    def setUp(self):
+        self.conf = config.load_config_yaml(os.path.join(TEST_ROOT, 'test_config.yaml'),
+                                            cache_dir=None)
+        self.conf['displays'] = config.DISPLAYS(
+            {'wide': {'FrameBuffer': {'width': 128, 'height': 32}},
+             'small': {'FrameBuffer': {'width': 32, 'height': 16},
+                       'scenes': ['traffic', 'welcome'],
+                       'modes': {'info': [{'traffic': {'duration': 3}}]},
+                       'default_mode': 'info'}})
+        datasrc = data.InputData()
+        self.drivers = {}
+        for name, display_conf in driver.display_configs(self.conf):
+            disp = display.display_factory(display_conf)
+            self.drivers[name] = driver.driver_factory(disp, datasrc,
+                                                       driver.display_view(self.conf, name), name)
+        driver.link_drivers(list(self.drivers.values()))
+
+    def test_views(self):
+        """Make sure each display gets its own size, scenes, and modes."""
+        small, wide = self.drivers['small'], self.drivers['wide']
+        self.assertEqual(small.scenes['traffic'].width, 32)
+        self.assertEqual(wide.scenes['traffic'].width, 128)
+        self.assertNotIn('giraffes', small.scenes)
+        self.assertIn('giraffes', wide.scenes)
+        self.assertIs(small.active_scene, small.scenes['traffic'])
+        self.assertIn('morning', wide.modes)
+        self.assertNotIn('morning', small.modes)
+
+    def test_inherited_modes(self):
+        """Make sure a display only inherits the parts of modes it has scenes for."""
+        self.conf['modes']['evening'] = [{'giraffes': {'duration': 5, 'mode_after': 'morning'}}]
+        self.conf['modes']['morning'][1]['traffic']['mode_after'] = 'evening'
+        self.conf['global']['default_mode'] = 'evening'
+        self.conf['displays']['tiny'] = config.DISPLAY({'FrameBuffer': {'width': 32, 'height': 16},
+                                                        'scenes': ['traffic', 'welcome']})
+        view = driver.display_view(self.conf, 'tiny')
+        self.assertEqual(view['modes'], {'morning': [{'traffic': {'duration': 10}}]})
+        self.assertEqual(view['global']['default_mode'], driver.MODE_ALL)
+        config.check_references(view)
+        drv = driver.driver_factory(MockDisplay(), data.InputData(), view, 'tiny')
+        drv.apply_mode('morning')
+        self.assertEqual(drv.scene_sequence, ['traffic'])
+
+    def test_own_modes(self):
+        """Make sure a display's default mode doesn't switch the others."""
+        # pylint: disable=protected-access
+        for drv in self.drivers.values():
+            drv._check_for_command()
+        self.assertEqual(self.drivers['small']._mode, 'info')
+        self.assertEqual(self.drivers['wide']._mode, driver.MODE_ALL)
+
+    def test_shared_command(self):
+        """Make sure a one-shot command applies to sprites on every display."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'new.png')
+            PILImage.new('RGB', (8, 4)).save(path)
+            self.drivers['small'].data_source['image_path'] = 'flag={}'.format(path)
+            self.drivers['small']._check_for_command()
+            self.drivers['wide']._check_for_command()
+            for drv in self.drivers.values():  # including where flag is only built now
+                self.assertEqual(drv.sprites['flag'][0].width, 8)
+                self.assertEqual(len(drv.commands), 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for data history and graph sprites."""
+import math
+import unittest
+
+from infopanel import history, data, sprites, helpers, clock
+from infopanel.tests import MockDisplay
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.previous_clock = helpers.CLOCK
+        helpers.CLOCK = clock.VirtualClock(start=1000.0)
+
+    def tearDown(self):
+        helpers.CLOCK = self.previous_clock
+
+    def test_slots_average_and_gaps(self):
+        """Make sure values average per slot, gaps are NaN, and old slots roll off."""
+        series = history.Series(10, 4)
+        series.add(1000, 1.0)
+        series.add(1005, 3.0)
+        series.add(1020, 5.0)
+        latest = series.latest(4)
+        self.assertTrue(math.isnan(latest[0]))
+        self.assertEqual(latest[1], 2.0)
+        self.assertTrue(math.isnan(latest[2]))
+        self.assertEqual(latest[3], 5.0)
+        series.add(1000, 9.0)  # too old for the newest slot
+        self.assertEqual(series.latest(1), [5.0])
+        series.add(1060, 6.0)
+        self.assertEqual(series.latest(4)[3], 6.0)
+        self.assertTrue(all(math.isnan(value) for value in series.latest(4)[:3]))
+
+    def test_bounded_memory(self):
+        """Make sure memory doesn't grow with the number of values."""
+        store = history.History(['a', 'b'], tiers=[(1, 60), (60, 24)])
+        before = store.nbytes
+        for second in range(5000):
+            store.record('a', second, timestamp=second)
+            store.record('b', 'unknown', timestamp=second)
+            store.record('untracked', second, timestamp=second)
+        self.assertEqual(store.nbytes, before)
+        self.assertEqual(before, 2 * 4 * (60 + 24))
+        self.assertEqual(store.series['a'][1].latest(1), [4989.5])  # mean of 4980..4999
+
+    def test_data_and_sprites(self):
+        """Make sure graph sprites track their key and draw one column per slot."""
+        datasrc = data.InputData()
+        graph = sprites.BarGraph(64, 32, datasrc)
+        graph.apply_config({'data_label': 'temp', 'graph_width': 4, 'graph_height': 5,
+                            'span': 40, 'low_val': 0, 'high_val': 4})
+        graph.x, graph.y = 0, 0
+        for value in (0, 2, 4):
+            datasrc['temp'] = value
+            helpers.CLOCK.advance(10)
+        drawn = {}
+
+        class RecordingDisplay(MockDisplay):
+            def set_pixel(self, x, y, r, g, b):
+                drawn[(x, y)] = (r, g, b)
+
+        graph.render(RecordingDisplay())
+        columns = dict((x, 5 - min(y for cx, y in drawn if cx == x)) for x, _y in drawn)
+        self.assertEqual(columns, {0: 1, 1: 3, 2: 5})  # nothing yet in the current slot
+        self.assertEqual(drawn[(2, 0)], (255, 0, 0))
+        self.assertEqual(drawn[(0, 4)], (0, 255, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
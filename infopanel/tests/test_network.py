@@ -0,0 +1,103 @@
+"""Tests for streaming frames over the network."""
+import socket
+import unittest
+
+from infopanel import network, display
+
+
+def _frame(width, height, lit):
+    pixels = bytearray(width * height * 3)
+    for x, y in lit:
+        i = (y * width + x) * 3
+        pixels[i:i + 3] = b'\xff\x10\x00'
+    return bytes(pixels)
+
+
+class TestEncoding(unittest.TestCase):
+
+    def test_delta_roundtrip(self):
+        """Make sure keyframes and deltas rebuild the frames, and deltas are small."""
+        first = _frame(16, 8, [(1, 1), (2, 1)])
+        second = _frame(16, 8, [(2, 1), (3, 5)])
+        pixels = bytearray(16 * 8 * 3)
+        keyframe = network.encode_frame(first, None, 16, 8, 0, keyframe=True)
+        network.Packet(keyframe).apply(pixels)
+        self.assertEqual(bytes(pixels), first)
+        delta = network.encode_frame(second, first, 16, 8, 1)
+        network.Packet(delta).apply(pixels)
+        self.assertEqual(bytes(pixels), second)
+        self.assertLess(len(delta), 60)
+        unchanged = network.encode_frame(second, second, 16, 8, 2)
+        self.assertEqual(network.Packet(unchanged).num_spans, 0)
+
+    def test_loss_recovery(self):
+        """Make sure deltas after a lost packet wait for the next keyframe."""
+        receiver = network.FrameReceiver(display.FrameBufferDisplay(4, 2), 0)
+        frames = [_frame(4, 2, [(i % 4, 0)]) for i in range(5)]
+        packets = [network.encode_frame(frame, frames[i - 1] if i else None, 4, 2, i,
+                                        keyframe=i in (0, 3))
+                   for i, frame in enumerate(frames)]
+        self.assertTrue(receiver.handle(network.Packet(packets[0])))
+        self.assertFalse(receiver.handle(network.Packet(packets[2])))  # 1 got lost
+        self.assertTrue(receiver.handle(network.Packet(packets[3])))
+        self.assertTrue(receiver.handle(network.Packet(packets[4])))
+        self.assertEqual(receiver.display.frame, frames[4])
+        self.assertEqual((receiver.stats.lost, receiver.stats.dropped, receiver.stats.frames),
+                         (1, 1, 3))
+        receiver.close()
+
+
+class TestLoopback(unittest.TestCase):
+
+    def _stream(self, protocol):
+        remote = display.FrameBufferDisplay(8, 4)
+        receiver = network.FrameReceiver(remote, 0, host='127.0.0.1', protocol=protocol)
+        local = network.NetworkDisplay(8, 4, '127.0.0.1', receiver.port, protocol,
+                                       keyframe_interval=2)
+        for x in range(3):
+            local.clear()
+            local.set_pixel(x, 1, 0, 255, 0)
+            local.buffer()
+            self.assertTrue(receiver.receive())
+            self.assertEqual(remote.frame, local.frame)
+        self.assertEqual(local.sender.stats.keyframes, 2)
+        self.assertEqual(receiver.stats.frames, 3)
+        local.sender.close()
+        receiver.close()
+
+    def test_udp(self):
+        """Make sure frames arrive over UDP."""
+        self._stream('udp')
+
+    def test_tcp(self):
+        """Make sure frames arrive over TCP."""
+        self._stream('tcp')
+
+    def test_tcp_receiver_down(self):
+        """Make sure the sender copes with a receiver that starts late or goes away."""
+        free = socket.socket()
+        free.bind(('127.0.0.1', 0))
+        port = free.getsockname()[1]
+        free.close()
+        local = network.NetworkDisplay(8, 4, '127.0.0.1', port, 'tcp', keyframe_interval=100)
+        local.buffer()  # nobody listening yet
+        self.assertEqual(local.sender.stats.frames, 0)
+        remote = display.FrameBufferDisplay(8, 4)
+        receiver = network.FrameReceiver(remote, port, host='127.0.0.1', protocol='tcp')
+        local.sender._retry_at = 0  # pylint: disable=protected-access
+        local.buffer()
+        self.assertTrue(receiver.receive())
+        local.sender._socket.close()  # pylint: disable=protected-access
+        local.set_pixel(1, 1, 0, 255, 0)
+        local.buffer()  # fails
+        local.sender._retry_at = 0  # pylint: disable=protected-access
+        local.buffer()
+        self.assertTrue(receiver.receive())
+        self.assertEqual(remote.frame, local.frame)
+        self.assertEqual(local.sender.stats.keyframes, 2)  # the first and the one after the error
+        local.sender.close()
+        receiver.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
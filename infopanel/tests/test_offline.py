@@ -0,0 +1,85 @@
+"""Tests for offline rendering."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from infopanel import offline, config, helpers, clock
+from infopanel.tests import TEST_ROOT
+
+OFFLINE_CONFIG = """
+mqtt:
+  broker: test.com
+  client_id: screen
+  topic: house/screen/#
+sprites:
+  walker:
+    type: Sprite
+    dx: 1
+    ticks_per_frame: 2
+    frames:
+      - 11
+        11
+      - 10
+        01
+  label:
+    type: FancyText
+    text: AA
+    font_name: test_font.bdf
+scenes:
+  walk:
+    sprites:
+      - walker:
+          y: 2
+      - label:
+          x: 1
+          y: 10
+modes:
+  main:
+    - walk:
+        duration: 2
+global:
+  font_dir: {font_dir}
+  default_mode: main
+"""
+
+class TestOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'offline.yaml')
+        with open(path, 'w') as conf_file:
+            conf_file.write(OFFLINE_CONFIG.format(font_dir=TEST_ROOT))
+        self.conf = config.load_config_yaml(path, cache_dir=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        helpers.FONTS.pop('test_font.bdf', None)
+
+    def test_render(self):
+        """Make sure rendering runs on virtual time and restores the real clock."""
+        frames = []
+        num_frames = offline.render(self.conf, 3.0, 20, frames.append, seed=1, start=0.0)
+        self.assertEqual(num_frames, 60)
+        self.assertEqual(len(frames), 60)
+        self.assertEqual(len(frames[0]), 64 * 32 * 3)
+        self.assertNotEqual(frames[0], frames[30])
+        self.assertIsInstance(helpers.CLOCK, clock.Clock)
+        self.assertNotIsInstance(helpers.CLOCK, clock.VirtualClock)
+
+    def test_reproducible(self):
+        """Make sure a seeded offline render is deterministic."""
+        first, second = [], []
+        offline.render(self.conf, 1.0, 10, first.append, seed=3, start=0.0)
+        offline.render(self.conf, 1.0, 10, second.append, seed=3, start=0.0)
+        self.assertEqual(first, second)
+
+    def test_image_sequence(self):
+        """Make sure frames can be written as scaled images."""
+        pattern = os.path.join(self.tmpdir, 'frame_%03d.png')
+        writer = offline.ImageSequenceWriter(pattern, 64, 32, scale=2)
+        offline.render(self.conf, 0.2, 10, writer, start=0.0)
+        self.assertTrue(os.path.exists(pattern % 1))
+
+if __name__ == "__main__":
+    unittest.main()
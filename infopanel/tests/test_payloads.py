@@ -0,0 +1,118 @@
+"""Tests for batched MQTT payloads."""
+import json
+import unittest
+
+from infopanel import data, mqtt, payloads
+
+
+class _Message(object):
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class TestMessagePack(unittest.TestCase):
+
+    def test_roundtrip(self):
+        """Make sure the pure-Python decoder reads what gets packed."""
+        values = {'temp': 21.5, 'count': 300, 'big': 2 ** 40, 'small': -5, 'low': -1000,
+                  'on': True, 'off': None, 'name': 'x' * 40, 'raw': b'\x00\x01',
+                  'list': [1, 'two', [3.0]]}
+        self.assertEqual(payloads.unpackb_python(payloads.packb(values)), values)
+
+    def test_compact_types(self):
+        """Make sure the one-byte and two-byte encodings publishers often use are read."""
+        # fixmap of 2: fixstr 'a' -> uint16 513, fixstr 'b' -> float32 0.5
+        packed = b'\x82\xa1a\xcd\x02\x01\xa1b\xca\x3f\x00\x00\x00'
+        self.assertEqual(payloads.unpackb_python(packed), {'a': 513, 'b': 0.5})
+
+    def test_bad(self):
+        """Make sure malformed payloads raise ValueError."""
+        for payload in (b'\x82\xa1a', b'\xc1', b'\x01\x02', b'\xa3ab'):
+            with self.assertRaises(ValueError):
+                payloads.unpackb_python(payload)
+        with self.assertRaises(ValueError):
+            payloads.decode('multipack', payloads.packb([1, 2]))
+
+
+class TestDeltaTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = payloads.DeltaTracker()
+
+    def test_order(self):
+        """Make sure late deltas are dropped and gaps counted."""
+        self.assertEqual(self.tracker.accept({'seq': 1, 'values': {'a': 1}}), {'a': 1})
+        self.assertEqual(self.tracker.accept({'seq': 4, 'values': {'a': 4}}), {'a': 4})
+        self.assertEqual(self.tracker.gaps, 2)
+        self.assertIsNone(self.tracker.accept({'seq': 3, 'values': {'a': 3}}))
+        self.assertEqual(self.tracker.stale, 1)
+        self.assertEqual(self.tracker.accept({'seq': 1, 'values': {'a': 0}, 'reset': True}),
+                         {'a': 0})
+        self.assertEqual(self.tracker.accept({'seq': 2, 'values': {'a': 1},
+                                              'source': 'other'}), {'a': 1})
+
+    def test_restart(self):
+        """Make sure a publisher that restarts its count without saying so gets through."""
+        self.tracker.accept({'seq': 5000, 'values': {}})
+        self.assertEqual(self.tracker.accept({'seq': 1, 'values': {'a': 1}}), {'a': 1})
+
+    def test_malformed(self):
+        """Make sure deltas without a seq or values raise ValueError."""
+        for message in ({'values': {}}, {'seq': 1}, {'seq': 'x', 'values': {}},
+                        {'seq': 1, 'values': [1]}):
+            with self.assertRaises(ValueError):
+                self.tracker.accept(message)
+
+
+class TestClientBatches(unittest.TestCase):
+
+    def setUp(self):
+        self.data = data.InputData()
+        self.client = mqtt.MQTTClient(self.data, {'topic': 'house/screen/#'})
+
+    def test_formats(self):
+        """Make sure each batch format writes all its values and wakes the display once."""
+        version = self.data.version
+        self.client.on_message(None, None, _Message(
+            'house/screen/multi', json.dumps({'temp': 21.5, 'mode': 'weather'}).encode('utf-8')))
+        self.assertEqual(self.data.version, version + 1)
+        self.client.on_message(None, None, _Message(
+            'house/screen/multipack', payloads.packb({'temp': 22.0, 'humidity': 40})))
+        self.client.on_message(None, None, _Message(
+            'house/screen/delta', payloads.packb({'seq': 1, 'values': {'humidity': 41}})))
+        self.client.on_message(None, None, _Message(
+            'house/screen/delta', b'{"seq": 2, "values": {"temp": 23.5}}'))
+        self.assertEqual(self.data['temp'], 23.5)
+        self.assertEqual(self.data['humidity'], 41)
+        self.assertEqual(self.data['mode'], 'weather')
+        self.assertEqual(self.data.version, version + 4)
+
+    def test_commands(self):
+        """Make sure commands in a batch are queued."""
+        queue = self.data.command_queue()
+        self.client.on_message(None, None, _Message(
+            'house/screen/multipack', payloads.packb({'brightness': 30, 'temp': 1})))
+        self.assertEqual([command[:2] for command in queue.drain(10)], [('brightness', 30)])
+
+    def test_bad(self):
+        """Make sure bad and stale batches are ignored."""
+        version = self.data.version
+        self.client.on_message(None, None, _Message('house/screen/multi', b'{"temp": '))
+        self.client.on_message(None, None, _Message('house/screen/multipack', b'\xc1'))
+        self.client.on_message(None, None, _Message(
+            'house/screen/delta', payloads.packb({'seq': 5, 'values': {'temp': 5}})))
+        self.client.on_message(None, None, _Message(
+            'house/screen/delta', payloads.packb({'seq': 4, 'values': {'temp': 4}})))
+        self.assertEqual(self.data['temp'], 5)
+        self.assertEqual(self.data.version, version + 1)
+
+    def test_mappings(self):
+        """Make sure mapped payloads write their values."""
+        self.client.conf['mappings'] = {'house/door': {'open': {'mode': 'door'}}}
+        self.client.on_message(None, None, _Message('house/door', b'open'))
+        self.assertEqual(self.data['mode'], 'door')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Tests for the live preview server."""
+import io
+import time
+import unittest
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:  # Python 2
+    from urllib2 import urlopen, HTTPError
+
+from PIL import Image as PILImage
+
+from infopanel import preview, display
+
+
+class TestPreview(unittest.TestCase):
+
+    def setUp(self):
+        self.disp = display.FrameBufferDisplay(8, 4)
+        self.ring = preview.SnapshotRing()
+        self.disp.add_frame_listener(self.ring)
+        self.server = preview.PreviewServer(self.ring, 8, 4, port=0, host='127.0.0.1',
+                                            scale=2, max_fps=50, max_viewers=1)
+        self.server.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.port)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_png(self):
+        """Make sure the still frame is the latest one, scaled up, and nothing encodes idle."""
+        for x in range(3):
+            self.disp.clear()
+            self.disp.set_pixel(x, 1, 255, 0, 0)
+            self.disp.buffer()
+        time.sleep(0.05)
+        self.assertEqual(self.server.encoder.num_encoded, 0)
+        self.assertEqual(self.ring.latest()[0], 3)
+        image = PILImage.open(io.BytesIO(urlopen(self.url + '/frame.png').read()))
+        self.assertEqual(image.size, (16, 8))
+        self.assertEqual(image.convert('RGB').getpixel((4, 2)), (255, 0, 0))
+        self.assertEqual(self.server.encoder.num_encoded, 1)
+
+    def test_mjpeg_and_viewer_limit(self):
+        """Make sure the stream sends JPEG parts and extra viewers are turned away."""
+        self.disp.buffer()
+        stream = urlopen(self.url + '/stream.mjpg')
+        self.assertIn('multipart/x-mixed-replace', stream.headers['Content-Type'])
+        self.assertEqual(stream.readline().strip(), b'--' + preview.BOUNDARY.encode('ascii'))
+        self.assertEqual(stream.readline().strip(), b'Content-Type: image/jpeg')
+        with self.assertRaises(HTTPError) as context:
+            urlopen(self.url + '/frame.png')
+        self.assertEqual(context.exception.code, 503)
+        stream.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
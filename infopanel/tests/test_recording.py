@@ -0,0 +1,51 @@
+"""Tests for frame recording."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from infopanel import recording, display
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _record(self, name, pixels):
+        path = os.path.join(self.tmpdir, name)
+        disp = display.FrameBufferDisplay(16, 8)
+        recorder = recording.FrameRecorder(path, disp.width, disp.height, clock=lambda: 1.5)
+        disp.add_frame_listener(recorder)
+        for x, y in pixels:
+            disp.clear()
+            disp.set_pixel(x, y, 255, 0, 0)
+            disp.buffer()
+        recorder.close()
+        return path
+
+    def test_roundtrip(self):
+        """Make sure frames come back exactly with hashes and timestamps."""
+        path = self._record('a.iprec', [(0, 0), (1, 0), (1, 0)])
+        frames = list(recording.read_recording(path))
+        self.assertEqual(len(frames), 3)
+        for rec in frames:
+            self.assertEqual(rec.timestamp, 1.5)
+            self.assertEqual(rec.digest, recording.frame_digest(rec.frame))
+        self.assertEqual(bytearray(frames[1].frame[3:6]), bytearray([255, 0, 0]))
+        self.assertEqual(frames[1].frame, frames[2].frame)
+
+    def test_compare(self):
+        """Make sure compare finds changed frames and length differences."""
+        path_a = self._record('a.iprec', [(0, 0), (1, 0), (2, 0)])
+        path_b = self._record('b.iprec', [(0, 0), (1, 1), (2, 0), (3, 0)])
+        num_compared, length_difference, mismatches = recording.compare(path_a, path_b)
+        self.assertEqual(num_compared, 3)
+        self.assertEqual(length_difference, -1)
+        self.assertEqual(mismatches, [recording.Mismatch(1, 2)])
+        self.assertEqual(recording.compare(path_a, path_a), (3, 0, []))
+
+if __name__ == "__main__":
+    unittest.main()
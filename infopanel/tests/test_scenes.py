@@ -25,6 +25,26 @@ class TestScenes(unittest.TestCase):
         existing_sprites = sprites.sprite_factory(self.conf['sprites'], None, MockDisplay())
         scenes.scene_factory(64, 32, self.conf['scenes'], existing_sprites)
 
+    def test_culling(self):
+        """Make sure off-display sprites don't draw but still move, and edges clip."""
+        drawn = []
+
+        class RecordingDisplay(MockDisplay):
+            def set_pixel(self, x, y, r, g, b):
+                drawn.append((x, y))
+
+        walker = sprites.Sprite(64, 32)
+        walker.apply_config({'frames': ['11 11'], 'dx': 1})
+        walker.x, walker.y = -10, 5
+        scene = scenes.Scene(64, 32)
+        scene.sprites = [walker]
+        scene.draw_frame(RecordingDisplay())
+        self.assertEqual(drawn, [])
+        self.assertEqual(walker.x, -9)
+        walker.x = 63
+        scene.draw_frame(RecordingDisplay())
+        self.assertEqual(sorted(drawn), [(63, 5), (63, 6)])
+
 
 def build_test_scenes(sprites):
     SCENE_CONFIG = {'traffic':{'type':'Scene', 'sprites':[{'I90':{'x':0, 'y':8}},
@@ -0,0 +1,115 @@
+"""Tests for the shared-memory data store."""
+import multiprocessing
+import unittest
+
+from infopanel import data, mqtt, shared
+
+
+def _publish(region_name, values):
+    region = shared.SharedRegion.attach(region_name)
+    writer = shared.SharedDataWriter(region)
+    for key, value in values:
+        writer[key] = value
+    region.close()
+
+
+class _FakeClient(object):
+    """Stands in for the MQTT client in the ingestion process."""
+
+    def __init__(self, container, conf):
+        self.container = container
+
+    def start(self):
+        self.container['state'] = 'started'
+
+    def stop(self):
+        self.container['state'] = 'stopped'
+
+
+class TestSharedData(unittest.TestCase):
+
+    def setUp(self):
+        self.region = shared.SharedRegion.create(num_slots=4, key_size=16, value_size=32)
+        self.data = data.SharedInputData(self.region)
+
+    def tearDown(self):
+        self.region.close()
+
+    def test_values_from_other_process(self):
+        """Make sure values written by a child process show up with their types."""
+        values = [('mode', 'fun'), ('brightness', 40), ('temp', 21.5), ('image_path', b'a.gif')]
+        child = multiprocessing.Process(target=_publish, args=(self.region.name, values))
+        child.start()
+        child.join()
+        self.assertEqual(self.data['mode'], 'fun')
+        self.assertEqual(self.data['brightness'], 40)
+        self.assertEqual(self.data['temp'], 21.5)
+        self.assertEqual(self.data['image_path'], b'a.gif')
+        self.assertEqual(self.data['power'], '1')  # local default
+        self.assertEqual(self.data['missing'], 0)
+
+    def test_local_writes_until_republished(self):
+        """Make sure clearing a command locally sticks until the writer sends it again."""
+        attached = shared.SharedRegion.attach(self.region.name)
+        writer = shared.SharedDataWriter(attached)
+        writer['sound'] = 'beep'
+        self.assertEqual(self.data['sound'], 'beep')
+        self.data['sound'] = ''
+        self.assertEqual(self.data['sound'], '')
+        writer['sound'] = 'beep'
+        self.assertEqual(self.data['sound'], 'beep')
+        attached.close()
+
+    def test_commands(self):
+        """Make sure repeated commands from the writer all reach every command queue."""
+        queue = self.data.command_queue()
+        writer = shared.SharedDataWriter(self.region, commands=self.data.commands)
+        writer['sound'] = 'beep'
+        writer['sound'] = 'boop'
+        writer['temp'] = 20
+        self.data.sync()
+        self.assertEqual([(name, value) for name, value, _sent in queue.drain(10)],
+                         [('sound', 'beep'), ('sound', 'boop')])
+
+    def test_limits(self):
+        """Make sure oversize values and extra keys are dropped, not corrupting others."""
+        writer = shared.SharedDataWriter(self.region)
+        writer['a'] = 'x' * 33
+        for key in 'bcdef':
+            writer[key] = key
+        self.assertEqual(self.data['a'], 0)
+        self.assertEqual(self.data['e'], 'e')
+        self.assertEqual(self.data['f'], 0)
+        self.assertEqual(self.region.used, 4)
+
+    def test_writer_killed_mid_write(self):
+        """Make sure a slot left mid-write keeps its last value and recovers when written."""
+        writer = shared.SharedDataWriter(self.region)
+        writer['temp'] = 20
+        self.assertEqual(self.data['temp'], 20)
+        slot = self.region.find('temp')
+        offset = self.region._offset(slot)  # pylint: disable=protected-access
+        shared.COUNTER.pack_into(self.region.buf, offset, self.region.sequence(slot) + 1)
+        self.assertIsNone(self.region.read(slot))
+        self.assertEqual(self.data['temp'], 20)
+        writer['temp'] = 21
+        self.assertEqual(self.region.sequence(slot) % 2, 0)
+        self.assertEqual(self.data['temp'], 21)
+
+    def test_ingest_stops_cleanly(self):
+        """Make sure the ingestion process stops its client instead of being killed."""
+        original, mqtt.MQTTClient = mqtt.MQTTClient, _FakeClient
+        try:
+            ingest = mqtt.IngestProcess(self.region, {}, self.data.changed)
+            ingest.start()
+            self.assertTrue(self.data.changed.wait(5))
+            process = ingest._process  # pylint: disable=protected-access
+            ingest.stop()
+        finally:
+            mqtt.MQTTClient = original
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.data['state'], 'stopped')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Tests for the vectorized sprite simulation."""
+import copy
+import unittest
+
+from infopanel import sprites, simulation, helpers
+
+def build_moving_sprites():
+    """A mix of sprites that wrap, flip, animate and change phrases quickly."""
+    sprite_list = []
+    for dx, dy, ticks_per_movement in [(1, 0, 1), (-1, 0, 2), (0, 1, 1), (2, -1, 3), (0, 0, 1)]:
+        giraffe = sprites.Giraffe(64, 32)
+        giraffe.apply_config({'dx': dx, 'dy': dy, 'ticks_per_movement': ticks_per_movement,
+                              'min_ticks_per_phrase': 5, 'max_ticks_per_phrase': 20})
+        giraffe.dx, giraffe.dy = dx, dy
+        giraffe.ticks_per_phrase = 7
+        sprite_list.append(giraffe)
+    plant = sprites.Plant(64, 32)
+    plant.apply_config({'x': 10, 'y': 3})
+    sprite_list.append(plant)
+    return sprite_list
+
+@unittest.skipIf(simulation.np is None, 'NumPy not installed')
+class TestSimulation(unittest.TestCase):
+
+    def test_matches_tick(self):
+        """Make sure vectorized steps exactly match Sprite.tick, randomness included."""
+        reference = build_moving_sprites()
+        simulated = [copy.copy(sprite) for sprite in reference]
+        sim = simulation.SpriteSimulation(simulated)
+        helpers.RANDOM.seed(5)
+        for _i in range(3000):
+            for sprite in reference:
+                sprite.tick()
+        helpers.RANDOM.seed(5)
+        for _i in range(3000):
+            sim.step()
+        sim.release()
+        for expected, actual in zip(reference, simulated):
+            self.assertEqual((expected.x, expected.y, expected.dx, expected._frame_num,
+                              expected._ticks, expected.text, expected.frames),
+                             (actual.x, actual.y, actual.dx, actual._frame_num,
+                              actual._ticks, actual.text, actual.frames))
+
+    def test_ineligible(self):
+        """Make sure sprites with custom ticking are left alone."""
+        class Custom(sprites.Sprite):
+            __slots__ = ()
+            def move(self):
+                pass
+        self.assertFalse(simulation.can_simulate(Custom(64, 32)))
+        before, after = simulation.scene_simulations([Custom(64, 32)])
+        self.assertEqual((len(before), len(after)), (0, 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 """Tests for sprites."""
+import datetime
 import unittest
 
-from infopanel import sprites, data
+from infopanel import sprites, data, display, clock, helpers, scenes
 from infopanel.tests import load_test_config, MockDisplay
+from infopanel.tests.test_display import load_test_font, lit_pixels
 
 class TestSprite(unittest.TestCase):
 
@@ -41,6 +43,147 @@ class TestTemperature(unittest.TestCase):
         self.assertEqual(temp._frame_delta, 0)
         self.assertEqual(len(temp.frames[0][0]), 0)
 
+class TestScrollingText(unittest.TestCase):
+
+    def test_strip_matches_text(self):
+        """Make sure scrolling text from the pre-rendered strip looks like drawn text."""
+        text = sprites.FancyText(16, 8)
+        text.apply_config({'dx': 3, 'ticks_per_movement': 1000, 'y': 5})
+        text.font = load_test_font()
+        text.last_val = text.value  # not data driven; keep the segments added here
+        text.add('A?' * 20, (255, 0, 0))
+        text.add('A', (0, 255, 0))
+        strip_disp = display.FrameBufferDisplay(16, 8)
+        text_disp = display.FrameBufferDisplay(16, 8)
+        for x in (14, 3, -2, -150, -158):
+            text.x = x
+            strip_disp.clear()
+            width = text.render(strip_disp)
+            strip_disp.buffer()
+            text_disp.clear()
+            expected = text_disp.text(text.font, x, 5, 255, 0, 0, 'A?' * 20)
+            expected += text_disp.text(text.font, x + expected, 5, 0, 255, 0, 'A')
+            text_disp.buffer()
+            self.assertEqual(width, expected)
+            self.assertEqual(strip_disp.frame, text_disp.frame, 'x={}'.format(x))
+        self.assertTrue(lit_pixels(strip_disp))
+
+class TestClock(unittest.TestCase):
+
+    def setUp(self):
+        self.previous_clock = helpers.CLOCK
+        helpers.CLOCK = clock.VirtualClock(start=60000.0 + 30.5)
+        self.clock = sprites.Clock(16, 8)
+        self.clock.apply_config({'format': 'A%M', 'x': 1, 'y': 6})
+        self.clock.font = load_test_font()
+
+    def tearDown(self):
+        helpers.CLOCK = self.previous_clock
+
+    def _render(self):
+        disp = display.FrameBufferDisplay(16, 8)
+        width = self.clock.render(disp)
+        disp.buffer()
+        return disp, width
+
+    def test_matches_text(self):
+        """Make sure the cached glyphs draw what drawing the text would."""
+        disp, width = self._render()
+        expected_disp = display.FrameBufferDisplay(16, 8)
+        text = datetime.datetime.fromtimestamp(helpers.CLOCK.time()).strftime('A%M')
+        expected = expected_disp.text(self.clock.font, 1, 6, 0, 255, 0, text)
+        expected_disp.buffer()
+        self.assertEqual(width, expected)
+        self.assertEqual(disp.frame, expected_disp.frame)
+        self.assertTrue(lit_pixels(disp))
+
+    def test_minute_boundary(self):
+        """Make sure the text is only laid out again at the next minute."""
+        self._render()
+        layout = self.clock._layout  # pylint: disable=protected-access
+        self.assertEqual(self.clock.next_change(), 60060.0)
+        scene = scenes.Scene(16, 8)
+        scene.sprites = [self.clock]
+        self.assertTrue(scene.is_static())
+        self.assertEqual(scene.next_change(), 60060.0)
+        helpers.CLOCK.advance(29)
+        self._render()
+        self.assertIs(self.clock._layout, layout)  # pylint: disable=protected-access
+        helpers.CLOCK.advance(1)
+        self._render()
+        self.assertIsNot(self.clock._layout, layout)  # pylint: disable=protected-access
+        self.assertEqual(self.clock.next_change(), 60120.0)
+
+    def test_seconds(self):
+        """Make sure formats with seconds change every second."""
+        self.clock = sprites.Clock(16, 8)
+        self.clock.apply_config({'format': '%H:%M:%S'})
+        self.clock.font = load_test_font()
+        self._render()
+        self.assertEqual(self.clock.next_change(), 60031.0)
+
+
+class TestSharedAssets(unittest.TestCase):
+
+    def test_frames_shared(self):
+        """Make sure identical frames are stored once and sprites carry no __dict__."""
+        giraffes = [sprites.Giraffe(64, 32) for _i in range(2)]
+        self.assertIs(giraffes[0].frames, giraffes[1].frames)
+        self.assertFalse(hasattr(giraffes[0], '__dict__'))
+
+    def test_flip_shared(self):
+        """Make sure flipping twice gets back the original shared frames."""
+        giraffe = sprites.Giraffe(64, 32)
+        original = giraffe.frames
+        giraffe.flip_horizontal()
+        self.assertEqual(giraffe.frames[0][1], (1, 1, 0, 0, 0))
+        giraffe.flip_horizontal()
+        self.assertIs(giraffe.frames, original)
+
+
+class RecordingDisplay(display.FrameBufferDisplay):
+    """Remembers every pixel it was asked to set."""
+
+    def __init__(self, width, height):
+        display.FrameBufferDisplay.__init__(self, width, height)
+        self.drawn = []
+
+    def set_pixel(self, x, y, red, green, blue):
+        self.drawn.append((x, y))
+        display.FrameBufferDisplay.set_pixel(self, x, y, red, green, blue)
+
+
+class TestClipping(unittest.TestCase):
+
+    def test_partly_visible(self):
+        """Make sure only the pixels that land on the display are visited."""
+        sprite = sprites.Sprite(8, 6)
+        sprite.apply_config({'frames': ['0110 1111 1001 0110']})
+        lit = [(xi, yi) for yi, row in enumerate(sprite.frames[0])
+               for xi, val in enumerate(row) if val]
+        for x in range(-5, 10):
+            for y in range(-5, 8):
+                disp = RecordingDisplay(8, 6)
+                sprite.x, sprite.y = x, y
+                sprite._render_frame(disp)  # pylint: disable=protected-access
+                expected = [(x + xi, y + yi) for xi, yi in lit
+                            if 0 <= x + xi < 8 and 0 <= y + yi < 6]
+                self.assertEqual(sorted(disp.drawn), sorted(expected))
+
+    def test_hidden_phrase(self):
+        """Make sure a phrase off the display isn't drawn but keeps its width."""
+        sprite = sprites.Sprite(8, 6)
+        sprite.apply_config({'frames': ['1'], 'text': 'AA'})
+        sprite.font = load_test_font()
+        sprite.x, sprite.y = -20, 0
+        disp = RecordingDisplay(8, 6)
+        sprite._render_phrase(disp)  # pylint: disable=protected-access
+        self.assertEqual(disp.drawn, [])
+        self.assertEqual(sprite._phrase_width, 8)  # pylint: disable=protected-access
+        sprite.x = -6
+        sprite._render_phrase(disp)  # pylint: disable=protected-access
+        self.assertTrue(disp.drawn)
+
 
 def build_test_sprites():
     DURATION_CONFIG = {'I90':{'type':'Duration', 'label':'I90', 'low_val':13.0,
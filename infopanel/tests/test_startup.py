@@ -0,0 +1,74 @@
+"""Tests for the startup trace and time-to-first-frame benchmark."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from infopanel import startup
+from infopanel.tests import TEST_ROOT
+
+STARTUP_CONFIG = """
+sprites:
+  walker:
+    type: Sprite
+    dx: 1
+    frames:
+      - 11
+        11
+scenes:
+  walk:
+    sprites:
+      - walker:
+          y: 2
+modes:
+  main:
+    - walk:
+        duration: 2
+FrameBuffer:
+  width: 32
+  height: 16
+global:
+  font_dir: {font_dir}
+  default_mode: main
+"""
+
+class TestStartup(unittest.TestCase):
+
+    def test_trace(self):
+        """Make sure phases are timed until the first frame and broken down by part."""
+        trace = startup.StartupTrace(start=1.0)
+        with trace.phase('sprites/a'):
+            pass
+        with trace.phase('sprites/b'):
+            pass
+        trace.phases.append(('sprites', 0.5))
+        trace.frame_buffered()
+        with trace.phase('scenes'):
+            pass
+        trace.frame_buffered()
+        self.assertEqual([name for name, _seconds in trace.phases],
+                         ['sprites/a', 'sprites/b', 'sprites'])
+        report = trace.report()
+        self.assertTrue(report[0].startswith('First frame after'))
+        self.assertIn('sprites', report[1])
+        self.assertEqual(len(report), 4)
+        self.assertIsNotNone(startup.process_start_time())
+
+    def test_benchmark(self):
+        """Make sure a fresh process reports its first frame, well within a loose budget."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'startup.yaml')
+            with open(path, 'w') as conf_file:
+                conf_file.write(STARTUP_CONFIG.format(font_dir=TEST_ROOT))
+            (seconds, phases), = startup.benchmark(path, runs=1)
+            self.assertEqual(startup.main(['--config', path, '--runs', '1', '--budget', '60']), 0)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertLess(seconds, 60.0)
+        names = [name for name, _seconds in phases]
+        for name in ('python', 'imports', 'config', 'sprites/walker', 'scenes/walk', 'modes'):
+            self.assertIn(name, names)
+
+if __name__ == "__main__":
+    unittest.main()
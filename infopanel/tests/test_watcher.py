@@ -0,0 +1,66 @@
+"""Tests for reloading changed images."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from PIL import Image as PILImage
+
+from infopanel import sprites, watcher
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.02)
+    return condition()
+
+
+class TestAssetWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'radar.png')
+        PILImage.new('RGB', (16, 8)).save(self.path)
+        try:
+            self.watcher = watcher.AssetWatcher()
+        except (OSError, AttributeError) as exc:
+            shutil.rmtree(self.tmpdir)
+            self.skipTest('No inotify here: {}'.format(exc))
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.watcher.join(5)
+        shutil.rmtree(self.tmpdir)
+
+    def test_replaced(self):
+        """Make sure every sprite showing an image gets the new one when it's replaced."""
+        image, gif = sprites.Image(64, 32), sprites.AnimatedGif(64, 32)
+        copy = sprites.Image(64, 32)
+        for sprite in (image, gif, copy):
+            sprite.apply_config({'path': self.path})
+        self.watcher.start()
+        self.assertTrue(_wait_for(lambda: self.tmpdir in self.watcher.inotify.dirs.values()))
+        new_path = os.path.join(self.tmpdir, 'radar.new.png')
+        PILImage.new('RGB', (20, 10)).save(new_path)
+        os.rename(new_path, self.path)  # like most tools write images
+        self.assertTrue(_wait_for(lambda: image.width == 20))
+        self.assertEqual(copy.width, 20)
+        self.assertEqual(gif.width, 20)
+        self.assertEqual(self.watcher.num_reloaded, 2)  # the still and the animated frames
+
+    def test_unrelated(self):
+        """Make sure other files in the directory are left alone."""
+        image = sprites.Image(64, 32)
+        image.apply_config({'path': self.path})
+        self.watcher.start()
+        self.assertTrue(_wait_for(lambda: self.tmpdir in self.watcher.inotify.dirs.values()))
+        PILImage.new('RGB', (20, 10)).save(os.path.join(self.tmpdir, 'other.png'))
+        time.sleep(0.3)
+        self.assertEqual(self.watcher.num_reloaded, 0)
+        self.assertEqual(image.width, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Reload images when their files change.
+
+Some images (radar maps, charts) are regenerated on disk every few minutes. With
+``watch_assets: true`` in the ``global`` section, an :py:class:`AssetWatcher`
+thread asks the kernel (inotify, so Linux only) to tell it when files in the
+directories of loaded images are written or replaced, decodes just the changed
+image again, and swaps it into every sprite showing it. Nothing is polled.
+
+Directories are watched rather than files so images replaced by renaming a new
+file over the old one (which is how most tools write them) are noticed too.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+
+from infopanel import assets
+
+LOG = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT = struct.Struct('iIII')  # watch descriptor, mask, cookie, name length
+SETTLE_S = 0.1  # wait this long for more events before reloading, so bursts reload once
+SYNC_S = 1.0  # check for images in new directories this often
+
+
+class Inotify(object):
+    """A minimal inotify instance, through the C library."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}  # watch descriptor: directory
+
+    def watch(self, directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+        """Watch a directory for files written or moved in."""
+        wd = self._add_watch(self.fd, directory.encode('utf-8'), mask)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), directory)
+        self.dirs[wd] = directory
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+
+        Returns paths of changed files, or None if events were lost.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as exc:
+            if exc.errno == errno.EAGAIN:
+                return []
+            raise
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd in self.dirs and name:
+                paths.append(os.path.join(self.dirs[wd], name))
+        return paths
+
+    def close(self):
+        """Stop watching everything."""
+        os.close(self.fd)
+
+
+class AssetWatcher(threading.Thread):
+    """Reload managed images whose files change, in the background."""
+
+    def __init__(self, manager=None, kind='image'):
+        threading.Thread.__init__(self, name='AssetWatcher')
+        self.daemon = True
+        self.manager = manager or assets.MANAGER
+        self.kind = kind
+        self.inotify = Inotify()
+        self.num_reloaded = 0
+        self._failed = set()  # directories that can't be watched
+        self._stop_event = threading.Event()
+
+    def sync(self):
+        """Watch the directories of any newly loaded images."""
+        watched = set(self.inotify.dirs.values())
+        for directory in set(os.path.dirname(path)
+                             for path in self.manager.sources(self.kind)):
+            if directory in watched or directory in self._failed:
+                continue
+            try:
+                self.inotify.watch(directory)
+                LOG.debug('Watching %s for changed images', directory)
+            except OSError as exc:
+                LOG.warning('Cannot watch %s: %s', directory, exc)
+                self._failed.add(directory)
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                self.sync()
+                changed = self.inotify.read(SYNC_S)
+                if changed is None:
+                    LOG.warning('Missed some file changes. Reloading every image.')
+                    changed = self.manager.sources(self.kind)
+                elif changed:
+                    while True:  # let a burst of writes settle
+                        more = self.inotify.read(SETTLE_S)
+                        if more is None:
+                            changed = self.manager.sources(self.kind)
+                            break
+                        if not more:
+                            break
+                        changed.extend(more)
+                self._reload(set(changed))
+        finally:
+            self.inotify.close()
+
+    def _reload(self, paths):
+        sources = self.manager.sources(self.kind)
+        for path in paths & sources:
+            try:
+                self.num_reloaded += self.manager.reload_source(self.kind, path)
+            except (IOError, OSError, ValueError, SyntaxError) as exc:
+                # likely half-written. Its next write will come along.
+                LOG.warning('Could not reload %s: %s', path, exc)
+
+    def stop(self):
+        """Stop watching, within a second."""
+        self._stop_event.set()
+
+
+def watcher_factory(conf):
+    """Start watching images if ``watch_assets`` is on and inotify is available, else None."""
+    if not conf['global'].get('watch_assets'):
+        return None
+    try:
+        watcher = AssetWatcher()
+    except (OSError, AttributeError) as exc:
+        LOG.warning('Cannot watch images for changes here: %s', exc)
+        return None
+    watcher.start()
+    return watcher
@@ -21,6 +21,7 @@ setup(name='infopanel',
     license='MIT',
     long_description=long_description,
     install_requires=required,
+    extras_require={'vectorize': ['numpy']},
     keywords='monitoring mqtt animation led rgb matrix',
     classifiers=[
         'Development Status :: 3 - Alpha',